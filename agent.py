@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+
+from dotenv import load_dotenv
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.prompts.chat import ChatPromptTemplate, MessagesPlaceholder
+
+from lang import get_tools, normalize_agent_response
+
+# Agent construction, kept out of lang.py so importing the tools is cheap.
+# server.py builds the executor at startup (or on first use with AGENT_EAGER_INIT=false).
+
+SYSTEM_PROMPT = "You are a helpful blockchain and web search agent. You support transactions and queries on the following EVM chains: Polygon, Ethereum, BSC, Arbitrum, U2U mainnet, U2U testnet, Monad testnet. You can check wallet balances (on one chain or across all chains at once), transaction history, prepare transactions, check status, estimate gas, and search the web. Be friendly and chatty like a human. CRITICAL RESPONSE FORMAT: For ALL responses, return ONLY valid JSON objects. NEVER wrap responses in markdown code blocks (```json). NEVER add explanatory text outside the JSON. For transaction requests, call the appropriate function and return the raw JSON response. For chat responses, return JSON with action_type 'chat' and your message. Example chat response: {{\"action_type\": \"chat\", \"message\": \"Your response here\"}}. If you don't know something, say 'I don't know' or 'I am not sure'. Never reveal that you are an AI or mention your model."
+
+AGENT_MODEL = os.environ.get("AGENT_MODEL", "gemini-2.0-flash")
+AGENT_MODEL_PROVIDER = os.environ.get("AGENT_MODEL_PROVIDER", "google_genai")
+AGENT_VERBOSE = os.environ.get("AGENT_VERBOSE", "true").lower() == "true"
+
+
+# Custom agent executor to handle transaction responses
+class TransactionAgentExecutor(AgentExecutor):
+    def invoke(self, inputs, config=None):
+        return self._normalize(super().invoke(inputs, config))
+
+    async def ainvoke(self, inputs, config=None):
+        # Runs on the event loop; tools with async variants (async_tools.py) never take a thread
+        return self._normalize(await super().ainvoke(inputs, config))
+
+    @staticmethod
+    def _normalize(result):
+        output = result.get("output", "")
+
+        # Normalize the response using our new function
+        normalized_response = normalize_agent_response(output)
+
+        # If normalization changed the response, return the normalized version
+        if normalized_response != output:
+            return {"output": json.dumps(normalized_response)}
+
+        return result
+
+
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+
+
+def build_llm():
+    load_dotenv()
+    # Check for required API key
+    if AGENT_MODEL_PROVIDER == "google_genai" and not os.environ.get("GOOGLE_API_KEY"):
+        raise ValueError("GOOGLE_API_KEY environment variable is required. Please set it in your environment.")
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(model=AGENT_MODEL, model_provider=AGENT_MODEL_PROVIDER)
+
+
+def build_agent_executor(llm=None, tools=None, verbose: bool = AGENT_VERBOSE) -> TransactionAgentExecutor:
+    """
+    Builds a fresh agent executor. llm and tools default to Gemini and lang.get_tools();
+    the benchmark passes a scripted model instead.
+    """
+    llm = llm if llm is not None else build_llm()
+    tools = tools if tools is not None else get_tools()
+    agent = create_tool_calling_agent(llm, tools=tools, prompt=build_prompt())
+    return TransactionAgentExecutor(agent=agent, tools=tools, verbose=verbose)
+
+
+_agent_executor = None
+_agent_executor_lock = threading.Lock()
+
+
+def get_agent_executor() -> TransactionAgentExecutor:
+    """Process-wide executor, built once on first use."""
+    global _agent_executor
+    if _agent_executor is None:
+        with _agent_executor_lock:
+            if _agent_executor is None:
+                _agent_executor = build_agent_executor()
+    return _agent_executor
+
+
+def set_agent_executor(executor: TransactionAgentExecutor) -> None:
+    global _agent_executor
+    with _agent_executor_lock:
+        _agent_executor = executor
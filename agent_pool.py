@@ -0,0 +1,149 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import AGENT_QUEUE_DEPTH, AGENT_QUEUE_WAIT, AGENT_REJECTED, AGENT_RUNNING
+
+# Dedicated execution pool for agent runs
+# AGENT_ASYNC            set to "true" to run agents with ainvoke on the event loop instead of invoke
+#                        on threads; blockchain tools then await RPC calls without holding a thread
+# AGENT_MAX_CONCURRENCY  agent runs executing at once (also the thread count for blocking runs);
+#                        defaults to 8 for blocking runs and 256 with AGENT_ASYNC
+# AGENT_MAX_QUEUE        runs allowed to wait for a slot before new ones are rejected with 429
+# AGENT_QUEUE_TIMEOUT    seconds a run may wait for a slot before it is rejected with 503
+AGENT_ASYNC = os.environ.get("AGENT_ASYNC", "false").lower() == "true"
+AGENT_MAX_CONCURRENCY = int(os.environ.get("AGENT_MAX_CONCURRENCY", 256 if AGENT_ASYNC else 8))
+AGENT_MAX_QUEUE = int(os.environ.get("AGENT_MAX_QUEUE", 32))
+AGENT_QUEUE_TIMEOUT = float(os.environ.get("AGENT_QUEUE_TIMEOUT", 10))
+
+
+class PoolRejected(Exception):
+    """Raised when a run is not admitted. status_code/retry_after feed the HTTP response."""
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PoolSaturated(PoolRejected):
+    status_code = 429
+
+
+class PoolTimeout(PoolRejected):
+    status_code = 503
+
+
+class AgentPool:
+    """
+    Bounded executor with admission control.
+
+    At most max_concurrency runs execute at once, at most max_queue wait behind them,
+    and a waiting run gives up after queue_timeout seconds. Everything else is shed
+    immediately so bursts can't pile up unbounded work.
+    """
+
+    def __init__(self, max_concurrency: int = AGENT_MAX_CONCURRENCY, max_queue: int = AGENT_MAX_QUEUE,
+                 queue_timeout: float = AGENT_QUEUE_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agent")
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=200)
+
+    def retry_after(self) -> int:
+        # Rough time until a queued run would start: average run time per queue "round"
+        avg_run = sum(self._run_times) / len(self._run_times) if self._run_times else 1.0
+        rounds = (self.waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(avg_run * rounds))
+
+    def check_admission(self) -> None:
+        """Raises PoolSaturated if a run would be shed right now, without taking a slot."""
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            AGENT_REJECTED.labels("queue_full").inc()
+            raise PoolSaturated("Agent queue is full, try again later.", self.retry_after())
+
+    async def acquire(self) -> None:
+        """Waits for an execution slot or raises PoolRejected."""
+        self.check_admission()
+        self.waiting += 1
+        AGENT_QUEUE_DEPTH.inc()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            AGENT_REJECTED.labels("queue_timeout").inc()
+            raise PoolTimeout("Timed out waiting for an agent slot.", self.retry_after())
+        finally:
+            self.waiting -= 1
+            AGENT_QUEUE_DEPTH.dec()
+        wait = time.monotonic() - start
+        self._wait_times.append(wait)
+        AGENT_QUEUE_WAIT.observe(wait)
+        self.admitted += 1
+        self.running += 1
+        AGENT_RUNNING.inc()
+
+    def release(self, run_time: float = None) -> None:
+        if run_time is not None:
+            self._run_times.append(run_time)
+        self.running -= 1
+        AGENT_RUNNING.dec()
+        self._slots.release()
+
+    async def run(self, fn, *args):
+        """Runs a blocking fn(*args) on the pool's threads once admitted."""
+        await self.acquire()
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self.release()
+            raise
+        # Free the slot when the thread finishes, even if the caller was cancelled
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.release, time.monotonic() - start))
+        return await asyncio.wrap_future(future)
+
+    async def arun(self, fn, *args):
+        """Awaits an async fn(*args) on the event loop once admitted."""
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            return await fn(*args)
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            "mode": "async" if AGENT_ASYNC else "threads",
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms": {"p50": pct(0.50), "p95": pct(0.95), "max": round(waits[-1] * 1000, 1) if waits else 0.0}
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
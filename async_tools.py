@@ -0,0 +1,168 @@
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from lang import (_TOKEN_CALLS, _balance_error, _balance_token, _checksum_addresses, _format_amount,
+                  _gas_error, _gas_response, _get_native_symbol, _main_balances_response, _main_balances_tokens,
+                  _native_balance_response, _token_balance_response, _token_call_parties, _token_call_response,
+                  _token_call_tx, _transaction_error, _transaction_failed, _transaction_response, _tx_status_error,
+                  _tx_status_response, is_tx_hash)
+from nonces import anote_receipt
+from rpc import get_async_web3
+from token_meta import aget_token_metadata
+from tokens import aread_balances
+from tx_prep import agas_fees, agas_nonce_fees, atoken_metadata
+
+# Async variants of the blockchain tools in lang.py, built on AsyncWeb3.
+# lang.py attaches them to the tools as coroutines, so AgentExecutor.ainvoke awaits RPC
+# calls on the event loop instead of parking a thread per call. Argument checks and JSON
+# responses are lang.py's own helpers, so only the RPC calls differ from the blocking
+# versions; independent RPC reads run concurrently or share a JSON-RPC batch (tx_prep.py
+# for the prepare_* tools).
+
+
+async def get_balance(address: str, chain: str = "polygon", token: str | None = None) -> str:
+    try:
+        w3 = await get_async_web3(chain)
+    except Exception as e:
+        return _balance_error("generic_balance", address, chain, f"Unsupported chain or RPC error: {e}", token=token)
+    error, token_address = _balance_token(address, chain, token)
+    if error:
+        return error
+
+    if token_address is None:
+        try:
+            return _native_balance_response(address, chain, await w3.eth.get_balance(address))
+        except Exception as e:
+            return _balance_error("native_balance", address, chain, f"Failed to fetch native balance: {e}")
+
+    try:
+        result = (await aread_balances(chain.lower(), address, [token_address], include_native=False))["tokens"][token_address]
+        if isinstance(result, Exception):
+            raise result
+        return _token_balance_response(address, chain, token_address, result)
+    except Exception as e:
+        return _balance_error("token_balance", address, chain, f"Failed to fetch token balance: {e}",
+                              token_address=token_address)
+
+
+async def get_main_balances(address: str, chain: str = "polygon") -> str:
+    chain = chain.lower()
+    error, token_addrs = _main_balances_tokens(address, chain)
+    if error:
+        return error
+    try:
+        result = await aread_balances(chain, address, list(token_addrs.values()))
+    except Exception as e:
+        result = e
+    return _main_balances_response(address, chain, token_addrs, result)
+
+
+async def get_portfolio(address: str, timeout: float | None = None) -> str:
+    from portfolio import aget_portfolio
+    return await aget_portfolio(address, timeout)
+
+
+async def get_bulk_balances(addresses: list[str], tokens: list[str] | None = None, chain: str = "polygon") -> str:
+    from bulk_balances import abulk_balances_tool
+    return await abulk_balances_tool(chain, addresses, tokens)
+
+
+async def prepare_native_transfer(sender: str, recipient: str, amount: float, chain: str = "polygon") -> str:
+    parties = {"from": sender, "to": recipient}
+    try:
+        addresses = _checksum_addresses(chain, sender, recipient)
+        if addresses is None:
+            return _transaction_error(chain, parties, amount, "Invalid sender or recipient address.",
+                                      unit=_get_native_symbol(chain.lower()))
+        sender_checksum, recipient_checksum = addresses
+        tx = {'from': sender_checksum, 'to': recipient_checksum, 'value': Web3.to_wei(amount, 'ether')}
+        estimated_gas, nonce, quote = await agas_nonce_fees(chain.lower(), tx)
+        native_symbol = _get_native_symbol(chain.lower())
+        return _transaction_response(
+            chain, tx, native_symbol, estimated_gas, nonce, quote,
+            f"Initiate MetaMask transaction to send {_format_amount(amount)} {native_symbol} from {sender} to {recipient}."
+        )
+    except Exception as e:
+        return _transaction_failed(chain, parties, amount, f"Failed to prepare native transfer: {str(e)}",
+                                   unit=_get_native_symbol(chain.lower()))
+
+
+async def _prepare_token_call(fn_name: str, sender: str, target: str, token_address: str, amount: float,
+                              chain: str) -> str:
+    spec = _TOKEN_CALLS[fn_name]
+    parties = _token_call_parties(fn_name, sender, target, token_address)
+    try:
+        addresses = _checksum_addresses(chain, sender, target, token_address)
+        if addresses is None:
+            return _transaction_error(chain, parties, amount, spec["invalid"])
+        sender_checksum, target_checksum, token_checksum = addresses
+
+        # Token decimals and symbol come from the metadata cache; a miss is read in the
+        # same batch as the nonce and fee reads (see tx_prep.py)
+        try:
+            decimals, symbol = await atoken_metadata(chain.lower(), token_checksum, sender_checksum)
+        except Exception as e:
+            return _transaction_error(chain, parties, amount, f"Failed to read token metadata (decimals/symbol): {e}")
+
+        tx = _token_call_tx(fn_name, sender_checksum, target_checksum, token_checksum, amount, decimals)
+        estimated_gas, nonce, quote = await agas_nonce_fees(chain.lower(), tx)
+        return _token_call_response(fn_name, chain, sender, target, amount, symbol, tx, estimated_gas, nonce, quote)
+    except Exception as e:
+        return _transaction_failed(chain, parties, amount, f"{spec['failed']}: {e}")
+
+
+async def prepare_token_transfer(sender: str, recipient: str, token_address: str, amount: float,
+                                 chain: str = "polygon") -> str:
+    return await _prepare_token_call("transfer", sender, recipient, token_address, amount, chain)
+
+
+async def prepare_token_approval(owner: str, spender: str, token_address: str, amount: float,
+                                 chain: str = "polygon") -> str:
+    return await _prepare_token_call("approve", owner, spender, token_address, amount, chain)
+
+
+async def check_transaction_status(tx_hash: str, chain: str = "polygon") -> str:
+    try:
+        w3 = await get_async_web3(chain)
+        if not is_tx_hash(tx_hash):
+            return _tx_status_error(tx_hash, chain, "Invalid transaction hash format.")
+
+        try:
+            receipt = await w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            receipt = None
+
+        if receipt is not None:
+            # The sender's next prepared transaction re-reads its nonce (see nonces.py)
+            await anote_receipt(chain.lower(), receipt['from'])
+        return _tx_status_response(tx_hash, chain, receipt)
+    except Exception as e:
+        return _tx_status_error(tx_hash, chain, f"Failed to check transaction status: {e}")
+
+
+async def estimate_gas(sender: str, recipient: str, amount: float, chain: str = "polygon",
+                       token_address: str | None = None) -> str:
+    try:
+        addresses = _checksum_addresses(chain, sender, recipient)
+        if addresses is None:
+            return _gas_error("Invalid sender or recipient address.")
+        sender_checksum, recipient_checksum = addresses
+
+        if token_address:
+            # Estimate gas for ERC-20 transfer
+            token = _checksum_addresses(chain, token_address)
+            if token is None:
+                return _gas_error("Invalid token address.")
+            try:
+                decimals, _ = await aget_token_metadata(chain.lower(), token[0])
+            except Exception:
+                decimals = 18  # Default if decimals call fails
+            tx = _token_call_tx("transfer", sender_checksum, recipient_checksum, token[0], amount, decimals)
+        else:
+            # Estimate gas for native transfer
+            tx = {'from': sender_checksum, 'to': recipient_checksum, 'value': Web3.to_wei(amount, 'ether')}
+
+        estimated_gas, quote = await agas_fees(chain.lower(), tx)
+        return _gas_response(chain, estimated_gas, quote)
+    except Exception as e:
+        return _gas_error(f"Failed to estimate gas: {e}")
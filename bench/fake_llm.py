@@ -0,0 +1,119 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Wallets and tokens used by the scripted scenarios; the stub node answers for any address
+WALLET = "0x1111111111111111111111111111111111111111"
+RECIPIENT = "0x2222222222222222222222222222222222222222"
+USDC_POLYGON = "0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174"
+TX_HASH = "0x" + "ab" * 32
+
+# scenario name -> tool calls made one after another, then the last tool result is returned
+SCENARIOS = {
+    "chat": [],
+    "get_balance": [
+        ("get_balance", {"address": WALLET, "chain": "polygon"}),
+    ],
+    "get_token_balance": [
+        ("get_balance", {"address": WALLET, "chain": "polygon", "token": "USDC"}),
+    ],
+    "get_main_balances": [
+        ("get_main_balances", {"address": WALLET, "chain": "polygon"}),
+    ],
+    "balance_then_main": [
+        ("get_balance", {"address": WALLET, "chain": "polygon"}),
+        ("get_main_balances", {"address": WALLET, "chain": "polygon"}),
+    ],
+    "get_portfolio": [
+        ("get_portfolio", {"address": WALLET}),
+    ],
+    "get_bulk_balances": [
+        ("get_bulk_balances", {"addresses": [WALLET, RECIPIENT] * 25, "tokens": ["native", "USDC", "USDT"],
+                               "chain": "polygon"}),
+    ],
+    "get_wallet_transactions": [
+        ("get_wallet_transactions", {"address": WALLET, "chain": "polygon", "limit": 10}),
+    ],
+    "prepare_native_transfer": [
+        ("prepare_native_transfer", {"sender": WALLET, "recipient": RECIPIENT, "amount": 0.5, "chain": "polygon"}),
+    ],
+    "prepare_token_transfer": [
+        ("prepare_token_transfer", {"sender": WALLET, "recipient": RECIPIENT, "token_address": USDC_POLYGON,
+                                    "amount": 12.5, "chain": "polygon"}),
+    ],
+    "prepare_token_approval": [
+        ("prepare_token_approval", {"owner": WALLET, "spender": RECIPIENT, "token_address": USDC_POLYGON,
+                                    "amount": 100, "chain": "polygon"}),
+    ],
+    "check_transaction_status": [
+        ("check_transaction_status", {"tx_hash": TX_HASH, "chain": "polygon"}),
+    ],
+    "estimate_gas": [
+        ("estimate_gas", {"sender": WALLET, "recipient": RECIPIENT, "amount": 1, "chain": "polygon",
+                          "token_address": USDC_POLYGON}),
+    ],
+}
+
+_SCENARIO_RE = re.compile(r"bench:(\w+)")
+
+
+def scenario_input(name: str) -> str:
+    return f"bench:{name}"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline stand-in for the Gemini chat model.
+
+    The human message names a scenario ("bench:get_balance"); the model emits that
+    scenario's tool calls one per turn, then answers with the last tool result, the
+    same way the real agent returns raw tool JSON. latency simulates the LLM round trip.
+    """
+
+    latency: float = 0.0
+    tokens_per_call: int = 400
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages) -> AIMessage:
+        # Steps already taken = tool results since the latest human message
+        human_index = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        tool_results = [m for m in messages[human_index:] if isinstance(m, ToolMessage)]
+        match = _SCENARIO_RE.search(str(messages[human_index].content)) if messages else None
+        script = SCENARIOS.get(match.group(1), []) if match else []
+        usage = {"input_tokens": self.tokens_per_call, "output_tokens": 40, "total_tokens": self.tokens_per_call + 40}
+
+        if len(tool_results) < len(script):
+            name, args = script[len(tool_results)]
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}],
+                usage_metadata=usage
+            )
+        if tool_results:
+            return AIMessage(content=str(tool_results[-1].content), usage_metadata=usage)
+        return AIMessage(
+            content=json.dumps({"action_type": "chat", "message": "Hello from the scripted model."}),
+            usage_metadata=usage
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
@@ -0,0 +1,67 @@
+"""
+Measures cold import time of the server module against a budget.
+
+Usage (from the repo root):
+    python -m bench.import_time
+    python -m bench.import_time --budget-ms 800 --module lang --top 15
+
+Runs each import in a fresh interpreter (so nothing is cached in-process),
+prints the slowest modules from -X importtime and exits non-zero when the
+median import time exceeds the budget.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Worker boot should not build the LLM or import web3 (or lang's langchain tools); keep this honest.
+# `import server` measures a median of about 600 ms on a single-core dev container, and the
+# budget leaves about 1.7x of that as margin for slower or busier machines
+DEFAULT_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1000))
+
+
+def measure(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <module>"
+        _self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [measure(args.module) for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print(f"import {args.module}: median {median:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print("\nslowest modules (cumulative):")
+    for cumulative_us, name in slowest_imports(args.module, args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if median > args.budget_ms:
+        print(f"\nFAIL: import time {median:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
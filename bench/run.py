@@ -0,0 +1,183 @@
+"""
+Offline end-to-end benchmark for /query.
+
+Drives the FastAPI app in-process with a scripted chat model (bench/fake_llm.py),
+a local JSON-RPC/explorer stub (bench/stub_node.py) and fakeredis, so no Gemini
+key, public RPC or Redis server is needed.
+
+Usage (from the repo root):
+    python -m bench.run
+    python -m bench.run --scenarios get_balance,prepare_token_transfer --concurrency 32 --requests 500
+    python -m bench.run --llm-latency 0.3 --rpc-latency 0.05 --redis-url redis://localhost:6379/0 --json out.json
+    python -m bench.run --scenarios prepare_native_transfer --head-tracker
+
+Reports p50/p95/p99 latency, requests per second and error count per scenario.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_llm import SCENARIOS, ScriptedChatModel, scenario_input
+from bench.stub_node import StubNode
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def setup(args):
+    """Points the app at the stubs and returns (app, stub node)."""
+    import lang
+    node = StubNode(lang.EVM_CHAINS, latency=args.rpc_latency).start()
+    for chain, cfg in lang.EVM_CHAINS.items():
+        cfg["rpc"] = node.rpc_url(chain)
+        cfg["rpcs"] = []
+        cfg["explorer_api"] = node.explorer_url(chain)
+        if not cfg.get("explorer_key_env"):
+            cfg["explorer_key_env"] = f"BENCH_{chain.upper()}_KEY"
+        os.environ.setdefault(cfg["explorer_key_env"], "bench")
+
+    from agent import build_agent_executor
+    executor = build_agent_executor(llm=ScriptedChatModel(latency=args.llm_latency), verbose=False)
+
+    import redis_store
+    if args.redis_url:
+        import redis
+        import redis.asyncio as aioredis
+        redis_client = aioredis.from_url(args.redis_url, decode_responses=True)
+        redis_store.set_sync_redis(redis.from_url(args.redis_url, decode_responses=True))
+    else:
+        import fakeredis
+        fake_server = fakeredis.FakeServer()
+        redis_client = fakeredis.FakeAsyncRedis(server=fake_server, decode_responses=True)
+        redis_store.set_sync_redis(fakeredis.FakeRedis(server=fake_server, decode_responses=True))
+
+    import server
+    return server.create_app(executor=executor, redis=redis_client), node
+
+
+def _tool_failed(body: dict) -> bool:
+    # Tools report failures inside the output JSON rather than as HTTP errors
+    try:
+        output = json.loads(body.get("output", ""))
+    except (json.JSONDecodeError, TypeError):
+        return False
+    return isinstance(output, dict) and output.get("status") == "error"
+
+
+async def run_scenario(app, scenario: str, total: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(client, worker_id):
+        nonlocal errors
+        # One session per worker so history grows like a real conversation
+        user_id = f"bench-{scenario}-{worker_id}"
+        for _ in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/query", json={"input": scenario_input(scenario), "user_id": user_id})
+                body = response.json()
+                if response.status_code != 200 or body.get("action_type") in ("error", None) or _tool_failed(body):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": scenario,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def print_table(results: list, rpc_calls: int) -> None:
+    # rpc_calls counts JSON-RPC calls, rpc_http the HTTP requests carrying them (batches count once)
+    columns = ["scenario", "requests", "concurrency", "errors", "rps", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "rpc_calls", "rpc_http"]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in results)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in results:
+        print("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in columns))
+    print(f"\nTotal JSON-RPC calls served by the stub node: {rpc_calls}")
+    if "read_cache" in sys.modules:
+        cache = sys.modules["read_cache"].stats()
+        print(f"Chain read cache: {cache['hits']} hits, {cache['misses']} misses, {cache['entries']} entries")
+
+
+async def main_async(args) -> list:
+    app, node = setup(args)
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {unknown}. Known: {list(SCENARIOS)}")
+    results = []
+    if args.head_tracker:
+        # The app's startup hook doesn't run in-process either
+        import chain_head
+        await chain_head.start()
+    try:
+        for scenario in scenarios:
+            if args.warmup:
+                await run_scenario(app, scenario, args.warmup, min(args.warmup, args.concurrency))
+            calls_before, requests_before = node.calls, node.requests
+            result = await run_scenario(app, scenario, args.requests, args.concurrency)
+            result["rpc_calls"] = node.calls - calls_before
+            result["rpc_http"] = node.requests - requests_before
+            results.append(result)
+    finally:
+        if "chain_head" in sys.modules:
+            await sys.modules["chain_head"].stop()
+        if "rpc" in sys.modules:
+            # The app's shutdown hook doesn't run in-process; close the async sessions here
+            await sys.modules["rpc"].aclose_all()
+        node.stop()
+    print_table(results, node.calls)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="", help="comma-separated scenario names (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests before each scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per LLM call")
+    parser.add_argument("--rpc-latency", type=float, default=0.0, help="simulated seconds per RPC HTTP request")
+    parser.add_argument("--head-tracker", action="store_true", help="run the chain-head tracker (chain_head.py) during the run")
+    parser.add_argument("--redis-url", default="", help="use a real Redis instead of fakeredis")
+    parser.add_argument("--json", default="", help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from eth_abi import decode, encode
+
+# Local stand-in for the public JSON-RPC nodes and Etherscan-style explorers.
+# Every chain is served from the same process under its own path:
+#   POST /<chain>        JSON-RPC (single or batch)
+#   GET  /<chain>/api    explorer API (module=account&action=txlist)
+
+GWEI = 10 ** 9
+BLOCK_TIME = 2.0  # seconds per simulated block
+TOKEN_BALANCE = 1234_500000  # 1234.5 with 6 decimals
+TOKEN_DECIMALS = 6
+TOKEN_SYMBOL = "USDC"
+
+SEL_BALANCE_OF = "0x70a08231"
+SEL_DECIMALS = "0x313ce567"
+SEL_SYMBOL = "0x95d89b41"
+SEL_AGGREGATE3 = "0x82ad56cb"
+SEL_GET_ETH_BALANCE = "0x4d2301cc"
+NATIVE_BALANCE = 3 * 10 ** 18
+
+
+def _word(value: int) -> str:
+    return format(value, "064x")
+
+
+def _abi_string(value: str) -> str:
+    raw = value.encode()
+    padded = raw.hex().ljust(((len(raw) + 31) // 32) * 64, "0")
+    return "0x" + _word(32) + _word(len(raw)) + padded
+
+
+class StubChain:
+    """Deterministic chain state: the head advances every BLOCK_TIME seconds."""
+
+    def __init__(self, chain_id: int, start_block: int = 50_000_000):
+        self.chain_id = chain_id
+        self.start_block = start_block
+        self.started = time.monotonic()
+        # tx hash -> block it was "mined" in, fixed on first lookup so confirmations grow
+        self.mined = {}
+
+    def block_number(self) -> int:
+        return self.start_block + int((time.monotonic() - self.started) / BLOCK_TIME)
+
+    def eth_call(self, call: dict) -> str:
+        data = (call.get("data") or call.get("input") or "0x").lower()
+        selector = data[:10]
+        if selector == SEL_BALANCE_OF:
+            return "0x" + _word(TOKEN_BALANCE)
+        if selector == SEL_DECIMALS:
+            return "0x" + _word(TOKEN_DECIMALS)
+        if selector == SEL_SYMBOL:
+            return _abi_string(TOKEN_SYMBOL)
+        if selector == SEL_GET_ETH_BALANCE:
+            return "0x" + _word(NATIVE_BALANCE)
+        if selector == SEL_AGGREGATE3:
+            return self.aggregate3(bytes.fromhex(data[10:]))
+        raise ValueError(f"execution reverted: unknown selector {selector}")
+
+    def aggregate3(self, payload: bytes) -> str:
+        """Multicall3.aggregate3: runs each inner call, reverting only for allowFailure=False."""
+        results = []
+        for target, allow_failure, call_data in decode(["(address,bool,bytes)[]"], payload)[0]:
+            try:
+                results.append((True, bytes.fromhex(self.eth_call({"to": target, "data": "0x" + call_data.hex()})[2:])))
+            except ValueError:
+                if not allow_failure:
+                    raise ValueError("execution reverted: Multicall3: call failed")
+                results.append((False, b""))
+        return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+
+    def block(self, number: int) -> dict:
+        return {
+            "number": hex(number),
+            "hash": "0x" + _word(number),
+            "parentHash": "0x" + _word(number - 1),
+            "timestamp": hex(1_700_000_000 + number * int(BLOCK_TIME)),
+            "baseFeePerGas": hex(20 * GWEI),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(15_000_000),
+            "miner": "0x" + "00" * 20,
+            "transactions": [],
+        }
+
+    def handle(self, method: str, params: list):
+        head = self.block_number()
+        if method == "eth_chainId":
+            return hex(self.chain_id)
+        if method == "net_version":
+            return str(self.chain_id)
+        if method == "eth_blockNumber":
+            return hex(head)
+        if method == "eth_getBalance":
+            return hex(NATIVE_BALANCE)
+        if method == "eth_gasPrice":
+            return hex(30 * GWEI)
+        if method == "eth_maxPriorityFeePerGas":
+            return hex(int(1.5 * GWEI))
+        if method == "eth_getTransactionCount":
+            return hex(7)
+        if method == "eth_estimateGas":
+            call = params[0] if params else {}
+            return hex(65_000 if call.get("data") or call.get("input") else 21_000)
+        if method == "eth_call":
+            return self.eth_call(params[0])
+        if method == "eth_getBlockByNumber":
+            tag = params[0] if params else "latest"
+            number = head if tag in ("latest", "pending", "safe", "finalized") else int(tag, 16)
+            return self.block(number)
+        if method == "eth_feeHistory":
+            count = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+            percentiles = params[2] if len(params) > 2 else []
+            return {
+                "oldestBlock": hex(head - count + 1),
+                "baseFeePerGas": [hex(20 * GWEI)] * (count + 1),
+                "gasUsedRatio": [0.5] * count,
+                "reward": [[hex(int((1 + p / 50) * GWEI)) for p in percentiles] for _ in range(count)],
+            }
+        if method == "eth_getTransactionReceipt":
+            tx_hash = params[0]
+            block = self.mined.setdefault(tx_hash.lower(), head - 2)
+            return {
+                "transactionHash": tx_hash,
+                "transactionIndex": "0x0",
+                "blockHash": "0x" + _word(block),
+                "blockNumber": hex(block),
+                "from": "0x" + "11" * 20,
+                "to": "0x" + "22" * 20,
+                "cumulativeGasUsed": hex(21_000),
+                "gasUsed": hex(21_000),
+                "effectiveGasPrice": hex(30 * GWEI),
+                "contractAddress": None,
+                "logs": [],
+                "logsBloom": "0x" + "00" * 256,
+                "status": "0x1",
+                "type": "0x2",
+            }
+        raise KeyError(method)
+
+    def txlist(self, address: str, count: int = 200) -> list:
+        head = self.block_number()
+        return [{
+            "hash": "0x" + _word(head - i),
+            "from": address if i % 2 else "0x" + "33" * 20,
+            "to": "0x" + "33" * 20 if i % 2 else address,
+            "value": str(10 ** 17 * (i + 1)),
+            "blockNumber": str(head - i * 10),
+            "timeStamp": str(1_700_000_000 + (head - i * 10) * int(BLOCK_TIME)),
+        } for i in range(count)]
+
+
+class StubNode:
+    """
+    Threaded HTTP server hosting one StubChain per chain name.
+    latency adds a fixed delay to every HTTP request to mimic a remote node.
+    """
+
+    def __init__(self, chains: dict, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.chains = {name: StubChain(cfg.get("chain_id", 1)) for name, cfg in chains.items()}
+        self.latency = latency
+        self.requests = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def rpc_url(self, chain: str) -> str:
+        return f"{self.url}/{chain}"
+
+    def explorer_url(self, chain: str) -> str:
+        return f"{self.url}/{chain}/api"
+
+    def start(self) -> "StubNode":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-node", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, calls: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.calls += calls
+
+    def _dispatch(self, chain: StubChain, request: dict) -> dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = chain.handle(request.get("method"), request.get("params") or [])
+        except KeyError as e:
+            response["error"] = {"code": -32601, "message": f"Method not found: {e}"}
+        except Exception as e:
+            response["error"] = {"code": 3, "message": str(e)}
+        return response
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, Nagle plus
+            # delayed ACKs add ~40 ms to every keep-alive request
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _chain(self):
+                name = urlparse(self.path).path.strip("/").split("/")[0]
+                return node.chains.get(name)
+
+            def _send(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if node.latency:
+                    time.sleep(node.latency)
+                chain = self._chain()
+                if chain is None:
+                    return self._send({"error": "unknown chain"}, 404)
+                request = json.loads(body)
+                if isinstance(request, list):
+                    node._count(len(request))
+                    return self._send([node._dispatch(chain, r) for r in request])
+                node._count(1)
+                self._send(node._dispatch(chain, request))
+
+            def do_GET(self):
+                if node.latency:
+                    time.sleep(node.latency)
+                chain = self._chain()
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                if chain is None or query.get("action") != "txlist":
+                    return self._send({"status": "0", "message": "NOTOK", "result": []}, 404)
+                node._count(1)
+                txs = chain.txlist(query.get("address", ""))
+                start_block = int(query.get("startblock", 0) or 0)
+                end_block = int(query.get("endblock", 99999999) or 99999999)
+                txs = [tx for tx in txs if start_block <= int(tx["blockNumber"]) <= end_block]
+                if query.get("sort") == "asc":
+                    txs.reverse()
+                if query.get("offset"):
+                    size, page = int(query["offset"]), int(query.get("page", 1) or 1)
+                    txs = txs[(page - 1) * size:page * size]
+                if txs:
+                    return self._send({"status": "1", "message": "OK", "result": txs})
+                self._send({"status": "0", "message": "No transactions found", "result": []})
+
+        return Handler
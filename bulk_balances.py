@@ -0,0 +1,313 @@
+import asyncio
+import json
+import os
+from collections import deque
+
+from eth_utils import to_checksum_address
+from web3 import Web3
+
+from rpc import abatch_request, batch_request, chain_config
+from token_meta import acached_metadata, cached_metadata, plan_metadata
+from tokens import TokenReadError, balance_of_data, decode_uint, eth_balance_data, multicall_address, plan_calls
+
+# Balances for many wallets x many tokens on one chain, for treasury checks.
+# Wallets are read in windows: each window is one HTTP request carrying a JSON-RPC batch
+# of Multicall3 aggregate3 eth_calls (getEthBalance + balanceOf for every wallet/token),
+# or plain eth_getBalance/eth_calls on chains without Multicall3. Rows are produced
+# window by window, so memory depends on the window size, not on how many wallets
+# are passed in.
+# BULK_WINDOW_CALLS     balance reads per HTTP request (wallets per window = this / columns)
+# BULK_CONCURRENCY      windows in flight at once on the async path
+# BULK_MAX_TOKENS       tokens accepted per request
+# BULK_TOOL_MAX_ADDRESSES  wallets accepted by the agent tool; larger lists go to POST /balances/bulk
+BULK_WINDOW_CALLS = int(os.environ.get("BULK_WINDOW_CALLS", 2000))
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", 4))
+BULK_MAX_TOKENS = int(os.environ.get("BULK_MAX_TOKENS", 50))
+BULK_TOOL_MAX_ADDRESSES = int(os.environ.get("BULK_TOOL_MAX_ADDRESSES", 100))
+
+
+class BulkRequestError(ValueError):
+    """The chain or token list can't be used (reported before any row is produced)."""
+
+
+def resolve_tokens(chain: str, tokens) -> tuple[bool, list]:
+    """
+    (include_native, [(symbol or address as given, checksum address)]) for a token list.
+    Symbols are looked up in TOKEN_MAP; "native" selects the chain's native coin.
+    None or an empty list means native plus every TOKEN_MAP token of the chain.
+    """
+    from lang import TOKEN_MAP
+    chain = chain.lower()
+    try:
+        chain_config(chain)
+    except ValueError as e:
+        raise BulkRequestError(str(e))
+    known = {symbol.upper(): address for symbol, address in TOKEN_MAP.get(chain, {}).items() if address}
+    if not tokens:
+        return True, [(symbol, to_checksum_address(address)) for symbol, address in known.items()]
+    if len(tokens) > BULK_MAX_TOKENS:
+        raise BulkRequestError(f"Too many tokens: {len(tokens)} (max {BULK_MAX_TOKENS}).")
+    include_native = False
+    resolved = []
+    for token in tokens:
+        token = str(token).strip()
+        if token.lower() == "native":
+            include_native = True
+        elif Web3.is_address(token):
+            resolved.append((token, to_checksum_address(token)))
+        elif token.upper() in known:
+            resolved.append((token.upper(), to_checksum_address(known[token.upper()])))
+        else:
+            raise BulkRequestError(f"Unknown token {token} on {chain}. Use a symbol from TOKEN_MAP or a contract address.")
+    return include_native, list(dict.fromkeys(resolved))
+
+
+def _columns(chain: str, include_native: bool, tokens: list, metadata: dict) -> list:
+    """Header entries describing each balance column, in row order."""
+    from lang import _get_native_symbol
+    columns = [{"column": "native", "symbol": _get_native_symbol(chain), "decimals": 18}] if include_native else []
+    for label, address in tokens:
+        decimals, symbol = metadata[address]
+        columns.append({"column": label, "symbol": symbol, "token_address": address, "decimals": decimals})
+    return columns
+
+
+def _plan_metadata(chain: str, tokens: list, known: dict) -> tuple:
+    """One batch reading decimals/symbol for every token the metadata cache doesn't know."""
+    plans = [(address, *plan_metadata(chain, address)) for _, address in tokens if known[address] is None]
+    rpc_calls = [call for _, calls, _ in plans for call in calls]
+
+    def decode(responses):
+        metadata = dict(known)
+        offset = 0
+        for address, calls, decode_metadata in plans:
+            try:
+                metadata[address] = decode_metadata(responses[offset:offset + len(calls)])
+            except TokenReadError as e:
+                raise BulkRequestError(f"Failed to read decimals for {address}: {e}")
+            offset += len(calls)
+        return metadata
+
+    return rpc_calls, decode
+
+
+def _plan_window(chain: str, wallets: list, columns: list) -> tuple:
+    """(JSON-RPC calls, decode(responses) -> rows in wallet order) for one window of wallets."""
+    include_native = bool(columns) and columns[0]["column"] == "native"
+    token_columns = columns[1:] if include_native else columns
+    entries = [(wallet, to_checksum_address(wallet) if Web3.is_address(wallet) else None) for wallet in wallets]
+    valid = [checksum for _, checksum in entries if checksum]
+    multicall = multicall_address(chain)
+
+    calls = []
+    for wallet in valid:
+        if include_native and multicall:
+            calls.append((multicall, eth_balance_data(wallet)))
+        calls.extend((column["token_address"], balance_of_data(wallet)) for column in token_columns)
+    rpc_calls, decode_calls = plan_calls(chain, calls) if calls else ([], lambda responses: [])
+    native_calls = ([("eth_getBalance", [wallet, "latest"]) for wallet in valid]
+                    if include_native and not multicall else [])
+
+    def cell(result, decimals):
+        try:
+            return decode_uint(result) / (10 ** decimals)
+        except TokenReadError:
+            return None
+
+    def decode(responses):
+        natives = iter(responses[:len(native_calls)])
+        results = iter(decode_calls(responses[len(native_calls):]))
+        rows = []
+        for wallet, checksum in entries:
+            if checksum is None:
+                rows.append({"address": wallet, "status": "error", "error": "Invalid wallet address."})
+                continue
+            balances = {}
+            for column in columns:
+                if column["column"] == "native" and not multicall:
+                    native = next(natives)
+                    balances["native"] = None if isinstance(native, Exception) else int(native, 16) / 1e18
+                else:
+                    balances[column["column"]] = cell(next(results), column["decimals"])
+            failed = sum(1 for value in balances.values() if value is None)
+            status = "success" if not failed else "error" if failed == len(balances) else "partial"
+            rows.append({"address": checksum, "status": status, "balances": balances})
+        return rows
+
+    return native_calls + rpc_calls, decode
+
+
+def window_size(columns: list) -> int:
+    return max(1, BULK_WINDOW_CALLS // max(1, len(columns)))
+
+
+def _read_metadata(chain: str, tokens: list) -> dict:
+    known = {address: cached_metadata(chain, address) for _, address in tokens}
+    rpc_calls, decode = _plan_metadata(chain, tokens, known)
+    return decode(batch_request(chain, rpc_calls) if rpc_calls else [])
+
+
+async def _aread_metadata(chain: str, tokens: list) -> dict:
+    known = {address: await acached_metadata(chain, address) for _, address in tokens}
+    rpc_calls, decode = _plan_metadata(chain, tokens, known)
+    return decode(await abatch_request(chain, rpc_calls) if rpc_calls else [])
+
+
+def _tally(summary: dict, rows: list):
+    for row in rows:
+        summary["wallets"] += 1
+        summary["errors"] += row["status"] == "error"
+        yield {"type": "row", **row}
+
+
+def _windows(wallets, size: int):
+    window = []
+    for wallet in wallets:
+        wallet = str(wallet).strip()
+        if not wallet:
+            continue
+        window.append(wallet)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def iter_rows(chain: str, wallets, tokens=None):
+    """
+    Yields a header, one row per wallet in input order, then a summary, as dicts.
+    wallets can be any iterable (e.g. a generator over a file); it is consumed window by window.
+    Raises BulkRequestError before the header if the chain or tokens are unusable.
+    """
+    chain = chain.lower()
+    include_native, resolved = resolve_tokens(chain, tokens)
+    columns = _columns(chain, include_native, resolved, _read_metadata(chain, resolved))
+    yield {"type": "header", "chain": chain, "columns": columns}
+    summary = {"type": "summary", "wallets": 0, "errors": 0, "requests": 0}
+    for window in _windows(wallets, window_size(columns)):
+        rpc_calls, decode = _plan_window(chain, window, columns)
+        try:
+            rows = decode(batch_request(chain, rpc_calls) if rpc_calls else [])
+            summary["requests"] += 1 if rpc_calls else 0
+        except Exception as e:
+            rows = [{"address": wallet, "status": "error", "error": str(e)} for wallet in window]
+        for row in _tally(summary, rows):
+            yield row
+    yield summary
+
+
+async def _aiter_wallets(wallets):
+    if hasattr(wallets, "__aiter__"):
+        async for wallet in wallets:
+            yield wallet
+    else:
+        for wallet in wallets:
+            yield wallet
+
+
+async def _awindows(wallets, size: int):
+    window = []
+    async for wallet in _aiter_wallets(wallets):
+        wallet = str(wallet).strip()
+        if not wallet:
+            continue
+        window.append(wallet)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+async def aiter_rows(chain: str, wallets, tokens=None):
+    """
+    Async iter_rows; wallets may be a sync or async iterable. Up to BULK_CONCURRENCY
+    windows are in flight while earlier rows are yielded, still in input order.
+    """
+    chain = chain.lower()
+    include_native, resolved = resolve_tokens(chain, tokens)
+    columns = _columns(chain, include_native, resolved, await _aread_metadata(chain, resolved))
+    yield {"type": "header", "chain": chain, "columns": columns}
+    summary = {"type": "summary", "wallets": 0, "errors": 0, "requests": 0}
+
+    async def read(window):
+        # Encoding and decoding a window is CPU work (checksums, ABI); keep it off the event loop
+        rpc_calls, decode = await asyncio.to_thread(_plan_window, chain, window, columns)
+        try:
+            rows = await asyncio.to_thread(decode, await abatch_request(chain, rpc_calls) if rpc_calls else [])
+            summary["requests"] += 1 if rpc_calls else 0
+            return rows
+        except Exception as e:
+            return [{"address": wallet, "status": "error", "error": str(e)} for wallet in window]
+
+    in_flight = deque()
+    try:
+        windows = _awindows(wallets, window_size(columns))
+        async for window in windows:
+            in_flight.append(asyncio.ensure_future(read(window)))
+            if len(in_flight) < BULK_CONCURRENCY:
+                continue
+            for row in _tally(summary, await in_flight.popleft()):
+                yield row
+        while in_flight:
+            for row in _tally(summary, await in_flight.popleft()):
+                yield row
+    finally:
+        # Client went away mid-stream
+        for task in in_flight:
+            task.cancel()
+    yield summary
+
+
+def _tool_response(chain: str, records: list) -> str:
+    header, rows, summary = records[0], records[1:-1], records[-1]
+    status = "success" if not summary["errors"] else "partial" if summary["errors"] < summary["wallets"] else "error"
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": status,
+        "query_type": "bulk_balances",
+        "chain": chain,
+        "columns": header["columns"],
+        "rows": [{key: value for key, value in row.items() if key != "type"} for row in rows],
+        "summary": {key: value for key, value in summary.items() if key != "type"}
+    })
+
+
+def _tool_error(chain: str, error: str) -> str:
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": "error",
+        "query_type": "bulk_balances",
+        "chain": chain,
+        "error": error
+    })
+
+
+def _tool_limit_error(chain: str, addresses: list):
+    if len(addresses) > BULK_TOOL_MAX_ADDRESSES:
+        return _tool_error(chain, f"Too many addresses: {len(addresses)} (max {BULK_TOOL_MAX_ADDRESSES}). "
+                                  "Use POST /balances/bulk for larger lists.")
+    return None
+
+
+def bulk_balances_tool(chain: str, addresses: list, tokens=None) -> str:
+    """Body of the get_bulk_balances tool: the whole result as one balance_query JSON."""
+    error = _tool_limit_error(chain, addresses)
+    if error:
+        return error
+    try:
+        return _tool_response(chain, list(iter_rows(chain, addresses, tokens)))
+    except Exception as e:
+        return _tool_error(chain, f"Failed to fetch balances: {e}")
+
+
+async def abulk_balances_tool(chain: str, addresses: list, tokens=None) -> str:
+    """Async bulk_balances_tool."""
+    error = _tool_limit_error(chain, addresses)
+    if error:
+        return error
+    try:
+        return _tool_response(chain, [record async for record in aiter_rows(chain, addresses, tokens)])
+    except Exception as e:
+        return _tool_error(chain, f"Failed to fetch balances: {e}")
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+
+import read_cache
+
+# Background tracker of each chain's head, started and stopped with the FastAPI app
+# (server.py). Keeps the latest block number, base fee and gas price of every chain in
+# EVM_CHAINS in a per-process snapshot, so tools can use them without an RPC call
+# (see tx_prep.py). A snapshot older than CHAIN_HEAD_MAX_STALENESS is not served and
+# the tools fall back to live reads, e.g. when the tracker isn't running.
+# Each chain is polled with one JSON-RPC batch (latest block header + eth_gasPrice, and
+# eth_feeHistory when fees.py's window is due) on the shared async session. A chain
+# with a "ws" endpoint in EVM_CHAINS subscribes to newHeads instead; if the socket
+# fails it is polled and the subscription retried later.
+# Every head is passed on to read_cache, so reads cached at an older block stop being
+# served as soon as the tracker sees a new one, and eth_blockNumber/eth_gasPrice are
+# answered from the cache.
+# Every chain with an rpc endpoint is tracked unless CHAIN_HEAD_CHAINS names a subset;
+# each worker polls its chains whether or not it gets traffic. rpc.py (and with it web3)
+# is imported by the tracking tasks, not by this module, so worker boot stays light.
+# CHAIN_HEAD_TRACKER        set to "false" to not start the tracker
+# CHAIN_HEAD_CHAINS         comma-separated chains to track, e.g. "polygon,ethereum" (default: all)
+# CHAIN_HEAD_POLL_INTERVAL  seconds between polls of a chain
+# CHAIN_HEAD_MAX_STALENESS  age in seconds after which a snapshot is ignored
+# CHAIN_HEAD_WS_RETRY       seconds of polling before a failed subscription is retried
+# A chain in EVM_CHAINS can override the poll interval with "head_poll_interval".
+CHAIN_HEAD_TRACKER = os.environ.get("CHAIN_HEAD_TRACKER", "true").lower() == "true"
+CHAIN_HEAD_CHAINS = [c.strip().lower() for c in os.environ.get("CHAIN_HEAD_CHAINS", "").split(",") if c.strip()]
+CHAIN_HEAD_POLL_INTERVAL = float(os.environ.get("CHAIN_HEAD_POLL_INTERVAL", 2))
+CHAIN_HEAD_MAX_STALENESS = float(os.environ.get("CHAIN_HEAD_MAX_STALENESS", 10))
+CHAIN_HEAD_WS_RETRY = float(os.environ.get("CHAIN_HEAD_WS_RETRY", 60))
+
+_snapshots: dict[str, dict] = {}  # chain -> {"block_number", "base_fee", "gas_price", "source", "seen"}
+_errors: dict[str, str] = {}
+_tasks: dict[str, asyncio.Task] = {}
+
+
+def _int(value):
+    # Header fields are hex strings over HTTP and ints when web3 formats them (websocket)
+    if value is None or isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+def tracked_chains() -> list:
+    from lang import EVM_CHAINS
+    return [chain for chain, config in EVM_CHAINS.items()
+            if config.get("rpc") and (not CHAIN_HEAD_CHAINS or chain in CHAIN_HEAD_CHAINS)]
+
+
+def _record(chain: str, block_number, base_fee, gas_price, source: str) -> None:
+    block_number = _int(block_number)
+    gas_price = _int(gas_price)
+    # Replaced whole so threadpool readers never see a half-updated snapshot
+    _snapshots[chain] = {
+        "block_number": block_number,
+        "base_fee": _int(base_fee),
+        "gas_price": gas_price,
+        "source": source,
+        "seen": time.monotonic(),
+    }
+    if _errors.pop(chain, None):
+        print(f"[ChainHead] {chain} recovered at block {block_number}")
+    read_cache.note_head(chain, block_number)
+    block_key = read_cache.cache_key(chain, "eth_blockNumber", [])
+    if block_key is not None:
+        read_cache.put(block_key, hex(block_number), block_number)
+    price_key = read_cache.cache_key(chain, "eth_gasPrice", [])
+    if price_key is not None:
+        read_cache.put(price_key, hex(gas_price), block_number)
+
+
+def _fail(chain: str, error: str) -> None:
+    # Log once per distinct failure; polls keep retrying every interval
+    if _errors.get(chain) != error:
+        print(f"[ChainHead] {chain}: {error}")
+    _errors[chain] = error
+
+
+def _raise_failed(responses: list) -> None:
+    for response in responses:
+        if isinstance(response, Exception):
+            raise response
+
+
+async def _poll(chain: str) -> None:
+    # fees.py's eth_feeHistory window is refreshed in the same batch when it's due
+    from fees import refresh_calls, store_history
+    from rpc import abatch_request
+    history = refresh_calls(chain)
+    try:
+        responses = await abatch_request(
+            chain, [("eth_getBlockByNumber", ["latest", False]), ("eth_gasPrice", []), *history], cache=False
+        )
+    except Exception as e:
+        if history:
+            store_history(chain, e)
+        raise
+    if history:
+        store_history(chain, responses[2])
+    _raise_failed(responses[:2])
+    block, gas_price = responses[:2]
+    _record(chain, block["number"], block.get("baseFeePerGas"), gas_price, "poll")
+
+
+async def _follow(chain: str, url: str) -> None:
+    """Records every newHeads header until the subscription ends or fails."""
+    from web3 import AsyncWeb3, WebSocketProvider
+    from rpc import abatch_request
+    async with AsyncWeb3(WebSocketProvider(url)) as w3:
+        await w3.eth.subscribe("newHeads")
+        print(f"[ChainHead] {chain} subscribed to newHeads")
+        async for message in w3.socket.process_subscriptions():
+            header = message["result"]
+            # Headers carry no gas price; it comes over the chain's HTTP session
+            responses = await abatch_request(chain, [("eth_gasPrice", [])], cache=False)
+            _raise_failed(responses)
+            _record(chain, header["number"], header.get("baseFeePerGas"), responses[0], "ws")
+
+
+async def _track(chain: str) -> None:
+    from rpc import chain_config
+    while True:
+        config = chain_config(chain)
+        if config.get("ws"):
+            try:
+                await _follow(chain, config["ws"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _fail(chain, f"websocket failed, polling: {e}")
+            poll_until = time.monotonic() + CHAIN_HEAD_WS_RETRY
+        else:
+            poll_until = float("inf")
+        while time.monotonic() < poll_until:
+            try:
+                await _poll(chain)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _fail(chain, f"poll failed: {e}")
+            await asyncio.sleep(float(chain_config(chain).get("head_poll_interval", CHAIN_HEAD_POLL_INTERVAL)))
+
+
+async def start() -> None:
+    """Starts one tracking task per chain on the running loop (call from app startup)."""
+    if not CHAIN_HEAD_TRACKER or _tasks:
+        return
+    chains = tracked_chains()
+    if not chains:
+        return
+    for chain in chains:
+        _tasks[chain] = asyncio.create_task(_track(chain), name=f"chain-head-{chain}")
+    print(f"[ChainHead] Tracking {len(_tasks)} chains every {CHAIN_HEAD_POLL_INTERVAL:g}s")
+
+
+async def stop() -> None:
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def snapshot(chain: str):
+    """
+    {"block_number", "base_fee", "gas_price", "age_s", "source"} for chain, or None if the
+    tracker has no head younger than CHAIN_HEAD_MAX_STALENESS (callers then read live).
+    base_fee is None on chains without EIP-1559.
+    """
+    current = _snapshots.get(chain.lower())
+    if current is None:
+        return None
+    age = time.monotonic() - current["seen"]
+    if age > CHAIN_HEAD_MAX_STALENESS:
+        return None
+    return {**{key: value for key, value in current.items() if key != "seen"}, "age_s": round(age, 3)}
+
+
+def gas_price(chain: str):
+    """Tracked gas price in wei, or None if it's missing or stale."""
+    current = snapshot(chain)
+    return current["gas_price"] if current else None
+
+
+def stats() -> dict:
+    now = time.monotonic()
+    chains = {}
+    for chain in sorted(set(_snapshots) | set(_errors) | set(_tasks)):
+        current = _snapshots.get(chain)
+        entry = {"tracked": chain in _tasks}
+        if current is not None:
+            age = now - current["seen"]
+            entry.update({key: value for key, value in current.items() if key != "seen"})
+            entry.update({"age_s": round(age, 3), "fresh": age <= CHAIN_HEAD_MAX_STALENESS})
+        if chain in _errors:
+            entry["error"] = _errors[chain]
+        chains[chain] = entry
+    return {
+        "enabled": CHAIN_HEAD_TRACKER,
+        "tracked_chains": sorted(_tasks),
+        "poll_interval_s": CHAIN_HEAD_POLL_INTERVAL,
+        "max_staleness_s": CHAIN_HEAD_MAX_STALENESS,
+        "chains": chains,
+    }
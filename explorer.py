@@ -0,0 +1,211 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import EXPLORER_LATENCY, EXPLORER_QUEUE_WAIT, EXPLORER_REQUESTS, label
+from redis_store import get_sync_redis, mark_unavailable
+
+# Client for the Etherscan-style explorer APIs (explorer_api in EVM_CHAINS), used by
+# tx_history.py. One client per explorer_key_env keeps a keep-alive session and a
+# token bucket for that API key, since explorers limit requests per key (about 5/s).
+# The bucket lives in Redis and is updated by one Lua script per request, so every
+# worker of the cluster shares it; without Redis each worker keeps its own.
+# A request reserves the next free slot of its key's bucket and sleeps until then, so
+# requests over the limit queue up in order instead of failing. One whose slot lies past
+# its deadline fails at once. An explorer that still answers "rate limit reached" (or
+# HTTP 429) is retried with exponential backoff while the deadline allows.
+# EXPLORER_RATE             requests per second per API key
+# EXPLORER_BURST            requests a key may send at once after being idle
+# EXPLORER_DEADLINE         seconds a request may spend queueing and retrying
+# EXPLORER_TIMEOUT          read timeout in seconds for one request
+# EXPLORER_CONNECT_TIMEOUT  TCP/TLS connect timeout in seconds
+# EXPLORER_POOL_SIZE        connections kept open per explorer host (per worker process)
+# EXPLORER_RETRIES          retries after a rate-limit response
+# EXPLORER_BACKOFF          seconds before the first retry, doubled for each one after
+# EXPLORER_REDIS            set to "false" to keep buckets in-process only
+# A chain in EVM_CHAINS can set "explorer_rate" for its key.
+EXPLORER_RATE = float(os.environ.get("EXPLORER_RATE", 5))
+EXPLORER_BURST = float(os.environ.get("EXPLORER_BURST", EXPLORER_RATE))
+EXPLORER_DEADLINE = float(os.environ.get("EXPLORER_DEADLINE", 15))
+EXPLORER_TIMEOUT = float(os.environ.get("EXPLORER_TIMEOUT", 10))
+EXPLORER_CONNECT_TIMEOUT = float(os.environ.get("EXPLORER_CONNECT_TIMEOUT", 5))
+EXPLORER_POOL_SIZE = int(os.environ.get("EXPLORER_POOL_SIZE", 10))
+EXPLORER_RETRIES = int(os.environ.get("EXPLORER_RETRIES", 3))
+EXPLORER_BACKOFF = float(os.environ.get("EXPLORER_BACKOFF", 0.5))
+EXPLORER_REDIS = os.environ.get("EXPLORER_REDIS", "true").lower() == "true"
+
+REDIS_KEY_PREFIX = "explorer:bucket"
+
+# KEYS[1] bucket hash; ARGV: rate, burst, now, longest wait, key ttl.
+# Reserves a token and returns the seconds to wait for it, or -1 (nothing reserved) if
+# that is longer than the longest wait. Tokens go negative while requests are queued.
+_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local wait = math.max(0, (1 - tokens) / rate)
+if wait > tonumber(ARGV[4]) then
+    return '-1'
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - 1, 'at', now)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return tostring(wait)
+"""
+
+
+class ExplorerError(Exception):
+    """The explorer failed a request or answered with an error instead of a result."""
+
+
+_script = None
+_clients: dict[str, "_ExplorerClient"] = {}
+_clients_lock = threading.Lock()
+
+
+def _rate_limited(response: requests.Response, data) -> bool:
+    if response.status_code == 429:
+        return True
+    # Etherscan-style APIs answer HTTP 200 with status "0" and a message in result
+    return (isinstance(data, dict) and data.get("status") == "0"
+            and "rate limit" in str(data.get("result", "")).lower())
+
+
+class _ExplorerClient:
+    """Keep-alive session and rate limit for one explorer API key."""
+
+    def __init__(self, key_env: str, rate: float):
+        self.key_env = key_env
+        self.rate = rate
+        self.burst = max(1.0, EXPLORER_BURST * rate / EXPLORER_RATE)
+        # Buckets follow the key itself, so chains sharing a key share its limit
+        api_key = os.environ.get(key_env, "")
+        self.bucket = f"{REDIS_KEY_PREFIX}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=EXPLORER_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._tokens = self.burst
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "rate_limited": 0, "retries": 0, "deadline_exceeded": 0, "errors": 0,
+                        "queued_s": 0.0}
+
+    def _count(self, name: str, amount=1) -> None:
+        # Requests of one key run on many threads at once
+        with self._lock:
+            self._counts[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: round(value, 3) if isinstance(value, float) else value
+                    for name, value in self._counts.items()}
+
+    def _local_reserve(self, longest: float):
+        # Same steps as _RESERVE_SCRIPT, for a bucket kept in-process
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self._tokens + (now - self._at) * self.rate)
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if wait > longest:
+                return None
+            self._tokens, self._at = tokens - 1, now
+            return wait
+
+    def reserve(self, longest: float):
+        """Seconds until this request may be sent, or None if that is more than longest."""
+        global _script
+        client = get_sync_redis() if EXPLORER_REDIS else None
+        if client is not None:
+            try:
+                if _script is None or _script.registered_client is not client:
+                    _script = client.register_script(_RESERVE_SCRIPT)
+                wait = float(_script(keys=[self.bucket], args=[self.rate, self.burst, time.time(), longest, 60]))
+                return wait if wait >= 0 else None
+            except Exception as e:
+                mark_unavailable(e)
+        return self._local_reserve(longest)
+
+    def get(self, chain: str, url: str, params: dict, deadline: float):
+        """GETs url, queueing for the key's rate limit and retrying while deadline (monotonic) allows."""
+        chain = label(chain)
+        for attempt in range(EXPLORER_RETRIES + 1):
+            wait = self.reserve(deadline - time.monotonic())
+            if wait is None:
+                self._count("deadline_exceeded")
+                EXPLORER_REQUESTS.labels(chain, "deadline").inc()
+                raise ExplorerError(f"Explorer rate limit for {self.key_env}: request would wait past its deadline")
+            EXPLORER_QUEUE_WAIT.observe(wait)
+            self._count("queued_s", wait)
+            time.sleep(wait)
+            remaining = deadline - time.monotonic()
+            start = time.perf_counter()
+            self._count("requests")
+            try:
+                response = self.session.get(url, params=params,
+                                            timeout=(EXPLORER_CONNECT_TIMEOUT, min(EXPLORER_TIMEOUT, max(remaining, 0.1))))
+                data = response.json() if response.status_code != 429 else None
+            except Exception:
+                self._count("errors")
+                EXPLORER_REQUESTS.labels(chain, "error").inc()
+                raise
+            finally:
+                EXPLORER_LATENCY.labels(chain).observe(time.perf_counter() - start)
+            if not _rate_limited(response, data):
+                response.raise_for_status()
+                EXPLORER_REQUESTS.labels(chain, "ok").inc()
+                return data
+            self._count("rate_limited")
+            EXPLORER_REQUESTS.labels(chain, "rate_limited").inc()
+            backoff = EXPLORER_BACKOFF * 2 ** attempt * random.uniform(1, 1.5)
+            if attempt == EXPLORER_RETRIES or time.monotonic() + backoff >= deadline:
+                break
+            self._count("retries")
+            time.sleep(backoff)
+        raise ExplorerError(f"Explorer rate limit reached for {self.key_env}")
+
+
+def _client(chain: str, config: dict) -> _ExplorerClient:
+    key_env = config["explorer_key_env"]
+    client = _clients.get(key_env)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key_env)
+            if client is None:
+                client = _clients[key_env] = _ExplorerClient(key_env, float(config.get("explorer_rate", EXPLORER_RATE)))
+    return client
+
+
+def get(chain: str, params: dict, deadline: float = None) -> dict:
+    """
+    Explorer API response (parsed JSON) for params on chain, with its API key added.
+    deadline is seconds from now (EXPLORER_DEADLINE by default). Raises ExplorerError if
+    the request can't be sent before the deadline or stays rate limited, and requests'
+    errors for transport or HTTP failures.
+    """
+    from lang import EVM_CHAINS
+    config = EVM_CHAINS[chain.lower()]
+    if not config.get("explorer_api"):
+        raise ExplorerError(f"No explorer API for {chain}")
+    client = _client(chain, config)
+    params = {**params, "apikey": os.environ.get(config["explorer_key_env"], "")}
+    return client.get(chain, config["explorer_api"], params, time.monotonic() + (deadline or EXPLORER_DEADLINE))
+
+
+def stats() -> dict:
+    return {
+        "rate_per_key": EXPLORER_RATE,
+        "deadline_s": EXPLORER_DEADLINE,
+        "keys": {
+            key_env: {"rate": client.rate, **client.stats()}
+            for key_env, client in list(_clients.items())
+        },
+    }
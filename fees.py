@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from statistics import median
+
+import chain_head
+import read_cache
+from rpc import RPCError
+
+# Fee suggestions for the prepare_* tools and estimate_gas.
+# Chains with "eip1559": True in EVM_CHAINS get type-2 fees computed from a rolling
+# eth_feeHistory window kept per chain: the base fee of the next block plus the priority
+# fees paid at the slow/normal/fast percentiles over the last FEE_HISTORY_BLOCKS blocks.
+# A refresh only asks for the blocks added since the previous one, and the call rides in
+# a batch the caller sends anyway (tx_prep.py, or chain_head.py's poll while the tracker
+# runs), so a fee quote never costs a round trip of its own.
+# Other chains, or a chain whose node doesn't know eth_feeHistory, get a legacy gasPrice
+# (from chain_head.py's snapshot when it is fresh).
+# FEE_HISTORY_BLOCKS         blocks kept in the window
+# FEE_HISTORY_MAX_AGE        seconds before the window is refreshed
+# FEE_HISTORY_MAX_STALENESS  seconds a window is still used while another request refreshes it
+# FEE_PERCENTILES            priority fee percentiles for slow,normal,fast
+# FEE_BASE_FEE_MULTIPLIER    maxFeePerGas = next base fee * this + priority fee
+# FEE_SPEED                  tier used for prepared transactions
+# A chain in EVM_CHAINS can set "min_priority_fee" (wei) as a floor for the priority fee.
+
+
+def _percentiles(setting: str) -> list:
+    # One per speed, in the ascending 0-100 order eth_feeHistory accepts
+    try:
+        percentiles = [float(p) for p in setting.split(",")]
+    except ValueError:
+        percentiles = []
+    if len(percentiles) != 3 or percentiles != sorted(percentiles) or not 0 <= percentiles[0] <= percentiles[-1] <= 100:
+        raise ValueError(f"FEE_PERCENTILES must be three ascending numbers from 0 to 100 "
+                         f"(slow,normal,fast), got {setting!r}")
+    return percentiles
+
+
+FEE_HISTORY_BLOCKS = int(os.environ.get("FEE_HISTORY_BLOCKS", 20))
+FEE_HISTORY_MAX_AGE = float(os.environ.get("FEE_HISTORY_MAX_AGE", 6))
+FEE_HISTORY_MAX_STALENESS = float(os.environ.get("FEE_HISTORY_MAX_STALENESS", 30))
+FEE_PERCENTILES = _percentiles(os.environ.get("FEE_PERCENTILES", "10,50,90"))
+FEE_BASE_FEE_MULTIPLIER = float(os.environ.get("FEE_BASE_FEE_MULTIPLIER", 2))
+FEE_SPEED = os.environ.get("FEE_SPEED", "normal")
+
+SPEEDS = ("slow", "normal", "fast")
+# Read when eth_feeHistory can't be used for a type-2 chain
+LEGACY_CALLS = [("eth_gasPrice", [])]
+
+_windows: dict[str, dict] = {}  # chain -> {"rewards": {block: [slow, normal, fast] or None}, "newest", "quote", "fetched"}
+_refreshing: set[str] = set()
+_legacy: set[str] = set()  # "eip1559" chains whose node rejected eth_feeHistory
+_lock = threading.Lock()
+
+
+def uses_eip1559(chain: str) -> bool:
+    from lang import EVM_CHAINS
+    chain = chain.lower()
+    return bool(EVM_CHAINS.get(chain, {}).get("eip1559")) and chain not in _legacy
+
+
+def _history_call(chain: str, window) -> tuple:
+    count = FEE_HISTORY_BLOCKS
+    head = read_cache.head(chain)  # kept current by chain_head.py while it runs
+    if window is not None and head is not None:
+        count = min(FEE_HISTORY_BLOCKS, max(1, head - window["newest"]))
+    return "eth_feeHistory", [hex(count), "latest", FEE_PERCENTILES]
+
+
+def refresh_calls(chain: str) -> list:
+    """
+    [eth_feeHistory call] for the caller to add to its batch if chain's window needs a
+    refresh, else []. The response must be passed to store_history.
+    """
+    chain = chain.lower()
+    if not uses_eip1559(chain):
+        return []
+    with _lock:
+        window = _windows.get(chain)
+        age = time.monotonic() - window["fetched"] if window is not None else None
+        if window is not None and age <= FEE_HISTORY_MAX_AGE:
+            return []
+        if window is not None and chain in _refreshing and age <= FEE_HISTORY_MAX_STALENESS:
+            # Someone else's batch is already refreshing it
+            return []
+        _refreshing.add(chain)
+        return [_history_call(chain, window)]
+
+
+def _quote(chain: str, rewards: dict, next_base_fee: int) -> dict:
+    from rpc import chain_config
+    floor = int(chain_config(chain).get("min_priority_fee", 0))
+    # Empty blocks report zero rewards, which says nothing about what it takes to get in
+    filled = [reward for reward in rewards.values() if reward]
+    tiers = {}
+    for i, speed in enumerate(SPEEDS):
+        priority = max(int(median(reward[i] for reward in filled)) if filled else 0, floor)
+        tiers[speed] = {
+            "maxFeePerGas": int(next_base_fee * FEE_BASE_FEE_MULTIPLIER) + priority,
+            "maxPriorityFeePerGas": priority
+        }
+    return {"type": 2, "base_fee": next_base_fee, "tiers": tiers}
+
+
+def store_history(chain: str, response) -> None:
+    """Merges an eth_feeHistory response (or the RPCError it came back as) into chain's window."""
+    chain = chain.lower()
+    with _lock:
+        _refreshing.discard(chain)
+        if isinstance(response, Exception):
+            if isinstance(response, RPCError) and response.code == -32601:
+                print(f"[Fees] {chain} has no eth_feeHistory; using legacy gas prices")
+                _legacy.add(chain)
+            return
+        window = _windows.get(chain)
+        rewards = dict(window["rewards"]) if window is not None else {}
+        oldest = int(response["oldestBlock"], 16)
+        for i, (ratio, reward) in enumerate(zip(response["gasUsedRatio"], response.get("reward") or [])):
+            rewards[oldest + i] = [int(value, 16) for value in reward] if ratio else None
+        if not rewards:
+            return
+        newest = max(rewards)
+        rewards = {number: reward for number, reward in rewards.items() if number > newest - FEE_HISTORY_BLOCKS}
+        # The last base fee is the one of the block after newest
+        next_base_fee = int(response["baseFeePerGas"][-1], 16)
+        _windows[chain] = {
+            "rewards": rewards,
+            "newest": newest,
+            "quote": _quote(chain, rewards, next_base_fee),
+            "fetched": time.monotonic()
+        }
+
+
+def cached_quote(chain: str):
+    """Type-2 quote from chain's window, or None if there is no usable window."""
+    window = _windows.get(chain.lower())
+    if window is None or time.monotonic() - window["fetched"] > FEE_HISTORY_MAX_STALENESS:
+        return None
+    return window["quote"]
+
+
+def legacy_quote(responses: list) -> dict:
+    """Quote from the LEGACY_CALLS responses; raises the node's RPCError if it failed."""
+    if isinstance(responses[0], Exception):
+        raise responses[0]
+    return {"type": 0, "gasPrice": int(responses[0], 16)}
+
+
+def plan_quote(chain: str) -> tuple[list, object]:
+    """
+    (JSON-RPC calls, decode(responses) -> quote) for chain's fees, where a quote is
+    {"type": 2, "base_fee", "tiers": {speed: {"maxFeePerGas", "maxPriorityFeePerGas"}}}
+    or {"type": 0, "gasPrice"}. decode returns None when a type-2 chain has no window
+    after all (e.g. eth_feeHistory failed); send LEGACY_CALLS and use legacy_quote then.
+    """
+    if uses_eip1559(chain):
+        history = refresh_calls(chain)
+
+        def decode(responses):
+            if history:
+                store_history(chain, responses[0])
+            return cached_quote(chain)
+
+        return history, decode
+
+    gas_price = chain_head.gas_price(chain)
+    if gas_price is not None:
+        return [], lambda responses: {"type": 0, "gasPrice": gas_price}
+    return LEGACY_CALLS, legacy_quote
+
+
+def tx_fields(quote: dict, speed: str = FEE_SPEED) -> dict:
+    """Fee fields of an unsigned transaction for quote, as the prepare_* tools format them."""
+    if quote["type"] == 0:
+        return {'gasPrice': str(quote["gasPrice"])}
+    tier = quote["tiers"].get(speed, quote["tiers"]["normal"])
+    return {
+        'type': 2,
+        'maxFeePerGas': str(tier["maxFeePerGas"]),
+        'maxPriorityFeePerGas': str(tier["maxPriorityFeePerGas"])
+    }
+
+
+def fee_summary(quote: dict, gas: int) -> dict:
+    """Fees and their cost in native units for gas, per speed tier (estimate_gas output)."""
+    if quote["type"] == 0:
+        return {"type": "legacy", "gas_price": quote["gasPrice"], "estimated_cost": gas * quote["gasPrice"] / 1e18}
+    tiers = {}
+    for speed, tier in quote["tiers"].items():
+        # Type-2 transactions pay the base fee plus the tip, never more than maxFeePerGas
+        expected = min(tier["maxFeePerGas"], quote["base_fee"] + tier["maxPriorityFeePerGas"])
+        tiers[speed] = {**tier, "estimated_cost": gas * expected / 1e18, "max_cost": gas * tier["maxFeePerGas"] / 1e18}
+    return {"type": "eip1559", "base_fee": quote["base_fee"], "tiers": tiers}
+
+
+def stats() -> dict:
+    now = time.monotonic()
+    return {
+        "windows": {
+            chain: {"newest_block": window["newest"], "blocks": len(window["rewards"]),
+                    "age_s": round(now - window["fetched"], 3), "quote": window["quote"]}
+            for chain, window in list(_windows.items())
+        },
+        "legacy_fallback": sorted(_legacy),
+    }
@@ -0,0 +1,167 @@
+import json
+import os
+
+from redis.exceptions import WatchError
+
+from metrics import REDIS_LATENCY
+
+# Chat history lives in Redis lists instead of one JSON blob per user:
+#   chat_turns:{user_id}    recent messages, one JSON-encoded {"role", "content"} per entry
+#   chat_archive:{user_id}  older messages moved out of the live list, never sent to the LLM
+#
+# HISTORY_MAX_TURNS       turns (user + assistant pair) handed to the chat_history placeholder
+# HISTORY_MAX_TOKENS      optional token budget for that window (0 disables, ~4 chars per token)
+# HISTORY_MAX_STORED_TURNS turns kept in the live list before they are archived
+# HISTORY_ARCHIVE_MAX     messages kept in the archive (0 keeps everything)
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", 10))
+HISTORY_MAX_TOKENS = int(os.environ.get("HISTORY_MAX_TOKENS", 0))
+HISTORY_MAX_STORED_TURNS = max(int(os.environ.get("HISTORY_MAX_STORED_TURNS", 50)), HISTORY_MAX_TURNS)
+HISTORY_ARCHIVE_MAX = int(os.environ.get("HISTORY_ARCHIVE_MAX", 0))
+
+CHARS_PER_TOKEN = 4
+
+# Append messages, then move anything beyond the live cap to the archive in one round trip.
+# KEYS[1] = live list, KEYS[2] = archive list
+# ARGV[1] = max live messages, ARGV[2] = max archived messages (0 = unbounded), ARGV[3..] = messages
+_APPEND_SCRIPT = """
+local ARCHIVE_CHUNK = 1000
+for i = 3, #ARGV do
+  redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+local overflow = redis.call('LLEN', KEYS[1]) - tonumber(ARGV[1])
+if overflow > 0 then
+  local old = redis.call('LRANGE', KEYS[1], 0, overflow - 1)
+  -- Pushed in chunks: unpack() of a large overflow (e.g. after the cap was lowered)
+  -- exceeds Lua's stack
+  for i = 1, #old, ARCHIVE_CHUNK do
+    redis.call('RPUSH', KEYS[2], unpack(old, i, math.min(i + ARCHIVE_CHUNK - 1, #old)))
+  end
+  redis.call('LTRIM', KEYS[1], overflow, -1)
+  if tonumber(ARGV[2]) > 0 then
+    redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+  end
+end
+return redis.call('LLEN', KEYS[1])
+"""
+
+
+def turns_key(user_id: str) -> str:
+    return f"chat_turns:{user_id}"
+
+
+def archive_key(user_id: str) -> str:
+    return f"chat_archive:{user_id}"
+
+
+def legacy_key(user_id: str) -> str:
+    # Pre-list format: the whole history as one JSON string
+    return f"chat_history:{user_id}"
+
+
+def _estimate_tokens(message: dict) -> int:
+    return len(str(message.get("content", ""))) // CHARS_PER_TOKEN + 1
+
+
+def apply_window(messages: list, max_turns: int = None, max_tokens: int = None) -> list:
+    """
+    Trims a message list to the newest turns that fit the turn window and token budget.
+
+    Messages are dropped from the oldest end two at a time so the window always starts
+    on a user message.
+    """
+    max_turns = HISTORY_MAX_TURNS if max_turns is None else max_turns
+    max_tokens = HISTORY_MAX_TOKENS if max_tokens is None else max_tokens
+    window = messages[-max_turns * 2:] if max_turns > 0 else []
+    if window and window[0].get("role") != "user":
+        window = window[1:]
+    if max_tokens > 0:
+        total = sum(_estimate_tokens(m) for m in window)
+        while window and total > max_tokens:
+            for m in window[:2]:
+                total -= _estimate_tokens(m)
+            window = window[2:]
+    return window
+
+
+def _decode(raw_messages: list) -> list:
+    messages = []
+    for raw in raw_messages:
+        try:
+            messages.append(json.loads(raw))
+        except (json.JSONDecodeError, TypeError):
+            # Skip corrupt entries rather than failing the whole request
+            continue
+    return messages
+
+
+async def _migrate_legacy(redis_client, user_id: str) -> None:
+    # WATCH/MULTI so that of two workers migrating the same session only one appends;
+    # the other's transaction fails because the first deleted the legacy key
+    async with redis_client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(legacy_key(user_id))
+            with REDIS_LATENCY.labels("get").time():
+                legacy = await pipe.get(legacy_key(user_id))
+            if not legacy:
+                return
+            try:
+                messages = json.loads(legacy)
+            except (json.JSONDecodeError, TypeError):
+                messages = []
+            pipe.multi()
+            if messages:
+                pipe.eval(_APPEND_SCRIPT, 2, *_append_args(user_id, messages))
+            pipe.delete(legacy_key(user_id))
+            with REDIS_LATENCY.labels("migrate").time():
+                await pipe.execute()
+        except WatchError:
+            pass
+
+
+async def load_history(redis_client, user_id: str) -> list:
+    """
+    Returns the windowed chat history for a user, ready for the chat_history placeholder.
+    Only the tail of the live list is read, so cost does not grow with session length.
+    """
+    if HISTORY_MAX_TURNS <= 0:
+        return []
+    # The legacy probe rides along with the read so empty histories cost one round trip
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.lrange(turns_key(user_id), -HISTORY_MAX_TURNS * 2, -1)
+    pipe.exists(legacy_key(user_id))
+    with REDIS_LATENCY.labels("lrange").time():
+        raw, has_legacy = await pipe.execute()
+    if not raw and has_legacy:
+        await _migrate_legacy(redis_client, user_id)
+        raw = await redis_client.lrange(turns_key(user_id), -HISTORY_MAX_TURNS * 2, -1)
+    return apply_window(_decode(raw))
+
+
+def _append_args(user_id: str, messages: list) -> list:
+    # KEYS and ARGV of _APPEND_SCRIPT
+    return [turns_key(user_id), archive_key(user_id), HISTORY_MAX_STORED_TURNS * 2, HISTORY_ARCHIVE_MAX,
+            *[json.dumps(m, ensure_ascii=False) for m in messages]]
+
+
+async def append_messages(redis_client, user_id: str, messages: list) -> int:
+    """Appends messages to the live list, archiving overflow. Returns the live list length."""
+    if not messages:
+        return 0
+    with REDIS_LATENCY.labels("append").time():
+        return await redis_client.eval(_APPEND_SCRIPT, 2, *_append_args(user_id, messages))
+
+
+def turn_messages(user_input: str, output: str) -> list:
+    # LangChain expects role/content format
+    return [
+        {"role": "user", "content": user_input},
+        {"role": "assistant", "content": output}
+    ]
+
+
+async def append_turn(redis_client, user_id: str, user_input: str, output: str) -> int:
+    return await append_messages(redis_client, user_id, turn_messages(user_input, output))
+
+
+async def load_archive(redis_client, user_id: str, start: int = 0, end: int = -1) -> list:
+    return _decode(await redis_client.lrange(archive_key(user_id), start, end))
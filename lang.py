@@ -1,25 +1,15 @@
 import json
 import os
-from dotenv import load_dotenv
-from langchain.tools import tool
-import serpapi
-load_dotenv() 
+import re
+from typing import TYPE_CHECKING
+from langchain_core.tools import tool
 
-# Check for required API key
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable is required. Please set it in your environment.")
-
-
-from langchain.chat_models import init_chat_model
-
-# model = init_chat_model("gemini-2.0-flash", model_provider="google_genai")
-# res = model.invoke("Hello, world!")
-# print(res.content)
+if TYPE_CHECKING:
+    from web3 import Web3
 
-from web3 import Web3
-from eth_account import Account
-from eth_utils import to_checksum_address
+# Heavy tool dependencies (web3, eth_utils, serpapi, requests) are imported inside the
+# tools that use them, and the LLM/agent is built by agent.py on demand, so importing
+# this module stays cheap for workers and tests.
 
 @tool
 def add(a: int, b: int) -> int:
@@ -44,6 +34,7 @@ def web_search(query: str) -> str:
     """
     Search the web using SerpAPI and return the top result snippet.
     """
+    import serpapi
     api_key = os.environ.get("SERPAPI_API_KEY")
     if not api_key:
         return json.dumps({
@@ -83,36 +74,54 @@ def web_search(query: str) -> str:
         })
 
 
+# Multicall3 is deployed at the same address on most EVM chains (https://www.multicall3.com)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
 # EVM chain RPC endpoints (add more as needed)
 # Corrected Ethereum RPC and U2U RPCs (removed trailing spaces)
+# "multicall": Multicall3 address used to aggregate reads; omit it where Multicall3 isn't deployed
+# "rpcs": fallback endpoints; rpc_router.py sends each call to the healthiest of "rpc" + "rpcs"
+# "ws": optional websocket endpoint; chain_head.py subscribes to new heads there instead of polling
+# "eip1559": prepared transactions are type 2 with fees from fees.py; legacy gasPrice otherwise
 EVM_CHAINS = {
     "polygon": {
         "rpc": "https://polygon-rpc.com/",  # Confirmed from webpage
+        "rpcs": ["https://polygon-bor-rpc.publicnode.com", "https://polygon.drpc.org"],
         "chain_id": 137,
         "explorer_api": "https://api.polygonscan.com/api",
         "explorer_key_env": "POLYGONSCAN_API_KEY",
-        "native_symbol": "MATIC" # Added for gas fee estimation
+        "native_symbol": "MATIC", # Added for gas fee estimation
+        "multicall": MULTICALL3_ADDRESS,
+        "eip1559": True
     },
     "ethereum": {
         "rpc": "https://ethereum-rpc.publicnode.com", # Corrected from webpage info
+        "rpcs": ["https://eth.drpc.org", "https://eth.llamarpc.com"],
         "chain_id": 1,
         "explorer_api": "https://api.etherscan.io/api",
         "explorer_key_env": "ETHERSCAN_API_KEY",
-        "native_symbol": "ETH"
+        "native_symbol": "ETH",
+        "multicall": MULTICALL3_ADDRESS,
+        "eip1559": True
     },
     "bsc": {
         "rpc": "https://bsc-dataseed.binance.org/", # Standard BSC endpoint
+        "rpcs": ["https://bsc-dataseed1.defibit.io/", "https://bsc-rpc.publicnode.com"],
         "chain_id": 56,
         "explorer_api": "https://api.bscscan.com/api",
         "explorer_key_env": "BSCSCAN_API_KEY",
-        "native_symbol": "BNB"
+        "native_symbol": "BNB",
+        "multicall": MULTICALL3_ADDRESS
     },
     "arbitrum": {
         "rpc": "https://arb1.arbitrum.io/rpc", # Standard Arbitrum endpoint
+        "rpcs": ["https://arbitrum-one-rpc.publicnode.com", "https://arbitrum.drpc.org"],
         "chain_id": 42161,
         "explorer_api": "https://api.arbiscan.io/api",
         "explorer_key_env": "ARBISCAN_API_KEY",
-        "native_symbol": "ETH"
+        "native_symbol": "ETH",
+        "multicall": MULTICALL3_ADDRESS,
+        "eip1559": True
     },
     "u2u_mainnet": {
         "rpc": "https://rpc-mainnet.u2u.xyz", # Removed trailing spaces
@@ -211,12 +220,24 @@ TOKEN_MAP = {
   },
 }
 
-def _get_w3(chain: str) -> Web3:
-  chain = chain.lower()
-  rpc = EVM_CHAINS.get(chain, {}).get("rpc")
-  if not rpc:
-    raise ValueError(f"Unsupported chain: {chain}")
-  return Web3(Web3.HTTPProvider(rpc))
+# Known decimals for TOKEN_MAP entries; these seed the token metadata cache (token_meta.py)
+# so common tokens never need a decimals()/symbol() call. Missing entries are read once.
+TOKEN_DECIMALS = {
+  "ethereum": {"USDC": 6, "USDT": 6},
+  "polygon": {"USDC": 6, "USDT": 6},
+  "bsc": {"USDC": 18, "USDT": 18},
+  "arbitrum": {"USDC": 6, "USDT": 6},
+}
+
+def _token_metadata(chain: str, token_address: str) -> tuple[int, str]:
+  # Cached per (chain_id, token); see token_meta.py
+  from token_meta import get_token_metadata
+  return get_token_metadata(chain.lower(), token_address)
+
+def _get_w3(chain: str) -> "Web3":
+  # Shared per-chain instance with a keep-alive connection pool (see rpc.py)
+  from rpc import get_web3
+  return get_web3(chain.lower())
 
 def _get_native_symbol(chain: str) -> str:
   return EVM_CHAINS.get(chain, {}).get("native_symbol", "Native")
@@ -224,22 +245,269 @@ def _get_native_symbol(chain: str) -> str:
 def _get_chain_id(chain: str) -> int:
   return EVM_CHAINS.get(chain, {}).get("chain_id", 0)
 
-def _erc20_balance(w3: Web3, token_address: str, wallet: str) -> tuple[float, int, str]:
-  contract = w3.eth.contract(address=Web3.to_checksum_address(token_address), abi=ERC20_ABI)
-  raw = contract.functions.balanceOf(Web3.to_checksum_address(wallet)).call()
-  try:
-    decimals = contract.functions.decimals().call()
-  except Exception:
-    # Default to 18 decimals if the call fails
-    decimals = 18
-  try:
-    symbol = contract.functions.symbol().call()
-  except Exception:
-    # Default to "TOKEN" if the call fails
-    symbol = "TOKEN"
-  # Convert raw balance to human-readable format
-  human = raw / (10 ** decimals)
-  return human, decimals, symbol
+_TX_HASH_RE = re.compile(r"^0x[0-9a-fA-F]{64}$")
+
+def is_tx_hash(tx_hash: str) -> bool:
+  # 0x-prefixed 32-byte hex string
+  return isinstance(tx_hash, str) and bool(_TX_HASH_RE.match(tx_hash))
+
+# --- Argument checks and responses shared with the async variants (async_tools.py) ---
+# Responses echo the chain as the caller wrote it; lookups and RPC calls use chain.lower().
+
+def _format_amount(amount: float) -> str:
+    # Format amount to avoid scientific notation
+    return f"{amount:.10f}".rstrip('0').rstrip('.')
+
+def _balance_error(query_type: str, address: str, chain: str, error: str, **fields) -> str:
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": "error",
+        "query_type": query_type,
+        "address": address,
+        "chain": chain,
+        **fields,
+        "error": error
+    })
+
+def _balance_token(address: str, chain: str, token) -> tuple:
+    """
+    get_balance's argument checks: (error JSON, None), or (None, token_address) with
+    token_address None for the native balance.
+    """
+    from web3 import Web3
+    if not Web3.is_address(address):
+        return _balance_error("generic_balance", address, chain, "Invalid wallet address.", token=token), None
+    if token is None or str(token).lower() == "native":
+        return None, None
+    token_str = str(token)
+    # Resolve symbol to address if needed
+    if Web3.is_address(token_str):
+        return None, token_str
+    token_address = TOKEN_MAP.get(chain.lower(), {}).get(token_str.upper())
+    if not token_address:
+        return _balance_error("token_balance", address, chain,
+                              f"Unknown token '{token}'. Provide a contract address or supported symbol.",
+                              token=token), None
+    return None, token_address
+
+def _native_balance_response(address: str, chain: str, wei: int) -> str:
+    balance = wei / 1e18
+    symbol = _get_native_symbol(chain.lower())
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": "success",
+        "query_type": "native_balance",
+        "address": address,
+        "chain": chain,
+        "balance": balance,
+        "symbol": symbol,
+        "message": f"Balance: {balance} {symbol}"
+    })
+
+def _token_balance_response(address: str, chain: str, token_address: str, result) -> str:
+    bal, _, sym = result
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": "success",
+        "query_type": "token_balance",
+        "address": address,
+        "chain": chain,
+        "token_address": token_address,
+        "balance": bal,
+        "symbol": sym,
+        "message": f"Balance: {bal} {sym}"
+    })
+
+def _main_balances_tokens(address: str, chain: str) -> tuple:
+    """get_main_balances' argument checks (chain lowercased): (error JSON, None) or (None, {symbol: address})."""
+    from web3 import Web3
+    if chain not in EVM_CHAINS:
+        return _balance_error("main_balances", address, chain,
+                              f"Unsupported chain: {chain}. Supported: {list(EVM_CHAINS.keys())}"), None
+    if not Web3.is_address(address):
+        return _balance_error("main_balances", address, chain, "Invalid wallet address."), None
+    token_addrs = {sym: TOKEN_MAP.get(chain, {}).get(sym) for sym in ["USDC", "USDT"]}
+    return None, {sym: addr for sym, addr in token_addrs.items() if addr}
+
+def _main_balances_response(address: str, chain: str, token_addrs: dict, result) -> str:
+    """get_main_balances' JSON for read_balances' result, or the exception it raised."""
+    native = result if isinstance(result, Exception) else result["native"]
+    if isinstance(native, Exception):
+        return _balance_error("main_balances", address, chain, f"Failed to fetch native balance: {native}")
+    balances = {
+        "native": {
+            "symbol": _get_native_symbol(chain),
+            "balance": native / 1e18
+        }
+    }
+    for sym, token_addr in token_addrs.items():
+        token_result = result["tokens"][token_addr]
+        if isinstance(token_result, Exception):
+            # Skip token if call fails
+            continue
+        bal, _, _ = token_result
+        balances[sym.lower()] = {
+            "symbol": sym,
+            "balance": bal,
+            "token_address": token_addr
+        }
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": "success",
+        "query_type": "main_balances",
+        "address": address,
+        "chain": chain,
+        "balances": balances
+    })
+
+def _checksum_addresses(chain: str, *addresses: str):
+    """Checksummed addresses, or None if one is invalid. Raises ValueError for unsupported chains."""
+    from web3 import Web3
+    from eth_utils import to_checksum_address
+    from rpc import chain_config
+    chain_config(chain)
+    if not all(Web3.is_address(address) for address in addresses):
+        return None
+    return [to_checksum_address(address) for address in addresses]
+
+def _transaction_error(chain: str, parties: dict, amount: float, error: str, **fields) -> str:
+    # Arguments or token metadata the prepare_* tools can't use; amount as given
+    return json.dumps({
+        "action_type": "transaction",
+        "status": "error",
+        "chain": chain,
+        **parties,
+        "amount": amount,
+        **fields,
+        "error": error
+    })
+
+def _transaction_failed(chain: str, parties: dict, amount: float, error: str, **fields) -> str:
+    return create_standard_response(
+        action_type="error",
+        data={
+            "chain": chain,
+            **parties,
+            "amount": _format_amount(amount),
+            **fields,
+            "error": error
+        }
+    )
+
+def _transaction_response(chain: str, tx: dict, token: str, estimated_gas: int, nonce: int, quote: dict,
+                          message: str) -> str:
+    """prepare_* success JSON for tx ({"from", "to", "value", optional "data"}) and its gas, nonce and fees."""
+    from fees import tx_fields
+    unsigned_tx = {
+        'chainId': _get_chain_id(chain.lower()),
+        'from': tx['from'],
+        'to': tx['to'],
+        'value': str(tx.get('value', 0)),
+        'token': token,
+        'gas': str(estimated_gas),
+        **tx_fields(quote),
+        'nonce': nonce
+    }
+    if 'data' in tx:
+        unsigned_tx['data'] = tx['data']
+    return create_standard_response(
+        action_type="transaction",
+        data={
+            "chain": chain,
+            "unsigned_tx": unsigned_tx
+        },
+        message=message
+    )
+
+# prepare_token_transfer and prepare_token_approval by ERC-20 function
+_TOKEN_CALLS = {
+    "transfer": {
+        "parties": ("from", "to"),
+        "invalid": "Invalid sender, recipient, or token address.",
+        "failed": "Failed to prepare token transfer",
+        "message": "Initiate MetaMask transaction to send {amount} {symbol} from {sender} to {target}.",
+    },
+    "approve": {
+        "parties": ("owner", "spender"),
+        "invalid": "Invalid owner, spender, or token address.",
+        "failed": "Failed to prepare token approval",
+        "message": "Initiate MetaMask transaction to approve {target} to spend {amount} {symbol} on behalf of {sender}.",
+    },
+}
+
+def _token_call_parties(fn_name: str, sender: str, target: str, token_address: str) -> dict:
+    sender_key, target_key = _TOKEN_CALLS[fn_name]["parties"]
+    return {sender_key: sender, target_key: target, "token_address": token_address}
+
+def _token_call_tx(fn_name: str, sender: str, target: str, token: str, amount: float, decimals: int) -> dict:
+    """Unsigned token call from checksummed addresses; amount in human-readable units."""
+    from tx_prep import token_call_data
+    # Token calls send no value ("0" in the unsigned tx)
+    return {'from': sender, 'to': token, 'data': token_call_data(fn_name, target, int(amount * (10 ** decimals)))}
+
+def _token_call_response(fn_name: str, chain: str, sender: str, target: str, amount: float, symbol: str,
+                         tx: dict, estimated_gas: int, nonce: int, quote: dict) -> str:
+    message = _TOKEN_CALLS[fn_name]["message"].format(amount=_format_amount(amount), symbol=symbol,
+                                                      sender=sender, target=target)
+    return _transaction_response(chain, tx, symbol, estimated_gas, nonce, quote, message)
+
+def _tx_status_error(tx_hash: str, chain: str, error: str) -> str:
+    return json.dumps({
+        "action_type": "transaction_status",
+        "status": "error",
+        "tx_hash": tx_hash,
+        "chain": chain,
+        "error": error
+    })
+
+def _tx_status_response(tx_hash: str, chain: str, receipt) -> str:
+    if receipt is None:
+        return json.dumps({
+            "action_type": "transaction_status",
+            "status": "pending",
+            "tx_hash": tx_hash,
+            "chain": chain,
+            "message": "Transaction is still pending or not found.",
+            # Clients can follow it here instead of asking again (see tx_watcher.py)
+            "watch_url": f"/tx/watch/stream?chain={chain.lower()}&tx_hash={tx_hash}"
+        })
+    success = (receipt['status'] == 1)
+    return json.dumps({
+        "action_type": "transaction_status",
+        "status": "success",
+        "tx_hash": tx_hash,
+        "chain": chain,
+        "is_successful": success,
+        "block_number": receipt['blockNumber'],
+        "gas_used": receipt['gasUsed'],
+        "message": f"Transaction {'succeeded' if success else 'failed'}."
+    })
+
+def _gas_error(error: str) -> str:
+    return json.dumps({
+        "action_type": "gas_estimation",
+        "status": "error",
+        "error": error
+    })
+
+def _gas_response(chain: str, estimated_gas: int, quote: dict) -> str:
+    from fees import fee_summary
+    return json.dumps({
+        "action_type": "gas_estimation",
+        "status": "success",
+        "estimated_gas": estimated_gas,
+        "fees": fee_summary(quote, estimated_gas),
+        "unit": _get_native_symbol(chain.lower()),
+        "message": f"Estimated gas: {estimated_gas}"
+    })
+
+def _erc20_balance(chain: str, token_address: str, wallet: str) -> tuple[float, int, str]:
+  # balanceOf (plus decimals/symbol on a metadata cache miss) goes out as one request (see tokens.py)
+  from tokens import read_balances
+  result = read_balances(chain.lower(), wallet, [token_address], include_native=False)["tokens"][token_address]
+  if isinstance(result, Exception):
+    raise result
+  return result
 
 @tool
 def get_balance(address: str, chain: str = "polygon", token: str | None = None) -> str:
@@ -265,94 +533,22 @@ def get_balance(address: str, chain: str = "polygon", token: str | None = None)
   try:
     w3 = _get_w3(chain)
   except Exception as e:
-    return json.dumps({
-        "action_type": "balance_query",
-        "status": "error",
-        "query_type": "generic_balance",
-        "address": address,
-        "chain": chain,
-        "token": token,
-        "error": f"Unsupported chain or RPC error: {e}"
-    })
+    return _balance_error("generic_balance", address, chain, f"Unsupported chain or RPC error: {e}", token=token)
+  error, token_address = _balance_token(address, chain, token)
+  if error:
+    return error
   
-  if not Web3.is_address(address):
-    return json.dumps({
-        "action_type": "balance_query",
-        "status": "error",
-        "query_type": "generic_balance",
-        "address": address,
-        "chain": chain,
-        "token": token,
-        "error": "Invalid wallet address."
-    })
-  
-  if token is None or str(token).lower() == "native":
+  if token_address is None:
     try:
-      wei = w3.eth.get_balance(address)
-      balance = wei / 1e18
-      symbol = _get_native_symbol(chain.lower())
-      return json.dumps({
-          "action_type": "balance_query",
-          "status": "success",
-          "query_type": "native_balance",
-          "address": address,
-          "chain": chain,
-          "balance": balance,
-          "symbol": symbol,
-          "message": f"Balance: {balance} {symbol}"
-      })
+      return _native_balance_response(address, chain, w3.eth.get_balance(address))
     except Exception as e:
-      return json.dumps({
-          "action_type": "balance_query",
-          "status": "error",
-          "query_type": "native_balance",
-          "address": address,
-          "chain": chain,
-          "error": f"Failed to fetch native balance: {e}"
-      })
-  
-  token_str = str(token)
-  # Resolve symbol to address if needed
-  token_address = None
-  if Web3.is_address(token_str):
-    token_address = token_str
-  else:
-    token_address = TOKEN_MAP.get(chain.lower(), {}).get(token_str.upper())
-  
-  if not token_address:
-    return json.dumps({
-        "action_type": "balance_query",
-        "status": "error",
-        "query_type": "token_balance",
-        "address": address,
-        "chain": chain,
-        "token": token,
-        "error": f"Unknown token '{token}'. Provide a contract address or supported symbol."
-    })
+      return _balance_error("native_balance", address, chain, f"Failed to fetch native balance: {e}")
   
   try:
-    bal, _, sym = _erc20_balance(w3, token_address, address)
-    return json.dumps({
-        "action_type": "balance_query",
-        "status": "success",
-        "query_type": "token_balance",
-        "address": address,
-        "chain": chain,
-        "token_address": token_address,
-        "balance": bal,
-        "symbol": sym,
-        "message": f"Balance: {bal} {sym}"
-    })
+    return _token_balance_response(address, chain, token_address, _erc20_balance(chain, token_address, address))
   except Exception as e:
-    return json.dumps({
-        "action_type": "balance_query",
-        "status": "error",
-        "query_type": "token_balance",
-        "address": address,
-        "chain": chain,
-        "token_address": token_address,
-        "error": f"Failed to fetch token balance: {e}"
-    })
+    return _balance_error("token_balance", address, chain, f"Failed to fetch token balance: {e}",
+                          token_address=token_address)
 
 # Helper to get balances for native token, USDC, and USDT only
 # @tool
@@ -378,74 +574,56 @@ def get_main_balances(address: str, chain: str = "polygon") -> str:
     - "Get U2U wallet overview" -> chain="u2u_mainnet"
     - "Check all main tokens for wallet 0x123..." -> uses default chain
     """
-    from web3 import Web3
     chain = chain.lower()
-    if chain not in EVM_CHAINS:
-        return json.dumps({
-            "action_type": "balance_query",
-            "status": "error",
-            "query_type": "main_balances",
-            "address": address,
-            "chain": chain,
-            "error": f"Unsupported chain: {chain}. Supported: {list(EVM_CHAINS.keys())}"
-        })
-    if not Web3.is_address(address):
-        return json.dumps({
-            "action_type": "balance_query",
-            "status": "error",
-            "query_type": "main_balances",
-            "address": address,
-            "chain": chain,
-            "error": "Invalid wallet address."
-        })
-    # Native token balance
+    error, token_addrs = _main_balances_tokens(address, chain)
+    if error:
+        return error
+    # Native, USDC & USDT balances in one JSON-RPC batch
+    from tokens import read_balances
     try:
-        w3 = _get_w3(chain)
-        wei = w3.eth.get_balance(address)
-        native_balance = wei / 1e18
-        native_symbol = _get_native_symbol(chain)
+        result = read_balances(chain, address, list(token_addrs.values()))
     except Exception as e:
-        return json.dumps({
-            "action_type": "balance_query",
-            "status": "error",
-            "query_type": "main_balances",
-            "address": address,
-            "chain": chain,
-            "error": f"Failed to fetch native balance: {e}"
-        })
-    # USDC & USDT via on-chain calls
-    balances = {
-        "native": {
-            "symbol": native_symbol,
-            "balance": native_balance
-        }
-    }
-    for sym in ["USDC", "USDT"]:
-        token_addr = TOKEN_MAP.get(chain, {}).get(sym)
-        if not token_addr:
-            continue
-        try:
-            bal, _, _ = _erc20_balance(w3, token_addr, address)
-            balances[sym.lower()] = {
-                "symbol": sym,
-                "balance": bal,
-                "token_address": token_addr
-            }
-        except Exception:
-            # Skip token if call fails
-            pass
+        result = e
+    return _main_balances_response(address, chain, token_addrs, result)
+
+@tool
+def get_portfolio(address: str, timeout: float | None = None) -> str:
+    """
+    Get a wallet's holdings on every supported EVM chain at once (native + USDC + USDT and other known tokens).
     
-    return json.dumps({
-        "action_type": "balance_query",
-        "status": "success",
-        "query_type": "main_balances",
-        "address": address,
-        "chain": chain,
-        "balances": balances
-    })
+    Use this instead of calling get_main_balances once per chain when the user asks what they hold
+    everywhere / across all chains.
+    
+    Parameters:
+    - address: Wallet address to check balances for
+    - timeout: Optional overall deadline in seconds; chains that don't answer in time are reported
+      with status "timeout" while the others are returned
+    
+    Returns:
+    - Per-chain "status" ("success", "error" or "timeout") and balances for the chains that answered
+    """
+    from portfolio import get_portfolio as read_portfolio
+    return read_portfolio(address, timeout)
 
 @tool
-def get_wallet_transactions(address: str, chain: str = "polygon", limit: int = 10) -> str:
+def get_bulk_balances(addresses: list[str], tokens: list[str] | None = None, chain: str = "polygon") -> str:
+    """
+    Get balances for many wallet addresses at once on one EVM chain (e.g. treasury checks).
+    
+    Parameters:
+    - addresses: Wallet addresses to check (up to 100; larger lists use the /balances/bulk endpoint)
+    - tokens: Tokens to read for every address: symbols from the known token list (e.g. "USDC", "USDT"),
+      contract addresses, or "native". Omit for native + all known tokens of the chain.
+    - chain: Blockchain network (default: "polygon")
+    
+    Returns:
+    - "columns" describing each token and one row per address with its balances
+    """
+    from bulk_balances import bulk_balances_tool
+    return bulk_balances_tool(chain, addresses, tokens)
+
+@tool
+def get_wallet_transactions(address: str, chain: str = "polygon", limit: int = 10, page: int = 1) -> str:
     """
     Show recent transactions (native and token) for a wallet address on any supported EVM chain.
     
@@ -456,19 +634,21 @@ def get_wallet_transactions(address: str, chain: str = "polygon", limit: int = 1
     - chain: Blockchain network (default: "polygon")
       Use "u2u_mainnet" for U2U mainnet, "u2u_testnet" for U2U testnet
     - limit: Maximum number of transactions to return (default: 10)
+    - page: Page of limit transactions to return, newest first (default: 1)
     
     Returns:
     - Transaction hash, direction (IN/OUT), value, block number, and timestamp
+    - has_more: whether an older page exists
     
     Examples:
     - "Show transactions for 0x123... on U2U mainnet" -> chain="u2u_mainnet"
     - "Get U2U transaction history" -> chain="u2u_mainnet"
     - "Show last 20 transactions for wallet 0x123..." -> limit=20
+    - "Show the next 10 transactions" -> page=2
     
     Note: Requires explorer API key for transaction data. U2U chains may have limited explorer support.
     """
     from web3 import Web3
-    import requests
     chain = chain.lower()
     if chain not in EVM_CHAINS:
         return json.dumps({
@@ -486,55 +666,7 @@ def get_wallet_transactions(address: str, chain: str = "polygon", limit: int = 1
             "chain": chain,
             "error": "Invalid wallet address."
         })
-    explorer_api = EVM_CHAINS[chain]["explorer_api"]
-    api_key = os.environ.get(EVM_CHAINS[chain]["explorer_key_env"], "")
-    params = {
-        "module": "account",
-        "action": "txlist",
-        "address": address,
-        "sort": "desc"
-    }
-    if api_key:
-        params["apikey"] = api_key
-        try:
-            resp = requests.get(explorer_api, params=params, timeout=10)
-            data = resp.json()
-            if data.get("status") != "1":
-                return json.dumps({
-                    "action_type": "transaction_history",
-                    "status": "error",
-                    "address": address,
-                    "chain": chain,
-                    "error": f"No transactions found or error: {data.get('message')}"
-                })
-            txs = data["result"][:limit]
-            summary = []
-            for tx in txs:
-                direction = "IN" if tx["to"].lower() == address.lower() else "OUT"
-                value = int(tx["value"]) / 1e18
-                summary.append({
-                    "hash": tx['hash'],
-                    "direction": direction,
-                    "value": value,
-                    "block_number": int(tx['blockNumber']),
-                    "timestamp": int(tx['timeStamp'])
-                })
-            return json.dumps({
-                "action_type": "transaction_history",
-                "status": "success",
-                "address": address,
-                "chain": chain,
-                "transactions": summary
-            })
-        except Exception as e:
-            return json.dumps({
-                "action_type": "transaction_history",
-                "status": "error",
-                "address": address,
-                "chain": chain,
-                "error": f"Failed to fetch transactions: {e}"
-            })
-    else:
+    if not os.environ.get(EVM_CHAINS[chain]["explorer_key_env"], ""):
         return json.dumps({
             "action_type": "transaction_history",
             "status": "error",
@@ -542,6 +674,52 @@ def get_wallet_transactions(address: str, chain: str = "polygon", limit: int = 1
             "chain": chain,
             "error": f"No explorer API key set for {chain}. Please set the appropriate API key in the environment."
         })
+    import tx_history
+    limit, page = max(1, int(limit)), max(1, int(page))
+    try:
+        txs, has_more = tx_history.transactions(chain, address, limit, page)
+    except tx_history.ExplorerError as e:
+        return json.dumps({
+            "action_type": "transaction_history",
+            "status": "error",
+            "address": address,
+            "chain": chain,
+            "error": f"No transactions found or error: {e}"
+        })
+    except Exception as e:
+        return json.dumps({
+            "action_type": "transaction_history",
+            "status": "error",
+            "address": address,
+            "chain": chain,
+            "error": f"Failed to fetch transactions: {e}"
+        })
+    if not txs and page == 1:
+        return json.dumps({
+            "action_type": "transaction_history",
+            "status": "error",
+            "address": address,
+            "chain": chain,
+            "error": "No transactions found or error: No transactions found"
+        })
+    summary = []
+    for tx in txs:
+        summary.append({
+            "hash": tx["hash"],
+            "direction": "IN" if tx["to"] == address.lower() else "OUT",
+            "value": int(tx["value"]) / 1e18,
+            "block_number": tx["block_number"],
+            "timestamp": tx["timestamp"]
+        })
+    return json.dumps({
+        "action_type": "transaction_history",
+        "status": "success",
+        "address": address,
+        "chain": chain,
+        "transactions": summary,
+        "page": page,
+        "has_more": has_more
+    })
 
 # --- RESPONSE STANDARDIZATION FUNCTIONS ---
 
@@ -616,79 +794,53 @@ def prepare_native_transfer(sender: str, recipient: str, amount: float, chain: s
     Returns:
     - JSON string with action_type "transaction" and unsigned transaction details
     """
+    from web3 import Web3
+    from tx_prep import gas_nonce_fees
+    parties = {"from": sender, "to": recipient}
     try:
-        w3 = _get_w3(chain)
-        if not Web3.is_address(sender) or not Web3.is_address(recipient):
-            return json.dumps({
-                "action_type": "transaction",
-                "status": "error",
-                "chain": chain,
-                "from": sender,
-                "to": recipient,
-                "amount": amount,
-                "unit": _get_native_symbol(chain),
-                "error": "Invalid sender or recipient address."
-            })
-        
-        sender_checksum = to_checksum_address(sender)
-        recipient_checksum = to_checksum_address(recipient)
-        
-        # Estimate gas
-        estimated_gas = w3.eth.estimate_gas({
-            'from': sender_checksum,
-            'to': recipient_checksum,
-            'value': w3.to_wei(amount, 'ether')
-        })
-        
-        # Get current block number for nonce
-        current_block_number = w3.eth.get_block_number()
-        nonce = w3.eth.get_transaction_count(sender_checksum, block_identifier=current_block_number)
-        
-        # Get gas price
-        gas_price = w3.eth.gas_price
-        
-        # Get chain ID and native symbol
-        chain_id = _get_chain_id(chain)
-        native_symbol = _get_native_symbol(chain)
-        
-        # Prepare the unsigned transaction
-        unsigned_tx = {
-            'chainId': chain_id,
-            'from': sender_checksum,
-            'to': recipient_checksum,
-            'value': str(w3.to_wei(amount, 'ether')),
-            'token': native_symbol,
-            'gas': str(estimated_gas),
-            'gasPrice': str(gas_price),
-            'nonce': nonce
-        }
-
-        # Format amount to avoid scientific notation
-        formatted_amount = f"{amount:.10f}".rstrip('0').rstrip('.')
-        
-        return create_standard_response(
-            action_type="transaction",
-            data={
-                "chain": chain,
-                "unsigned_tx": unsigned_tx
-            },
-            message=f"Initiate MetaMask transaction to send {formatted_amount} {native_symbol} from {sender} to {recipient}."
+        addresses = _checksum_addresses(chain, sender, recipient)
+        if addresses is None:
+            return _transaction_error(chain, parties, amount, "Invalid sender or recipient address.",
+                                      unit=_get_native_symbol(chain.lower()))
+        sender_checksum, recipient_checksum = addresses
+        tx = {'from': sender_checksum, 'to': recipient_checksum, 'value': Web3.to_wei(amount, 'ether')}
+        
+        # Gas estimate, nonce and fees in one batch (see tx_prep.py and fees.py)
+        estimated_gas, nonce, quote = gas_nonce_fees(chain.lower(), tx)
+        
+        native_symbol = _get_native_symbol(chain.lower())
+        return _transaction_response(
+            chain, tx, native_symbol, estimated_gas, nonce, quote,
+            f"Initiate MetaMask transaction to send {_format_amount(amount)} {native_symbol} from {sender} to {recipient}."
         )
     except Exception as e:
-        # Format amount to avoid scientific notation
-        formatted_amount = f"{amount:.10f}".rstrip('0').rstrip('.')
+        return _transaction_failed(chain, parties, amount, f"Failed to prepare native transfer: {str(e)}",
+                                   unit=_get_native_symbol(chain.lower()))
+
+def _prepare_token_call(fn_name: str, sender: str, target: str, token_address: str, amount: float, chain: str) -> str:
+    """Body of prepare_token_transfer/approval; async_tools.py has the awaiting twin."""
+    from tx_prep import gas_nonce_fees, token_metadata
+    spec = _TOKEN_CALLS[fn_name]
+    parties = _token_call_parties(fn_name, sender, target, token_address)
+    try:
+        addresses = _checksum_addresses(chain, sender, target, token_address)
+        if addresses is None:
+            return _transaction_error(chain, parties, amount, spec["invalid"])
+        sender_checksum, target_checksum, token_checksum = addresses
         
-        return create_standard_response(
-            action_type="error",
-            data={
-                "chain": chain,
-                "from": sender,
-                "to": recipient,
-                "amount": formatted_amount,
-                "unit": _get_native_symbol(chain),
-                "error": f"Failed to prepare native transfer: {str(e)}"
-            }
-        )
+        # Token decimals and symbol come from the metadata cache; a miss is read in the
+        # same batch as the nonce and fee reads (see tx_prep.py)
+        try:
+            decimals, symbol = token_metadata(chain.lower(), token_checksum, sender_checksum)
+        except Exception as e:
+            return _transaction_error(chain, parties, amount, f"Failed to read token metadata (decimals/symbol): {e}")
+        
+        tx = _token_call_tx(fn_name, sender_checksum, target_checksum, token_checksum, amount, decimals)
+        # Gas estimate, nonce and fees in one batch
+        estimated_gas, nonce, quote = gas_nonce_fees(chain.lower(), tx)
+        return _token_call_response(fn_name, chain, sender, target, amount, symbol, tx, estimated_gas, nonce, quote)
+    except Exception as e:
+        return _transaction_failed(chain, parties, amount, f"{spec['failed']}: {e}")
 
 @tool
 def prepare_token_transfer(sender: str, recipient: str, token_address: str, amount: float, chain: str = "polygon") -> str:
@@ -708,113 +860,7 @@ def prepare_token_transfer(sender: str, recipient: str, token_address: str, amou
     Returns:
     - JSON string with action_type "transaction" and unsigned transaction details
     """
-    try:
-        w3 = _get_w3(chain)
-        if not Web3.is_address(sender) or not Web3.is_address(recipient) or not Web3.is_address(token_address):
-            return json.dumps({
-                "action_type": "transaction",
-                "status": "error",
-                "chain": chain,
-                "from": sender,
-                "to": recipient,
-                "token_address": token_address,
-                "amount": amount,
-                "error": "Invalid sender, recipient, or token address."
-            })
-        
-        sender_checksum = to_checksum_address(sender)
-        recipient_checksum = to_checksum_address(recipient)
-        token_checksum = to_checksum_address(token_address)
-        
-        # Get token contract
-        token_contract = w3.eth.contract(address=token_checksum, abi=ERC20_ABI)
-        
-        # Get token decimals to convert amount and symbol
-        try:
-            decimals = token_contract.functions.decimals().call()
-            symbol = token_contract.functions.symbol().call()
-        except Exception as e:
-            return json.dumps({
-                "action_type": "transaction",
-                "status": "error",
-                "chain": chain,
-                "from": sender,
-                "to": recipient,
-                "token_address": token_address,
-                "amount": amount,
-                "error": f"Failed to read token metadata (decimals/symbol): {e}"
-            })
-        
-        amount_wei = int(amount * (10 ** decimals))
-        
-        # Estimate gas for the transfer function
-        estimated_gas = token_contract.functions.transfer(recipient_checksum, amount_wei).estimate_gas({
-            'from': sender_checksum
-        })
-        
-        # Get current block number for nonce
-        current_block_number = w3.eth.get_block_number()
-        nonce = w3.eth.get_transaction_count(sender_checksum, block_identifier=current_block_number)
-        
-        # Get gas price
-        gas_price = w3.eth.gas_price
-        
-        # Get chain ID
-        chain_id = _get_chain_id(chain)
-        
-        # Prepare the unsigned transaction for the transfer function
-        unsigned_tx = token_contract.functions.transfer(recipient_checksum, amount_wei).build_transaction({
-            'from': sender_checksum,
-            'gas': estimated_gas,
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'chainId': chain_id
-        })
-
-        # Remove 'data' field from the unsigned_tx dict if present (it's usually auto-generated)
-        unsigned_tx.pop('data', None)
-        # Remove 'value' field as it's a token transfer, not native
-        unsigned_tx.pop('value', None)
-
-        # Format the unsigned transaction to match the native transfer format
-        formatted_tx = {
-            'chainId': chain_id,
-            'from': sender_checksum,
-            'to': token_checksum,
-            'value': "0",  # Token transfers have value 0
-            'token': symbol,
-            'gas': str(estimated_gas),
-            'gasPrice': str(gas_price),
-            'nonce': nonce,
-            'data': token_contract.functions.transfer(recipient_checksum, amount_wei).build_transaction({'from': sender_checksum})['data']
-        }
-
-        # Format amount to avoid scientific notation
-        formatted_amount = f"{amount:.10f}".rstrip('0').rstrip('.')
-        
-        return create_standard_response(
-            action_type="transaction",
-            data={
-                "chain": chain,
-                "unsigned_tx": formatted_tx
-            },
-            message=f"Initiate MetaMask transaction to send {formatted_amount} {symbol} from {sender} to {recipient}."
-        )
-    except Exception as e:
-        # Format amount to avoid scientific notation
-        formatted_amount = f"{amount:.10f}".rstrip('0').rstrip('.')
-        
-        return create_standard_response(
-            action_type="error",
-            data={
-                "chain": chain,
-                "from": sender,
-                "to": recipient,
-                "token_address": token_address,
-                "amount": formatted_amount,
-                "error": f"Failed to prepare token transfer: {e}"
-            }
-        )
+    return _prepare_token_call("transfer", sender, recipient, token_address, amount, chain)
 
 @tool
 def prepare_token_approval(owner: str, spender: str, token_address: str, amount: float, chain: str = "polygon") -> str:
@@ -828,113 +874,7 @@ def prepare_token_approval(owner: str, spender: str, token_address: str, amount:
     - amount: The amount of tokens to approve (in human-readable units).
     - chain: The blockchain network (default: "polygon").
     """
-    try:
-        w3 = _get_w3(chain)
-        if not Web3.is_address(owner) or not Web3.is_address(spender) or not Web3.is_address(token_address):
-            return json.dumps({
-                "action_type": "transaction",
-                "status": "error",
-                "chain": chain,
-                "owner": owner,
-                "spender": spender,
-                "token_address": token_address,
-                "amount": amount,
-                "error": "Invalid owner, spender, or token address."
-            })
-        
-        owner_checksum = to_checksum_address(owner)
-        spender_checksum = to_checksum_address(spender)
-        token_checksum = to_checksum_address(token_address)
-        
-        # Get token contract
-        token_contract = w3.eth.contract(address=token_checksum, abi=ERC20_ABI)
-        
-        # Get token decimals to convert amount and symbol
-        try:
-            decimals = token_contract.functions.decimals().call()
-            symbol = token_contract.functions.symbol().call()
-        except Exception as e:
-            return json.dumps({
-                "action_type": "transaction",
-                "status": "error",
-                "chain": chain,
-                "owner": owner,
-                "spender": spender,
-                "token_address": token_address,
-                "amount": amount,
-                "error": f"Failed to read token metadata (decimals/symbol): {e}"
-            })
-        
-        amount_wei = int(amount * (10 ** decimals))
-        
-        # Estimate gas for the approve function
-        estimated_gas = token_contract.functions.approve(spender_checksum, amount_wei).estimate_gas({
-            'from': owner_checksum
-        })
-        
-        # Get current block number for nonce
-        current_block_number = w3.eth.get_block_number()
-        nonce = w3.eth.get_transaction_count(owner_checksum, block_identifier=current_block_number)
-        
-        # Get gas price
-        gas_price = w3.eth.gas_price
-        
-        # Get chain ID
-        chain_id = _get_chain_id(chain)
-        
-        # Prepare the unsigned transaction for the approve function
-        unsigned_tx = token_contract.functions.approve(spender_checksum, amount_wei).build_transaction({
-            'from': owner_checksum,
-            'gas': estimated_gas,
-            'gasPrice': gas_price,
-            'nonce': nonce,
-            'chainId': chain_id
-        })
-
-        # Remove 'data' field from the unsigned_tx dict if present (it's usually auto-generated)
-        unsigned_tx.pop('data', None)
-        # Remove 'value' field as it's an approval, not a transfer
-        unsigned_tx.pop('value', None)
-
-        # Format the unsigned transaction to match the native transfer format
-        formatted_tx = {
-            'chainId': chain_id,
-            'from': owner_checksum,
-            'to': token_checksum,
-            'value': "0",  # Approvals have value 0
-            'token': symbol,
-            'gas': str(estimated_gas),
-            'gasPrice': str(gas_price),
-            'nonce': nonce,
-            'data': token_contract.functions.approve(spender_checksum, amount_wei).build_transaction({'from': owner_checksum})['data']
-        }
-
-        # Format amount to avoid scientific notation
-        formatted_amount = f"{amount:.10f}".rstrip('0').rstrip('.')
-        
-        return create_standard_response(
-            action_type="transaction",
-            data={
-                "chain": chain,
-                "unsigned_tx": formatted_tx
-            },
-            message=f"Initiate MetaMask transaction to approve {spender} to spend {formatted_amount} {symbol} on behalf of {owner}."
-        )
-    except Exception as e:
-        # Format amount to avoid scientific notation
-        formatted_amount = f"{amount:.10f}".rstrip('0').rstrip('.')
-        
-        return create_standard_response(
-            action_type="error",
-            data={
-                "chain": chain,
-                "owner": owner,
-                "spender": spender,
-                "token_address": token_address,
-                "amount": formatted_amount,
-                "error": f"Failed to prepare token approval: {e}"
-            }
-        )
+    return _prepare_token_call("approve", owner, spender, token_address, amount, chain)
 
 @tool
 def check_transaction_status(tx_hash: str, chain: str = "polygon") -> str:
@@ -945,50 +885,25 @@ def check_transaction_status(tx_hash: str, chain: str = "polygon") -> str:
     - tx_hash: The transaction hash to check.
     - chain: The blockchain network (default: "polygon").
     """
+    from web3.exceptions import TransactionNotFound
     try:
         w3 = _get_w3(chain)
-        if not Web3.is_hex_encoded(tx_hash) or len(tx_hash) != 66: # Standard tx hash length
-            return json.dumps({
-                "action_type": "transaction_status",
-                "status": "error",
-                "tx_hash": tx_hash,
-                "chain": chain,
-                "error": "Invalid transaction hash format."
-            })
-        
-        # Get the transaction receipt
-        receipt = w3.eth.get_transaction_receipt(tx_hash)
+        if not is_tx_hash(tx_hash):
+            return _tx_status_error(tx_hash, chain, "Invalid transaction hash format.")
         
-        if receipt is None:
-             return json.dumps({
-                "action_type": "transaction_status",
-                "status": "pending",
-                "tx_hash": tx_hash,
-                "chain": chain,
-                "message": "Transaction is still pending or not found."
-            })
-
-        status_code = receipt['status']
-        success = (status_code == 1)
-        
-        return json.dumps({
-            "action_type": "transaction_status",
-            "status": "success",
-            "tx_hash": tx_hash,
-            "chain": chain,
-            "is_successful": success,
-            "block_number": receipt['blockNumber'],
-            "gas_used": receipt['gasUsed'],
-            "message": f"Transaction {'succeeded' if success else 'failed'}."
-        })
+        # Get the transaction receipt (web3 raises instead of returning None when it's unknown)
+        try:
+            receipt = w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            receipt = None
+        
+        if receipt is not None:
+            # The sender's next prepared transaction re-reads its nonce (see nonces.py)
+            from nonces import note_receipt
+            note_receipt(chain.lower(), receipt['from'])
+        return _tx_status_response(tx_hash, chain, receipt)
     except Exception as e:
-        return json.dumps({
-            "action_type": "transaction_status",
-            "status": "error",
-            "tx_hash": tx_hash,
-            "chain": chain,
-            "error": f"Failed to check transaction status: {e}"
-        })
+        return _tx_status_error(tx_hash, chain, f"Failed to check transaction status: {e}")
 
 @tool
 def estimate_gas(sender: str, recipient: str, amount: float, chain: str = "polygon", token_address: str | None = None) -> str:
@@ -1001,102 +916,90 @@ def estimate_gas(sender: str, recipient: str, amount: float, chain: str = "polyg
     - amount: The amount of native token to send (ignored if token_address is provided).
     - chain: The blockchain network (default: "polygon").
     - token_address: Optional. If provided, estimates gas for an ERC-20 transfer instead of native.
+
+    Also returns the current fees (slow/normal/fast on EIP-1559 chains) and the resulting cost in native units.
     """
+    from web3 import Web3
+    from tx_prep import gas_fees
     try:
-        w3 = _get_w3(chain)
-        if not Web3.is_address(sender) or not Web3.is_address(recipient):
-            return json.dumps({
-                "action_type": "gas_estimation",
-                "status": "error",
-                "error": "Invalid sender or recipient address."
-            })
-        
-        sender_checksum = to_checksum_address(sender)
-        recipient_checksum = to_checksum_address(recipient)
+        addresses = _checksum_addresses(chain, sender, recipient)
+        if addresses is None:
+            return _gas_error("Invalid sender or recipient address.")
+        sender_checksum, recipient_checksum = addresses
 
         if token_address:
             # Estimate gas for ERC-20 transfer
-            if not Web3.is_address(token_address):
-                 return json.dumps({
-                    "action_type": "gas_estimation",
-                    "status": "error",
-                    "error": "Invalid token address."
-                })
+            token = _checksum_addresses(chain, token_address)
+            if token is None:
+                return _gas_error("Invalid token address.")
             
-            token_checksum = to_checksum_address(token_address)
-            token_contract = w3.eth.contract(address=token_checksum, abi=ERC20_ABI)
-            
-            # Get token decimals to convert amount
+            # Get token decimals to convert amount (cached per token)
             try:
-                decimals = token_contract.functions.decimals().call()
+                decimals, _ = _token_metadata(chain, token[0])
             except Exception:
                 decimals = 18 # Default if decimals call fails
-            
-            amount_wei = int(amount * (10 ** decimals))
-            
-            estimated_gas = token_contract.functions.transfer(recipient_checksum, amount_wei).estimate_gas({
-                'from': sender_checksum
-            })
+            tx = _token_call_tx("transfer", sender_checksum, recipient_checksum, token[0], amount, decimals)
         else:
             # Estimate gas for native transfer
-            estimated_gas = w3.eth.estimate_gas({
-                'from': sender_checksum,
-                'to': recipient_checksum,
-                'value': w3.to_wei(amount, 'ether')
-            })
-        
-        return json.dumps({
-            "action_type": "gas_estimation",
-            "status": "success",
-            "estimated_gas": estimated_gas,
-            "message": f"Estimated gas: {estimated_gas}"
-        })
+            tx = {'from': sender_checksum, 'to': recipient_checksum, 'value': Web3.to_wei(amount, 'ether')}
+
+        # Estimate and fee quote in one batch (see tx_prep.py and fees.py)
+        estimated_gas, quote = gas_fees(chain.lower(), tx)
+        return _gas_response(chain, estimated_gas, quote)
     except Exception as e:
-        return json.dumps({
-            "action_type": "gas_estimation",
-            "status": "error",
-            "error": f"Failed to estimate gas: {e}"
-        })
+        return _gas_error(f"Failed to estimate gas: {e}")
 
 # --- NEW FUNCTIONS END ---
 
 
-tools = [add, sub, mul, web_search, get_balance, get_main_balances, get_wallet_transactions,
+tools = [add, sub, mul, web_search, get_balance, get_main_balances, get_portfolio, get_bulk_balances, get_wallet_transactions,
          prepare_native_transfer, prepare_token_transfer, prepare_token_approval, check_transaction_status, estimate_gas] # Added new tools
 
-#From Youtube video https://youtu.be/zCwuAlpQKTM    
-from langchain.chat_models import init_chat_model
 
-#ChatGoogleGenerativeAI(model="gemini-2.0-flash").bind_tools(tools)
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.prompts.chat import ChatPromptTemplate, MessagesPlaceholder
+# Async variants from async_tools.py, used when the agent runs with ainvoke/astream_events.
+# async_tools imports web3, so it is loaded on the first awaited call.
+def _async_variant(name: str):
+    async def run(**kwargs):
+        import async_tools
+        return await getattr(async_tools, name)(**kwargs)
+    return run
 
-llm = init_chat_model(model="gemini-2.0-flash",  model_provider="google_genai")
+for _tool in (get_balance, get_main_balances, get_portfolio, get_bulk_balances, prepare_native_transfer,
+              prepare_token_transfer, prepare_token_approval, check_transaction_status, estimate_gas):
+    _tool.coroutine = _async_variant(_tool.name)
 
-prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful blockchain and web search agent. You support transactions and queries on the following EVM chains: Polygon, Ethereum, BSC, Arbitrum, U2U mainnet, U2U testnet, Monad testnet. You can check wallet balances, transaction history, prepare transactions, check status, estimate gas, and search the web. Be friendly and chatty like a human. CRITICAL RESPONSE FORMAT: For ALL responses, return ONLY valid JSON objects. NEVER wrap responses in markdown code blocks (```json). NEVER add explanatory text outside the JSON. For transaction requests, call the appropriate function and return the raw JSON response. For chat responses, return JSON with action_type 'chat' and your message. Example chat response: {{\"action_type\": \"chat\", \"message\": \"Your response here\"}}. If you don't know something, say 'I don't know' or 'I am not sure'. Never reveal that you are an AI or mention your model."),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-        MessagesPlaceholder("agent_scratchpad"),
-    ])
-agent = create_tool_calling_agent(llm, tools=tools, prompt=prompt)
 
-# Custom agent executor to handle transaction responses
-class TransactionAgentExecutor(AgentExecutor):
-    def invoke(self, inputs, config=None):
-        result = super().invoke(inputs, config)
-        output = result.get("output", "")
-        
-        # Normalize the response using our new function
-        normalized_response = normalize_agent_response(output)
-        
-        # If normalization changed the response, return the normalized version
-        if normalized_response != output:
-            return {"output": json.dumps(normalized_response)}
-        
-        return result
+def get_tools() -> list:
+    """Tool registry handed to the agent. Tools import their heavy dependencies on first call."""
+    return list(tools)
+
+
+def warm_tool_dependencies() -> None:
+    """Imports the heavy tool dependencies ahead of the first request (used by /warmup)."""
+    import requests  # noqa: F401
+    import serpapi  # noqa: F401
+    import eth_utils  # noqa: F401
+    import rpc  # noqa: F401
+    import async_tools  # noqa: F401
+    import token_meta
+    # Read metadata for TOKEN_MAP tokens without known decimals in the background
+    for chain, symbols in TOKEN_MAP.items():
+        if symbols and EVM_CHAINS.get(chain, {}).get("rpc"):
+            token_meta.prefetch(chain, list(symbols.values()))
+
+
+# The LLM and agent executor live in agent.py and are built on first use.
+# Keep `from lang import agent_executor` working for existing callers.
+_LAZY_AGENT_ATTRS = ("agent_executor", "TransactionAgentExecutor")
+
+
+def __getattr__(name):
+    if name in _LAZY_AGENT_ATTRS:
+        import agent
+        if name == "agent_executor":
+            return agent.get_agent_executor()
+        return getattr(agent, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-agent_executor = TransactionAgentExecutor(agent=agent, tools=tools, verbose=True)
 
-# response = agent_executor.invoke({"input": "What balance of 0xB702203B9FD0ee85aeDB9d314C075D480d716635"})
-__all__ = ["agent_executor"]
+__all__ = ["agent_executor", "tools", "get_tools", "normalize_agent_response"]
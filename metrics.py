@@ -0,0 +1,211 @@
+import os
+import re
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Prometheus metrics shared by server.py, lang.py and the helpers they use.
+# With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all of them.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency (time to response headers)",
+    ["method", "path", "status"], buckets=LATENCY_BUCKETS
+)
+TOOL_CALLS = Counter(
+    "agent_tool_calls_total", "Agent tool calls", ["tool", "chain", "status"]
+)
+TOOL_LATENCY = Histogram(
+    "agent_tool_duration_seconds", "Agent tool latency", ["tool", "chain"], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds", "LLM round-trip latency", ["model"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "LLM tokens", ["model", "type"]
+)
+RUN_LLM_CALLS = Histogram(
+    "agent_run_llm_calls", "LLM round trips per agent run", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15)
+)
+RUN_TOKENS = Histogram(
+    "agent_run_tokens", "LLM tokens (prompt + completion) per agent run",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+)
+RUN_LATENCY = Histogram(
+    "agent_run_duration_seconds", "Full agent run latency", buckets=LATENCY_BUCKETS
+)
+REDIS_LATENCY = Histogram(
+    "redis_command_duration_seconds", "Redis round-trip latency", ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+RPC_LATENCY = Histogram(
+    "rpc_request_duration_seconds", "JSON-RPC request latency", ["chain", "method"], buckets=LATENCY_BUCKETS
+)
+RPC_ERRORS = Counter(
+    "rpc_errors_total", "JSON-RPC errors by endpoint", ["chain", "endpoint", "kind"]
+)
+RPC_EJECTIONS = Counter(
+    "rpc_endpoint_ejections_total", "RPC endpoints taken out of rotation after repeated failures", ["chain", "endpoint"]
+)
+RPC_CACHE_REQUESTS = Counter(
+    "rpc_cache_requests_total", "Cacheable JSON-RPC reads by cache outcome", ["chain", "method", "result"]
+)
+EXPLORER_REQUESTS = Counter(
+    "explorer_requests_total", "Explorer API requests by outcome", ["chain", "result"]
+)
+EXPLORER_LATENCY = Histogram(
+    "explorer_request_duration_seconds", "Explorer API request latency", ["chain"], buckets=LATENCY_BUCKETS
+)
+EXPLORER_QUEUE_WAIT = Histogram(
+    "explorer_rate_limit_wait_seconds", "Time explorer requests waited for their API key's rate limit",
+    buckets=LATENCY_BUCKETS
+)
+AGENT_QUEUE_DEPTH = Gauge(
+    "agent_pool_queue_depth", "Agent runs waiting for a slot", multiprocess_mode="livesum"
+)
+AGENT_RUNNING = Gauge(
+    "agent_pool_running", "Agent runs executing", multiprocess_mode="livesum"
+)
+AGENT_QUEUE_WAIT = Histogram(
+    "agent_pool_wait_seconds", "Time agent runs waited for a slot", buckets=LATENCY_BUCKETS
+)
+AGENT_REJECTED = Counter(
+    "agent_pool_rejected_total", "Agent runs rejected by admission control", ["reason"]
+)
+
+_LABEL_RE = re.compile(r"^[a-z0-9_]{1,32}$")
+
+
+def label(value) -> str:
+    # Keep label cardinality bounded: LLM-provided values like chain names can be anything
+    value = str(value or "none").lower()
+    return value if _LABEL_RE.match(value) else "other"
+
+
+def observe_rpc(chain: str, endpoint: str, method: str, seconds: float, error_kind: str = None) -> None:
+    RPC_LATENCY.labels(label(chain), method).observe(seconds)
+    if error_kind:
+        count_rpc_error(chain, endpoint, error_kind)
+
+
+def count_rpc_error(chain: str, endpoint: str, error_kind: str) -> None:
+    RPC_ERRORS.labels(label(chain), endpoint, error_kind).inc()
+
+
+def render() -> tuple[bytes, str]:
+    """Returns the exposition payload and its content type for the /metrics endpoint."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def _tool_status(output) -> str:
+    # Tools report failures as JSON with status "error" rather than raising
+    output = getattr(output, "content", output)
+    if isinstance(output, str) and '"status": "error"' in output:
+        return "error"
+    return "success"
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records tool, LLM and whole-run timings for one agent run.
+    Pass a fresh instance per request via config={"callbacks": [...]}.
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._tool_chain = {}
+        self._llm_model = {}
+        self.llm_calls = 0
+        self.tokens = 0
+
+    # Tools
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+        # Tools without a chain argument (add, web_search, ...) are labelled "none"
+        chain = (inputs or {}).get("chain") if isinstance(inputs, dict) else None
+        tool = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tool_chain[run_id] = (tool, label(chain))
+
+    def _finish_tool(self, run_id, status):
+        start = self._starts.pop(run_id, None)
+        tool, chain = self._tool_chain.pop(run_id, ("unknown", "none"))
+        TOOL_CALLS.labels(tool, chain, status).inc()
+        if start is not None:
+            TOOL_LATENCY.labels(tool, chain).observe(time.perf_counter() - start)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish_tool(run_id, _tool_status(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, "exception")
+
+    # LLM
+
+    def _start_llm(self, serialized, run_id, kwargs):
+        self._starts[run_id] = time.perf_counter()
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (serialized or {}).get("name") or "unknown"
+        self._llm_model[run_id] = str(model).split("/")[-1]
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start_llm(serialized, run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start_llm(serialized, run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        model = self._llm_model.pop(run_id, "unknown")
+        self.llm_calls += 1
+        if start is not None:
+            LLM_LATENCY.labels(model).observe(time.perf_counter() - start)
+        prompt_tokens, completion_tokens = _token_usage(response)
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+        self.tokens += prompt_tokens + completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        self._llm_model.pop(run_id, None)
+
+    # Whole run
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._starts[run_id] = time.perf_counter()
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._finish_run(run_id)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._finish_run(run_id)
+
+    def _finish_run(self, run_id):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            RUN_LATENCY.observe(time.perf_counter() - start)
+        RUN_LLM_CALLS.observe(self.llm_calls)
+        RUN_TOKENS.observe(self.tokens)
+
+
+def _token_usage(response) -> tuple[int, int]:
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if usage:
+        return int(usage.get("prompt_tokens", 0) or 0), int(usage.get("completion_tokens", 0) or 0)
+    prompt_tokens = completion_tokens = 0
+    for generations in getattr(response, "generations", []) or []:
+        for generation in generations:
+            meta = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += int(meta.get("input_tokens", 0) or 0)
+            completion_tokens += int(meta.get("output_tokens", 0) or 0)
+    return prompt_tokens, completion_tokens
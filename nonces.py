@@ -0,0 +1,170 @@
+import asyncio
+import os
+import threading
+import time
+
+from redis_store import get_sync_redis, mark_unavailable
+from rpc import chain_config
+
+# Nonces for the prepare_* tools, handed out per (chain, sender) from a shared counter,
+# so transactions prepared back to back for one sender get consecutive nonces instead
+# of the same one. The counter is synced from the node's pending transaction count
+# (eth_getTransactionCount "pending", sent in the tool's batch, see tx_prep.py) the
+# first time a sender is seen, every NONCE_SYNC_INTERVAL seconds after that, and after
+# check_transaction_status has seen a receipt from the sender.
+# A sync moves the counter up to the pending count. It only moves it down (giving back
+# nonces of transactions that were prepared but never sent) once nothing has been
+# handed out for NONCE_RESERVATION_TTL seconds, so in-flight preparations keep theirs.
+# Counters live in Redis and are updated by one Lua script per call, so every worker
+# shares them; without Redis each worker keeps its own.
+# NONCE_SYNC_INTERVAL    seconds after which the next preparation re-reads the pending count
+# NONCE_RESERVATION_TTL  seconds without a new nonce before unused ones are given back
+# NONCE_KEY_TTL          seconds an idle sender's counter is kept in Redis
+# NONCE_REDIS            set to "false" to keep counters in-process only
+NONCE_SYNC_INTERVAL = float(os.environ.get("NONCE_SYNC_INTERVAL", 30))
+NONCE_RESERVATION_TTL = float(os.environ.get("NONCE_RESERVATION_TTL", 120))
+NONCE_KEY_TTL = int(os.environ.get("NONCE_KEY_TTL", 86400))
+NONCE_REDIS = os.environ.get("NONCE_REDIS", "true").lower() == "true"
+
+REDIS_KEY_PREFIX = "nonce"
+
+# KEYS[1] counter hash; ARGV: pending count or -1, now, reservation ttl, key ttl, allocate (1/0).
+# Returns the nonce handed out, -1 if the counter has never been synced, or -2 after a sync only.
+_ALLOCATE_SCRIPT = """
+local now = tonumber(ARGV[2])
+local next_nonce = tonumber(redis.call('HGET', KEYS[1], 'next') or '-1')
+local pending = tonumber(ARGV[1])
+if pending >= 0 then
+    local allocated_at = tonumber(redis.call('HGET', KEYS[1], 'allocated_at') or '0')
+    if next_nonce < pending or now - allocated_at > tonumber(ARGV[3]) then
+        next_nonce = pending
+    end
+    redis.call('HSET', KEYS[1], 'next', next_nonce, 'synced_at', now)
+elseif next_nonce < 0 then
+    return -1
+end
+if ARGV[5] == '1' then
+    redis.call('HSET', KEYS[1], 'next', next_nonce + 1, 'allocated_at', now)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if ARGV[5] == '1' then
+    return next_nonce
+end
+return -2
+"""
+
+_script = None
+_local: dict[tuple, dict] = {}  # (chain_id, sender) -> {"next", "synced_at", "allocated_at"}
+_lock = threading.Lock()
+
+
+def _key(chain: str, sender: str) -> tuple:
+    return chain_config(chain).get("chain_id", 0), sender.lower()
+
+
+def _redis_key(key: tuple) -> str:
+    return f"{REDIS_KEY_PREFIX}:{key[0]}:{key[1]}"
+
+
+def _client():
+    return get_sync_redis() if NONCE_REDIS else None
+
+
+def sync_call(sender: str) -> tuple:
+    """The JSON-RPC call whose result is passed to allocate/record_pending as pending."""
+    return "eth_getTransactionCount", [sender, "pending"]
+
+
+def _local_apply(key: tuple, pending, now: float, allocate: bool):
+    # Same steps as _ALLOCATE_SCRIPT, for counters kept in-process
+    with _lock:
+        state = _local.setdefault(key, {"next": -1, "synced_at": 0.0, "allocated_at": 0.0})
+        if pending is not None:
+            if state["next"] < pending or now - state["allocated_at"] > NONCE_RESERVATION_TTL:
+                state["next"] = pending
+            state["synced_at"] = now
+        elif state["next"] < 0:
+            return None
+        if not allocate:
+            return None
+        state["allocated_at"] = now
+        state["next"] += 1
+        return state["next"] - 1
+
+
+def _apply(chain: str, sender: str, pending, allocate: bool):
+    global _script
+    key = _key(chain, sender)
+    now = time.time()
+    client = _client()
+    if client is not None:
+        try:
+            if _script is None or _script.registered_client is not client:
+                _script = client.register_script(_ALLOCATE_SCRIPT)
+            nonce = _script(keys=[_redis_key(key)], args=[
+                -1 if pending is None else pending, now, NONCE_RESERVATION_TTL, NONCE_KEY_TTL, 1 if allocate else 0
+            ])
+            return nonce if nonce >= 0 else None
+        except Exception as e:
+            mark_unavailable(e)
+    return _local_apply(key, pending, now, allocate)
+
+
+def needs_sync(chain: str, sender: str) -> bool:
+    """True if the next preparation for sender should send sync_call along."""
+    key = _key(chain, sender)
+    client = _client()
+    synced_at = None
+    if client is not None:
+        try:
+            synced_at = client.hget(_redis_key(key), "synced_at")
+        except Exception as e:
+            mark_unavailable(e)
+            client = None
+    if client is None:
+        synced_at = _local.get(key, {}).get("synced_at")
+    return not synced_at or time.time() - float(synced_at) > NONCE_SYNC_INTERVAL
+
+
+def allocate(chain: str, sender: str, pending=None):
+    """
+    Hands out sender's next nonce, syncing the counter first if pending (the node's
+    pending count) is given. Returns None if the counter has never been synced; send
+    sync_call and try again with its result.
+    """
+    return _apply(chain, sender, pending, allocate=True)
+
+
+def record_pending(chain: str, sender: str, pending: int) -> None:
+    """Syncs sender's counter with a pending count read elsewhere, without handing out a nonce."""
+    _apply(chain, sender, pending, allocate=False)
+
+
+def note_receipt(chain: str, sender: str) -> None:
+    """Called when a receipt from sender was seen: its next preparation re-reads the pending count."""
+    key = _key(chain, sender)
+    client = _client()
+    if client is not None:
+        try:
+            client.hdel(_redis_key(key), "synced_at")
+        except Exception as e:
+            mark_unavailable(e)
+    with _lock:
+        if key in _local:
+            _local[key]["synced_at"] = 0.0
+
+
+async def aneeds_sync(chain: str, sender: str) -> bool:
+    return await asyncio.to_thread(needs_sync, chain, sender)
+
+
+async def aallocate(chain: str, sender: str, pending=None):
+    return await asyncio.to_thread(allocate, chain, sender, pending)
+
+
+async def arecord_pending(chain: str, sender: str, pending: int) -> None:
+    await asyncio.to_thread(record_pending, chain, sender, pending)
+
+
+async def anote_receipt(chain: str, sender: str) -> None:
+    await asyncio.to_thread(note_receipt, chain, sender)
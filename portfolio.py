@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from tokens import aread_balances, read_balances
+
+# Cross-chain portfolio for the get_portfolio tool: native plus TOKEN_MAP balances on
+# every chain in EVM_CHAINS, read in parallel (one request per chain, see tokens.py).
+# The whole read shares one deadline; chains that miss it or fail are reported with
+# their own status next to the chains that answered.
+# Imported lazily by the tools in lang.py and async_tools.py.
+# PORTFOLIO_TIMEOUT      default deadline in seconds for all chains together
+# PORTFOLIO_MAX_TIMEOUT  upper bound for a deadline passed by the caller
+PORTFOLIO_TIMEOUT = float(os.environ.get("PORTFOLIO_TIMEOUT", 8))
+PORTFOLIO_MAX_TIMEOUT = float(os.environ.get("PORTFOLIO_MAX_TIMEOUT", 30))
+
+# Per-chain reads for the blocking tool; a chain that misses the deadline keeps its
+# thread until its RPC timeout, so leave room for a few slow rounds
+_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="portfolio")
+
+
+def portfolio_chains() -> list:
+    from lang import EVM_CHAINS
+    return [chain for chain, config in EVM_CHAINS.items() if config.get("rpc")]
+
+
+def _deadline_seconds(timeout) -> float:
+    if timeout is None or timeout <= 0:
+        return PORTFOLIO_TIMEOUT
+    return min(float(timeout), PORTFOLIO_MAX_TIMEOUT)
+
+
+def _token_addresses(chain: str) -> dict:
+    from lang import TOKEN_MAP
+    return {symbol: address for symbol, address in TOKEN_MAP.get(chain, {}).items() if address}
+
+
+def _chain_entry(chain: str, token_addrs: dict, result: dict) -> dict:
+    """get_main_balances-style balances for one chain from a read_balances result."""
+    from lang import _get_native_symbol
+    if isinstance(result["native"], Exception):
+        return {"status": "error", "error": f"Failed to fetch native balance: {result['native']}"}
+    balances = {
+        "native": {
+            "symbol": _get_native_symbol(chain),
+            "balance": result["native"] / 1e18
+        }
+    }
+    for symbol, token_addr in token_addrs.items():
+        token_result = result["tokens"][token_addr]
+        if isinstance(token_result, Exception):
+            # Skip token if call fails
+            continue
+        balances[symbol.lower()] = {
+            "symbol": symbol,
+            "balance": token_result[0],
+            "token_address": token_addr
+        }
+    return {"status": "success", "balances": balances}
+
+
+def _response(address: str, chains: dict, deadline: float, started: float) -> str:
+    succeeded = sum(1 for entry in chains.values() if entry["status"] == "success")
+    status = "success" if succeeded == len(chains) else "partial" if succeeded else "error"
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": status,
+        "query_type": "portfolio",
+        "address": address,
+        "chains": chains,
+        "deadline_s": deadline,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+
+
+def _invalid_address(address: str) -> str:
+    return json.dumps({
+        "action_type": "balance_query",
+        "status": "error",
+        "query_type": "portfolio",
+        "address": address,
+        "error": "Invalid wallet address."
+    })
+
+
+def _read_chain(chain: str, address: str) -> dict:
+    token_addrs = _token_addresses(chain)
+    return _chain_entry(chain, token_addrs, read_balances(chain, address, list(token_addrs.values())))
+
+
+async def _aread_chain(chain: str, address: str) -> dict:
+    token_addrs = _token_addresses(chain)
+    return _chain_entry(chain, token_addrs, await aread_balances(chain, address, list(token_addrs.values())))
+
+
+def _finished_entry(future) -> dict:
+    try:
+        return future.result()
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
+def _timeout_entry(deadline: float) -> dict:
+    return {"status": "timeout", "error": f"No response within {deadline:g}s"}
+
+
+def get_portfolio(address: str, timeout: float | None = None) -> str:
+    from web3 import Web3
+    if not Web3.is_address(address):
+        return _invalid_address(address)
+    started = time.perf_counter()
+    deadline = _deadline_seconds(timeout)
+    futures = {chain: _pool.submit(_read_chain, chain, address) for chain in portfolio_chains()}
+    wait(futures.values(), timeout=deadline)
+    chains = {}
+    for chain, future in futures.items():
+        # Unfinished reads are left to finish in the background; they still fill the caches
+        chains[chain] = _finished_entry(future) if future.done() else _timeout_entry(deadline)
+    return _response(address, chains, deadline, started)
+
+
+async def aget_portfolio(address: str, timeout: float | None = None) -> str:
+    """Async get_portfolio: one task per chain on the event loop, cancelled at the deadline."""
+    from web3 import Web3
+    if not Web3.is_address(address):
+        return _invalid_address(address)
+    started = time.perf_counter()
+    deadline = _deadline_seconds(timeout)
+    tasks = {chain: asyncio.ensure_future(_aread_chain(chain, address)) for chain in portfolio_chains()}
+    await asyncio.wait(tasks.values(), timeout=deadline)
+    chains = {}
+    for chain, task in tasks.items():
+        if task.done():
+            chains[chain] = _finished_entry(task)
+        else:
+            task.cancel()
+            chains[chain] = _timeout_entry(deadline)
+    return _response(address, chains, deadline, started)
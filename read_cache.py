@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import RPC_CACHE_REQUESTS, label
+
+# Read-through cache for JSON-RPC reads that only change when a new block arrives
+# (balances, gas price, nonces, eth_call at "latest"). Used by the providers and the
+# batch helpers in rpc.py, so the blocking and async tools share it.
+# An entry is served while the chain head it was read at is still the newest head
+# seen for that chain and it is younger than the method's max age. Heads are learnt
+# from eth_blockNumber responses passing through rpc.py (see note_head).
+# RPC_CACHE           set to "false" to send every read to the node
+# RPC_CACHE_SIZE      entries kept in the LRU across all chains
+# RPC_CACHE_MAX_AGE   per-method max age in seconds overriding the defaults below,
+#                     e.g. "eth_gasPrice=3,eth_getBalance=6"; 0 disables a method
+RPC_CACHE = os.environ.get("RPC_CACHE", "true").lower() == "true"
+RPC_CACHE_SIZE = int(os.environ.get("RPC_CACHE_SIZE", 10000))
+# Calls whose encoded params exceed this many bytes (large aggregate3 scans) aren't cached
+RPC_CACHE_MAX_PARAMS = int(os.environ.get("RPC_CACHE_MAX_PARAMS", 4096))
+
+# eth_blockNumber is kept short: it is what tells the cache that the head moved
+DEFAULT_MAX_AGE = {
+    "eth_blockNumber": 1.0,
+    "eth_gasPrice": 5.0,
+    "eth_maxPriorityFeePerGas": 5.0,
+    "eth_getBalance": 12.0,
+    "eth_getTransactionCount": 12.0,
+    "eth_call": 12.0,
+}
+
+
+def _parse_max_age(value: str) -> dict:
+    max_age = dict(DEFAULT_MAX_AGE)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        method, _, seconds = item.partition("=")
+        max_age[method.strip()] = float(seconds)
+    return max_age
+
+
+MAX_AGE = _parse_max_age(os.environ.get("RPC_CACHE_MAX_AGE", ""))
+
+# Block tags whose answer is fixed by the head; "pending" and friends are never cached
+_CACHEABLE_TAGS = ("latest",)
+
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (result, head, stored_at)
+_heads: dict[str, int] = {}
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+
+def _block_param(method: str, params: list):
+    if method in ("eth_getBalance", "eth_getTransactionCount", "eth_call"):
+        return params[1] if len(params) > 1 else "latest"
+    return None
+
+
+def cache_key(chain: str, method: str, params):
+    """Key for a cacheable read, or None if this call must always go to the node."""
+    if not RPC_CACHE or MAX_AGE.get(method, 0) <= 0:
+        return None
+    params = list(params or [])
+    block = _block_param(method, params)
+    if isinstance(block, str) and not block.startswith("0x") and block not in _CACHEABLE_TAGS:
+        return None
+    encoded = json.dumps(params, sort_keys=True, default=str)
+    if len(encoded) > RPC_CACHE_MAX_PARAMS:
+        return None
+    return chain, method, encoded
+
+
+def note_head(chain: str, block_number: int) -> None:
+    """Records a chain head; entries read at an older head stop being served."""
+    with _lock:
+        if block_number > _heads.get(chain, -1):
+            _heads[chain] = block_number
+
+
+def head(chain: str):
+    return _heads.get(chain)
+
+
+def get(key):
+    """(True, result) on a fresh hit, (False, None) otherwise."""
+    global _hits, _misses
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        fresh = (entry is not None and entry[1] == _heads.get(key[0])
+                 and now - entry[2] <= MAX_AGE[key[1]])
+        if fresh:
+            _cache.move_to_end(key)
+            _hits += 1
+        else:
+            _misses += 1
+    RPC_CACHE_REQUESTS.labels(label(key[0]), key[1], "hit" if fresh else "miss").inc()
+    return (True, entry[0]) if fresh else (False, None)
+
+
+def put(key, result, read_head) -> None:
+    """
+    Stores a result. read_head is head(chain) taken before the request was sent, so a
+    response that raced with a new head is tagged with the older one and never served.
+    """
+    if key[1] == "eth_blockNumber" and isinstance(result, str):
+        read_head = int(result, 16)
+        note_head(key[0], read_head)
+    with _lock:
+        _cache[key] = (result, read_head, time.monotonic())
+        _cache.move_to_end(key)
+        while len(_cache) > RPC_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def stats() -> dict:
+    with _lock:
+        total = _hits + _misses
+        return {
+            "enabled": RPC_CACHE,
+            "entries": len(_cache),
+            "max_entries": RPC_CACHE_SIZE,
+            "hits": _hits,
+            "misses": _misses,
+            "hit_rate": round(_hits / total, 3) if total else None,
+            "heads": dict(_heads),
+            "max_age": MAX_AGE,
+        }
+
+
+def clear() -> None:
+    global _hits, _misses
+    with _lock:
+        _cache.clear()
+        _heads.clear()
+        _hits = _misses = 0
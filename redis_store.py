@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+import redis
+
+# Redis settings shared by the async history client in server.py and the
+# synchronous client used by tool code running in worker threads.
+# Set REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_SSL in your environment as needed
+REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
+REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD")
+REDIS_SSL = os.environ.get("REDIS_SSL", "false").lower() == "true"
+# Connection pool sizing: REDIS_MAX_CONNECTIONS caps open sockets per worker,
+# REDIS_POOL_TIMEOUT is how long (seconds) a request waits for a free connection
+# before failing, REDIS_SOCKET_TIMEOUT / REDIS_CONNECT_TIMEOUT bound a single round trip.
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 5))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 5))
+# Tool-side caches treat Redis as optional: after a failure they skip it for this many seconds
+REDIS_RETRY_INTERVAL = float(os.environ.get("REDIS_RETRY_INTERVAL", 30))
+
+_sync_client = None
+_sync_lock = threading.Lock()
+_unavailable_until = 0.0
+
+
+def get_sync_redis():
+    """
+    Process-wide blocking Redis client for code running in threads (tools, background fills).
+    Returns None while Redis is marked unavailable so callers can fall back to their own tier.
+    """
+    global _sync_client
+    if time.monotonic() < _unavailable_until:
+        return None
+    if _sync_client is None:
+        with _sync_lock:
+            if _sync_client is None:
+                pool = redis.BlockingConnectionPool(
+                    host=REDIS_HOST,
+                    port=REDIS_PORT,
+                    password=REDIS_PASSWORD,
+                    connection_class=redis.SSLConnection if REDIS_SSL else redis.Connection,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    socket_timeout=REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+                    decode_responses=True
+                )
+                _sync_client = redis.Redis(connection_pool=pool)
+    return _sync_client
+
+
+def set_sync_redis(client) -> None:
+    """Overrides the blocking client (e.g. fakeredis in the benchmark)."""
+    global _sync_client, _unavailable_until
+    _sync_client = client
+    _unavailable_until = 0.0
+
+
+def mark_unavailable(error: Exception) -> None:
+    """Called by callers after a Redis error; skips Redis for REDIS_RETRY_INTERVAL seconds."""
+    global _unavailable_until
+    if time.monotonic() >= _unavailable_until:
+        print(f"[Redis] Sync client unavailable, retrying in {REDIS_RETRY_INTERVAL:.0f}s: {error}")
+    _unavailable_until = time.monotonic() + REDIS_RETRY_INTERVAL
+
+
+def close() -> None:
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.connection_pool.disconnect()
+            _sync_client = None
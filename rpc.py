@@ -0,0 +1,419 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import AsyncHTTPProvider, AsyncWeb3, Web3
+
+import read_cache
+from metrics import count_rpc_error, observe_rpc
+from rpc_router import RPCRouter, get_router
+
+# JSON-RPC transport helpers for the blockchain tools in lang.py.
+# Imported lazily by lang._get_w3 so importing lang does not pull in web3.
+#
+# One Web3 instance per chain is shared by every thread, backed by a requests.Session
+# whose keep-alive connection pool is reused across tool calls. The async tools
+# (async_tools.py) get the same per chain with AsyncWeb3 and an aiohttp session,
+# one per event loop. Every request goes through the chain's RPCRouter (rpc_router.py),
+# which picks the healthiest of the chain's endpoints and fails over between them.
+# Reads that only change with the chain head are answered from read_cache.py first.
+# RPC_POOL_SIZE     connections kept open per endpoint (per worker process)
+# RPC_TIMEOUT       read timeout in seconds for a single RPC request
+# RPC_CONNECT_TIMEOUT  TCP/TLS connect timeout in seconds
+# RPC_MAX_CONCURRENT_BATCHES  async batch requests in flight per chain (per worker process)
+# A chain in EVM_CHAINS can override these with "rpc_pool_size", "rpc_timeout",
+# "rpc_connect_timeout" and "rpc_max_concurrent_batches".
+RPC_POOL_SIZE = int(os.environ.get("RPC_POOL_SIZE", 20))
+RPC_TIMEOUT = float(os.environ.get("RPC_TIMEOUT", 10))
+RPC_CONNECT_TIMEOUT = float(os.environ.get("RPC_CONNECT_TIMEOUT", 5))
+# Largest JSON-RPC batch sent in one HTTP request; public nodes often cap batch size
+RPC_MAX_BATCH = int(os.environ.get("RPC_MAX_BATCH", 50))
+# Large reads such as /balances/bulk queue for a slot instead of sending every chunk at once
+RPC_MAX_CONCURRENT_BATCHES = int(os.environ.get("RPC_MAX_CONCURRENT_BATCHES", 16))
+
+_HEADERS = {"Content-Type": "application/json"}
+
+
+class RPCError(Exception):
+    """Error entry returned by the node for one call in a batch."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"RPC error {code}: {message}")
+        self.code = code
+        self.message = message
+
+
+def _local_chain_id(chain_id, method):
+    # web3 checks eth_chainId before every eth_estimateGas/eth_call/eth_sendTransaction
+    # (twice under concurrency); answer it from EVM_CHAINS instead of asking the node
+    if chain_id and method == "eth_chainId":
+        return {"jsonrpc": "2.0", "id": 0, "result": hex(chain_id)}
+    return None
+
+
+def _cache_lookup(chain: str, method, params) -> tuple:
+    """(key, read_head, response): response is set on a cache hit, key is None if the call isn't cacheable."""
+    key = read_cache.cache_key(chain, str(method), params)
+    if key is None:
+        return None, None, None
+    hit, result = read_cache.get(key)
+    if hit:
+        return key, None, {"jsonrpc": "2.0", "id": 0, "result": result}
+    return key, read_cache.head(chain), None
+
+
+def _cache_store(key, read_head, response) -> None:
+    if key is not None and isinstance(response, dict) and not response.get("error") and "result" in response:
+        read_cache.put(key, response["result"], read_head)
+
+
+class RoutedHTTPProvider(Web3.HTTPProvider):
+    """HTTPProvider that sends every request through the chain client's router."""
+
+    def __init__(self, client: "_ChainClient"):
+        super().__init__(client.router.urls[0])
+        self.client = client
+
+    def make_request(self, method, params):
+        local = _local_chain_id(self.client.chain_id, method)
+        if local is not None:
+            return local
+        key, read_head, cached = _cache_lookup(self.client.chain, method, params)
+        if cached is not None:
+            return cached
+        # Encoded and decoded here rather than through HTTPProvider's private send hook,
+        # so the endpoint that answered comes back with the response
+        body, endpoint = self.client.post(self.encode_rpc_request(method, params), str(method))
+        response = self.decode_rpc_response(body)
+        if isinstance(response, dict) and response.get("error"):
+            count_rpc_error(self.client.chain, endpoint, "rpc")
+        _cache_store(key, read_head, response)
+        return response
+
+
+class RoutedAsyncHTTPProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider counterpart of RoutedHTTPProvider."""
+
+    def __init__(self, client: "_AsyncChainClient"):
+        super().__init__(client.router.urls[0])
+        self.client = client
+
+    async def make_request(self, method, params):
+        local = _local_chain_id(self.client.chain_id, method)
+        if local is not None:
+            return local
+        key, read_head, cached = _cache_lookup(self.client.chain, method, params)
+        if cached is not None:
+            return cached
+        body, endpoint = await self.client.post(self.encode_rpc_request(method, params), str(method))
+        response = self.decode_rpc_response(body)
+        if isinstance(response, dict) and response.get("error"):
+            count_rpc_error(self.client.chain, endpoint, "rpc")
+        _cache_store(key, read_head, response)
+        return response
+
+
+def chain_endpoints(config: dict) -> list:
+    """The chain's "rpc" followed by its "rpcs" fallbacks, without duplicates."""
+    urls = [config["rpc"], *config.get("rpcs", [])]
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+class _ChainClient:
+    """Pooled session and Web3 instance for one chain."""
+
+    def __init__(self, chain: str, config: dict):
+        self.chain = chain
+        self.chain_id = config.get("chain_id")
+        self.router: RPCRouter = get_router(chain, chain_endpoints(config))
+        pool_size = int(config.get("rpc_pool_size", RPC_POOL_SIZE))
+        self.timeout = (float(config.get("rpc_connect_timeout", RPC_CONNECT_TIMEOUT)),
+                        float(config.get("rpc_timeout", RPC_TIMEOUT)))
+        self.session = requests.Session()
+        # One connection pool per endpoint host
+        adapter = HTTPAdapter(pool_connections=len(self.router.urls), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.w3 = Web3(RoutedHTTPProvider(self))
+
+    def post(self, data: bytes, label: str) -> tuple[bytes, str]:
+        """
+        POSTs a JSON-RPC body to the best endpoint, failing over on transport/HTTP errors.
+        Returns (response body, endpoint that answered).
+        """
+        error = None
+        for endpoint in self.router.candidates():
+            start = time.perf_counter()
+            try:
+                response = self.session.post(endpoint, data=data, headers=_HEADERS, timeout=self.timeout)
+                response.raise_for_status()
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self.router.record(endpoint, elapsed, e)
+                observe_rpc(self.chain, endpoint, label, elapsed, "transport")
+                error = e
+                continue
+            elapsed = time.perf_counter() - start
+            self.router.record(endpoint, elapsed)
+            observe_rpc(self.chain, endpoint, label, elapsed)
+            return response.content, endpoint
+        raise error
+
+
+class _AsyncChainClient:
+    """Pooled aiohttp session and AsyncWeb3 instance for one chain on one event loop."""
+
+    def __init__(self, chain: str, config: dict):
+        self.chain = chain
+        self.chain_id = config.get("chain_id")
+        self.router: RPCRouter = get_router(chain, chain_endpoints(config))
+        self.loop = asyncio.get_running_loop()
+        pool_size = int(config.get("rpc_pool_size", RPC_POOL_SIZE))
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=float(config.get("rpc_connect_timeout", RPC_CONNECT_TIMEOUT)),
+            sock_read=float(config.get("rpc_timeout", RPC_TIMEOUT))
+        )
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=pool_size), timeout=self.timeout
+        )
+        self.w3 = AsyncWeb3(RoutedAsyncHTTPProvider(self))
+        self.batch_slots = asyncio.Semaphore(int(config.get("rpc_max_concurrent_batches", RPC_MAX_CONCURRENT_BATCHES)))
+
+    async def post(self, data: bytes, label: str) -> tuple[bytes, str]:
+        """Async _ChainClient.post."""
+        error = None
+        for endpoint in self.router.candidates():
+            start = time.perf_counter()
+            try:
+                async with self.session.post(endpoint, data=data, headers=_HEADERS) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self.router.record(endpoint, elapsed, e)
+                observe_rpc(self.chain, endpoint, label, elapsed, "transport")
+                error = e
+                continue
+            elapsed = time.perf_counter() - start
+            self.router.record(endpoint, elapsed)
+            observe_rpc(self.chain, endpoint, label, elapsed)
+            return body, endpoint
+        raise error
+
+
+_clients: dict[str, _ChainClient] = {}
+_clients_lock = threading.Lock()
+
+
+def chain_config(chain: str) -> dict:
+    from lang import EVM_CHAINS
+    config = EVM_CHAINS.get(chain.lower(), {})
+    if not config.get("rpc"):
+        raise ValueError(f"Unsupported chain: {chain}")
+    return config
+
+
+def _stale(client, config: dict) -> bool:
+    # Rebuild if the endpoints changed (e.g. EVM_CHAINS edited at runtime)
+    return client is None or list(client.router.urls) != chain_endpoints(config)
+
+
+def _get_client(chain: str) -> _ChainClient:
+    chain = chain.lower()
+    config = chain_config(chain)
+    client = _clients.get(chain)
+    if _stale(client, config):
+        with _clients_lock:
+            client = _clients.get(chain)
+            if _stale(client, config):
+                client = _ChainClient(chain, config)
+                _clients[chain] = client
+    return client
+
+
+def get_web3(chain: str) -> Web3:
+    """Process-wide Web3 for a chain; safe to share across run_in_threadpool workers."""
+    return _get_client(chain).w3
+
+
+_async_clients: dict[str, _AsyncChainClient] = {}
+
+
+async def _close_session(client: _AsyncChainClient) -> None:
+    # A session can only be closed on its own loop; one whose loop has stopped is left as is
+    if client.session.closed:
+        return
+    if client.loop is asyncio.get_running_loop():
+        await client.session.close()
+    elif client.loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.session.close(), client.loop)
+
+
+async def _get_async_client(chain: str) -> _AsyncChainClient:
+    chain = chain.lower()
+    config = chain_config(chain)
+    client = _async_clients.get(chain)
+    # Sessions are bound to the loop that created them
+    if _stale(client, config) or client.session.closed or client.loop is not asyncio.get_running_loop():
+        old, client = client, _AsyncChainClient(chain, config)
+        _async_clients[chain] = client
+        if old is not None:
+            await _close_session(old)
+    return client
+
+
+async def get_async_web3(chain: str) -> AsyncWeb3:
+    """AsyncWeb3 for a chain on the running event loop, sharing one keep-alive session."""
+    return (await _get_async_client(chain)).w3
+
+
+def _entry_result(entry):
+    if not isinstance(entry, dict):
+        return RPCError(-32603, "Missing response")
+    if entry.get("error"):
+        error = entry["error"]
+        return RPCError(error.get("code", -32603), error.get("message", str(error)))
+    return entry.get("result")
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload).encode()
+
+
+def _batch_payload(chunk: list) -> bytes:
+    return _encode([{"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+                    for i, (method, params) in enumerate(chunk)])
+
+
+def _single_payload(method: str, params) -> bytes:
+    return _encode({"jsonrpc": "2.0", "id": 0, "method": method, "params": params})
+
+
+def _batch_results(client, response: tuple, chunk: list):
+    """Results for one (body, endpoint) batch response in call order, or None if the node refused the batch."""
+    body, endpoint = json.loads(response[0]), response[1]
+    if not isinstance(body, list):
+        # Batching disabled on this node: it answers with a single error object
+        count_rpc_error(client.chain, endpoint, "rpc")
+        return None
+    by_id = {entry.get("id"): entry for entry in body if isinstance(entry, dict)}
+    results = [_entry_result(by_id.get(i)) for i in range(len(chunk))]
+    if any(isinstance(r, RPCError) for r in results):
+        count_rpc_error(client.chain, endpoint, "rpc")
+    return results
+
+
+def _single_result(client, response: tuple):
+    result = _entry_result(json.loads(response[0]))
+    if isinstance(result, RPCError):
+        count_rpc_error(client.chain, response[1], "rpc")
+    return result
+
+
+def _cached_calls(chain: str, calls: list) -> tuple:
+    """
+    Answers what it can from read_cache. Returns (results, missing) where results has a
+    value for every hit and missing lists (index, key) for the calls still to send.
+    """
+    results = [None] * len(calls)
+    missing = []
+    for i, (method, params) in enumerate(calls):
+        key = read_cache.cache_key(chain, method, params)
+        hit, result = read_cache.get(key) if key is not None else (False, None)
+        if hit:
+            results[i] = result
+        else:
+            missing.append((i, key))
+    return results, missing
+
+
+def _store_calls(results: list, missing: list, fetched: list, read_head) -> list:
+    for (i, key), result in zip(missing, fetched):
+        results[i] = result
+        if key is not None and not isinstance(result, RPCError):
+            read_cache.put(key, result, read_head)
+    return results
+
+
+def _send_batch(client, calls: list) -> list:
+    results = []
+    for offset in range(0, len(calls), RPC_MAX_BATCH):
+        chunk = calls[offset:offset + RPC_MAX_BATCH]
+        chunk_results = _batch_results(client, client.post(_batch_payload(chunk), "batch"), chunk)
+        if chunk_results is None:
+            chunk_results = [_single_result(client, client.post(_single_payload(method, params), method))
+                             for method, params in chunk]
+        results.extend(chunk_results)
+    return results
+
+
+async def _asend_batch(client, calls: list) -> list:
+    chunks = [calls[offset:offset + RPC_MAX_BATCH] for offset in range(0, len(calls), RPC_MAX_BATCH)]
+
+    async def send(chunk):
+        async with client.batch_slots:
+            chunk_results = _batch_results(client, await client.post(_batch_payload(chunk), "batch"), chunk)
+            if chunk_results is not None:
+                return chunk_results
+            return [_single_result(client, await client.post(_single_payload(method, params), method))
+                    for method, params in chunk]
+
+    results = []
+    for chunk_results in await asyncio.gather(*(send(chunk) for chunk in chunks)):
+        results.extend(chunk_results)
+    return results
+
+
+def batch_request(chain: str, calls: list, cache: bool = True) -> list:
+    """
+    Sends [(method, params), ...] as JSON-RPC batch requests (RPC_MAX_BATCH calls per HTTP request).
+
+    Returns results in call order. A call the node rejected comes back as an RPCError
+    instance instead of raising, so callers can handle failures per entry. Transport
+    failures raise. Nodes that refuse batches are retried one call at a time.
+    Calls answered by read_cache are not sent; cache=False sends every call and
+    leaves read_cache untouched.
+    """
+    client = _get_client(chain)
+    if not cache:
+        return _send_batch(client, calls)
+    results, missing = _cached_calls(client.chain, calls)
+    if not missing:
+        return results
+    read_head = read_cache.head(client.chain)
+    fetched = _send_batch(client, [calls[i] for i, _ in missing])
+    return _store_calls(results, missing, fetched, read_head)
+
+
+async def abatch_request(chain: str, calls: list, cache: bool = True) -> list:
+    """Async batch_request: chunks are sent concurrently on the chain's keep-alive session."""
+    client = await _get_async_client(chain)
+    if not cache:
+        return await _asend_batch(client, calls)
+    results, missing = _cached_calls(client.chain, calls)
+    if not missing:
+        return results
+    read_head = read_cache.head(client.chain)
+    fetched = await _asend_batch(client, [calls[i] for i, _ in missing])
+    return _store_calls(results, missing, fetched, read_head)
+
+
+def close_all() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
+
+
+async def aclose_all() -> None:
+    """Closes the async sessions created on the running loop (call from app shutdown)."""
+    loop = asyncio.get_running_loop()
+    for chain, client in list(_async_clients.items()):
+        if client.loop is loop:
+            await client.session.close()
+            del _async_clients[chain]
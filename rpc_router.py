@@ -0,0 +1,143 @@
+import os
+import random
+import threading
+import time
+
+from metrics import RPC_EJECTIONS, label
+
+# Endpoint selection for chains with several RPC URLs (EVM_CHAINS "rpc" + "rpcs").
+# Each endpoint keeps an exponentially weighted latency and error rate; calls go to
+# the lowest score first and fail over to the next one on transport errors or HTTP
+# errors (429 included). An endpoint that fails RPC_EJECT_AFTER times in a row is
+# ejected for RPC_COOLDOWN seconds, doubling on repeated ejections up to RPC_COOLDOWN_MAX.
+# RPC_FAILOVER_ATTEMPTS  endpoints tried per request before giving up
+# RPC_EXPLORE_RATE       share of requests sent to a random healthy endpoint so
+#                        the latency of the others stays current
+RPC_EWMA_ALPHA = float(os.environ.get("RPC_EWMA_ALPHA", 0.3))
+RPC_EJECT_AFTER = int(os.environ.get("RPC_EJECT_AFTER", 3))
+RPC_COOLDOWN = float(os.environ.get("RPC_COOLDOWN", 30))
+RPC_COOLDOWN_MAX = float(os.environ.get("RPC_COOLDOWN_MAX", 300))
+RPC_FAILOVER_ATTEMPTS = int(os.environ.get("RPC_FAILOVER_ATTEMPTS", 2))
+RPC_EXPLORE_RATE = float(os.environ.get("RPC_EXPLORE_RATE", 0.05))
+# How much a 100% error rate inflates an endpoint's latency score
+ERROR_PENALTY = 4.0
+# Latency sample recorded for a failed request, so quick failures (connection refused,
+# instant 429s) never make an endpoint look faster than a slow healthy one
+FAILURE_LATENCY = 1.0
+
+
+class EndpointState:
+    """Rolling health of one RPC endpoint."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = None  # EWMA seconds; None until the first response
+        self.error_rate = 0.0  # EWMA of failures, 0..1
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def score(self) -> float:
+        # Untried endpoints score 0 so each one gets sampled early
+        return (self.latency or 0.0) * (1 + ERROR_PENALTY * self.error_rate)
+
+    def stats(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.available(now),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "score": round(self.score() * 1000, 1),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "cooldown_s": round(max(0.0, self.cooldown_until - now), 1),
+            "last_error": self.last_error,
+        }
+
+
+class RPCRouter:
+    """Orders a chain's endpoints by health for each request and records the outcome."""
+
+    def __init__(self, chain: str, urls: list):
+        self.chain = chain
+        self.endpoints = [EndpointState(url) for url in urls]
+        self._by_url = {state.url: state for state in self.endpoints}
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self) -> tuple:
+        return tuple(state.url for state in self.endpoints)
+
+    def candidates(self, attempts: int = RPC_FAILOVER_ATTEMPTS) -> list:
+        """Endpoint URLs to try in order, at most attempts of them."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = sorted((s for s in self.endpoints if s.available(now)), key=EndpointState.score)
+            if len(healthy) > 1 and random.random() < RPC_EXPLORE_RATE:
+                pick = random.randrange(1, len(healthy))
+                healthy[0], healthy[pick] = healthy[pick], healthy[0]
+            # Ejected endpoints are a last resort, soonest-to-recover first
+            ejected = sorted((s for s in self.endpoints if not s.available(now)), key=lambda s: s.cooldown_until)
+            ordered = healthy + ejected
+        return [state.url for state in ordered[:max(1, attempts)]]
+
+    def record(self, url: str, seconds: float, error: Exception = None) -> None:
+        state = self._by_url.get(url)
+        if state is None:
+            return
+        with self._lock:
+            state.requests += 1
+            if error is not None:
+                seconds = max(seconds, FAILURE_LATENCY)
+            state.latency = seconds if state.latency is None else (
+                RPC_EWMA_ALPHA * seconds + (1 - RPC_EWMA_ALPHA) * state.latency
+            )
+            state.error_rate = RPC_EWMA_ALPHA * (1.0 if error else 0.0) + (1 - RPC_EWMA_ALPHA) * state.error_rate
+            if error is None:
+                state.consecutive_failures = 0
+                state.ejections = 0
+                return
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_error = str(error)[:200]
+            if state.consecutive_failures < RPC_EJECT_AFTER:
+                return
+            state.consecutive_failures = 0
+            state.ejections += 1
+            cooldown = min(RPC_COOLDOWN * 2 ** (state.ejections - 1), RPC_COOLDOWN_MAX)
+            state.cooldown_until = time.monotonic() + cooldown
+        RPC_EJECTIONS.labels(label(self.chain), url).inc()
+        print(f"[RPC] Ejected {url} ({self.chain}) for {cooldown:.0f}s: {error}")
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [state.stats(now) for state in self.endpoints]
+
+
+_routers: dict[str, RPCRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(chain: str, urls: list) -> RPCRouter:
+    """Process-wide router for a chain, shared by the blocking and async clients."""
+    urls = tuple(urls)
+    router = _routers.get(chain)
+    if router is None or router.urls != urls:
+        with _routers_lock:
+            router = _routers.get(chain)
+            if router is None or router.urls != urls:
+                router = RPCRouter(chain, list(urls))
+                _routers[chain] = router
+    return router
+
+
+def router_stats() -> dict:
+    return {chain: router.stats() for chain, router in _routers.items()}
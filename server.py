@@ -1,46 +1,145 @@
-from fastapi import FastAPI, Request
+from fastapi import APIRouter, FastAPI, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from lang import agent_executor
+from history import append_messages, append_turn, apply_window, load_history, turn_messages
+from agent_pool import AGENT_ASYNC, AgentPool, PoolRejected
+from metrics import HTTP_REQUEST_LATENCY, MetricsCallbackHandler, render as render_metrics
+from redis_store import (REDIS_CONNECT_TIMEOUT, REDIS_HOST, REDIS_MAX_CONNECTIONS, REDIS_PASSWORD,
+                         REDIS_POOL_TIMEOUT, REDIS_PORT, REDIS_SOCKET_TIMEOUT, REDIS_SSL)
 from fastapi.middleware.cors import CORSMiddleware
 
 
-import redis
+import redis.asyncio as aioredis
+import asyncio
+import contextlib
 import json
 import os
+import sys
+import tempfile
+import time
 
-# Redis setup using environment variables
-# Set REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_SSL in your environment as needed
-REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
-REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
-REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD")
-REDIS_SSL = os.environ.get("REDIS_SSL", "false").lower() == "true"
-
-redis_client = redis.Redis(
+# Redis setup using environment variables (REDIS_* settings live in redis_store.py)
+# Async client so history reads/writes never block the event loop
+redis_pool = aioredis.BlockingConnectionPool(
     host=REDIS_HOST,
     port=REDIS_PORT,
     password=REDIS_PASSWORD,
-    ssl=REDIS_SSL,
+    connection_class=aioredis.SSLConnection if REDIS_SSL else aioredis.Connection,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
     decode_responses=True
 )
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+# Build the agent executor during startup instead of on the first request.
+# Set AGENT_EAGER_INIT=false to defer it (e.g. for fast health checks on cold pods).
+AGENT_EAGER_INIT = os.environ.get("AGENT_EAGER_INIT", "true").lower() == "true"
+
+# Dedicated, bounded pool for agent runs (see agent_pool.py for the AGENT_* settings)
+agent_pool = AgentPool()
+
+# Set by create_app(executor=...) or built from agent.py on first use
+agent_executor = None
+_agent_executor_lock = asyncio.Lock()
+
+router = APIRouter()
+
+
+async def ensure_agent_executor():
+    """Returns the agent executor, building it off the event loop on first use."""
+    global agent_executor
+    if agent_executor is None:
+        async with _agent_executor_lock:
+            if agent_executor is None:
+                def build():
+                    # agent.py pulls in langchain agents and the LLM client, so import it here
+                    from agent import get_agent_executor
+                    return get_agent_executor()
+
+                start = time.perf_counter()
+                agent_executor = await run_in_threadpool(build)
+                print(f"[Agent] Executor ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return agent_executor
+
+
+async def track_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_LATENCY.labels(request.method, path, str(status)).observe(time.perf_counter() - start)
+
+
+def create_app(executor=None, redis=None) -> FastAPI:
+    """
+    Application factory. executor and redis override the defaults
+    (Gemini executor from agent.py, pooled Redis from REDIS_*), e.g. for the benchmark.
+    """
+    global agent_executor, redis_client
+    if executor is not None:
+        agent_executor = executor
+    if redis is not None:
+        redis_client = redis
+
+    app = FastAPI()
+
+    @app.on_event("startup")
+    async def startup():
+        # Test Redis connection
+        try:
+            await redis_client.ping()
+            print(f"[Redis] Connected successfully to {REDIS_HOST}:{REDIS_PORT} (pool size {REDIS_MAX_CONNECTIONS})")
+        except Exception as e:
+            print(f"[Redis] Connection failed: {e}")
+        if AGENT_EAGER_INIT:
+            await ensure_agent_executor()
+        # Keeps block number, base fee and gas price current for the tools (CHAIN_HEAD_* settings)
+        import chain_head
+        await chain_head.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await redis_client.connection_pool.disconnect()
+        agent_pool.shutdown()
+        if "tx_watcher" in sys.modules:
+            await sys.modules["tx_watcher"].stop()
+        if "chain_head" in sys.modules:
+            await sys.modules["chain_head"].stop()
+        if "rpc" in sys.modules:
+            await sys.modules["rpc"].aclose_all()
+            sys.modules["rpc"].close_all()
+        if "redis_store" in sys.modules:
+            sys.modules["redis_store"].close()
+
+    # Allow all CORS origins
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.middleware("http")(track_request_latency)
+    app.include_router(router)
+    return app
 
-# Test Redis connection
-try:
-    redis_client.ping()
-    print(f"[Redis] Connected successfully to {REDIS_HOST}:{REDIS_PORT}")
-except Exception as e:
-    print(f"[Redis] Connection failed: {e}")
-
-app = FastAPI()
-
-# Allow all CORS origins
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+@router.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics: request, tool, LLM, Redis and RPC latency plus agent pool state.
+    """
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
 
 
 class QueryRequest(BaseModel):
@@ -48,7 +147,7 @@ class QueryRequest(BaseModel):
     user_id: str
 
 import uuid
-@app.post("/start")
+@router.post("/start")
 def start():
     """
     Generate and return a new user_id for a new user session.
@@ -57,63 +156,557 @@ def start():
     return {"user_id": user_id}
 
 
-@app.post("/query")
-async def query(request: QueryRequest):
+def normalize_output(output: str) -> tuple[str, str]:
+    """
+    Normalizes raw agent output and extracts its action_type.
+
+    Returns:
+        (output, action_type) where output is a JSON string when the agent
+        produced a structured response
+    """
+    # lang pulls in langchain's tool machinery (about half of `import server`); it is
+    # loaded with the agent executor, so importing it here costs nothing after boot
+    from lang import normalize_agent_response
+    action_type = "chat"  # Default action type for regular chat
+
     try:
-        # Retrieve user context from Redis
-        history_json = redis_client.get(f"chat_history:{request.user_id}")
-        if history_json:
-            history = json.loads(history_json)
+        # Normalize the response to handle markdown fences and ensure consistency
+        normalized_response = normalize_agent_response(output)
+
+        # If we got a normalized response, use it
+        if isinstance(normalized_response, dict) and "action_type" in normalized_response:
+            action_type = normalized_response["action_type"]
+            output = json.dumps(normalized_response)  # Convert back to JSON string
         else:
-            history = []
-
-        # Prepare input for agent_executor with user-specific context
-        agent_input = {"input": request.input, "chat_history": history}
-        # Run blocking agent_executor.invoke in a thread pool
-        response = await run_in_threadpool(agent_executor.invoke, agent_input)
-
-        # Parse response to check if it's a structured response with action_type
-        output = response["output"]
-        action_type = "chat"  # Default action type for regular chat
-        
-        # Import the normalization function from lang.py
-        from lang import normalize_agent_response
-        
-        try:
-            # Normalize the response to handle markdown fences and ensure consistency
-            normalized_response = normalize_agent_response(output)
-            
-            # If we got a normalized response, use it
-            if isinstance(normalized_response, dict) and "action_type" in normalized_response:
-                action_type = normalized_response["action_type"]
-                output = json.dumps(normalized_response)  # Convert back to JSON string
-            else:
-                # Try to parse as JSON to check for action_type
-                parsed_response = json.loads(output)
-                if isinstance(parsed_response, dict) and "action_type" in parsed_response:
-                    action_type = parsed_response["action_type"]
-        except (json.JSONDecodeError, TypeError):
-            # Not a JSON response, treat as regular chat
-            pass
-
-        # Update user context in Redis (LangChain expects role/content format)
-        history.extend([
-            {"role": "user", "content": request.input},
-            {"role": "assistant", "content": output}
-        ])
-        redis_client.set(f"chat_history:{request.user_id}", json.dumps(history))
-
-        return {
-            "output": output,
-            "action_type": action_type
-        }
+            # Try to parse as JSON to check for action_type
+            parsed_response = json.loads(output)
+            if isinstance(parsed_response, dict) and "action_type" in parsed_response:
+                action_type = parsed_response["action_type"]
+    except (json.JSONDecodeError, TypeError):
+        # Not a JSON response, treat as regular chat
+        pass
+    return output, action_type
+
+
+# --- Per-session single-flight ---
+# Identical concurrent requests (same user_id and input) attach to one running agent
+# execution and share its result. Different requests for the same session run one at
+# a time so history appends are never lost. State is per worker process.
+_inflight: dict[tuple[str, str], asyncio.Task] = {}
+_session_locks: dict[str, list] = {}  # user_id -> [asyncio.Lock, number of holders/waiters]
+
+
+@contextlib.asynccontextmanager
+async def session_lock(user_id: str):
+    entry = _session_locks.setdefault(user_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            _session_locks.pop(user_id, None)
+
+
+async def single_flight(user_id: str, user_input: str, run):
+    """
+    Runs run() once per concurrent (user_id, input) key, serialized per session.
+    Callers that disconnect do not cancel the shared execution.
+    """
+    key = (user_id, user_input)
+    task = _inflight.get(key)
+    if task is None or task.done():
+        async def serialized():
+            async with session_lock(user_id):
+                return await run()
+
+        task = asyncio.ensure_future(serialized())
+        _inflight[key] = task
+
+        def _release(done_task, key=key):
+            if _inflight.get(key) is done_task:
+                del _inflight[key]
+
+        task.add_done_callback(_release)
+    return await asyncio.shield(task)
+
+
+async def run_agent(user_input: str, history: list) -> tuple[str, str]:
+    # Prepare input for agent_executor with user-specific context
+    agent_input = {"input": user_input, "chat_history": history}
+    # Run the agent on the bounded agent pool: ainvoke on the event loop with AGENT_ASYNC,
+    # otherwise blocking agent_executor.invoke on the pool's threads
+    executor = await ensure_agent_executor()
+    config = {"callbacks": [MetricsCallbackHandler()]}
+    if AGENT_ASYNC:
+        response = await agent_pool.arun(executor.ainvoke, agent_input, config)
+    else:
+        response = await agent_pool.run(executor.invoke, agent_input, config)
+
+    # Parse response to check if it's a structured response with action_type
+    return normalize_output(response["output"])
+
+
+async def run_turn(user_id: str, user_input: str) -> dict:
+    # Retrieve the windowed user context from Redis
+    history = await load_history(redis_client, user_id)
+
+    output, action_type = await run_agent(user_input, history)
+
+    # Append this turn to the user context in Redis
+    await append_turn(redis_client, user_id, user_input, output)
+
+    return {
+        "output": output,
+        "action_type": action_type
+    }
+
+
+@router.post("/query")
+async def query(request: QueryRequest):
+    try:
+        return await single_flight(
+            request.user_id,
+            request.input,
+            lambda: run_turn(request.user_id, request.input)
+        )
+    except PoolRejected as e:
+        return pool_rejected_response(e)
     except Exception as e:
         return {"error": str(e), "action_type": "error"}
 
-@app.get("/")
+
+# Batch /query: BATCH_MAX_ITEMS caps a request, BATCH_CONCURRENCY caps items running at once
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 500))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 8))
+
+
+class BatchQueryRequest(BaseModel):
+    items: list[QueryRequest]
+
+
+@router.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """
+    Runs many independent {input, user_id} items concurrently and returns results in order.
+
+    Items for the same user_id run one after another so each sees the previous turn.
+    Each session is locked only while its own history is loaded, its items run and its
+    new turns are appended, so other requests for that session wait for its part of the
+    batch, not the whole batch. One failing item does not fail the batch: every result
+    carries its own status ("ok", "error" or "rejected").
+    """
+    items = request.items
+    if len(items) > BATCH_MAX_ITEMS:
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"Batch too large: {len(items)} items (max {BATCH_MAX_ITEMS}).", "action_type": "error"}
+        )
+
+    sessions = {}
+    for index, item in enumerate(items):
+        sessions.setdefault(item.user_id, []).append(index)
+
+    results = [None] * len(items)
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_session(user_id, indexes):
+        async with session_lock(user_id):
+            try:
+                history = await load_history(redis_client, user_id)
+            except Exception as e:
+                for index in indexes:
+                    results[index] = {"index": index, "user_id": user_id, "status": "error",
+                                      "error": f"Failed to load history: {e}", "action_type": "error"}
+                return
+
+            new_messages = []
+            for index in indexes:
+                item = items[index]
+                try:
+                    async with slots:
+                        output, action_type = await run_agent(item.input, history)
+                    history = apply_window(history + turn_messages(item.input, output))
+                    new_messages.extend(turn_messages(item.input, output))
+                    results[index] = {"index": index, "user_id": user_id, "status": "ok",
+                                      "output": output, "action_type": action_type}
+                except PoolRejected as e:
+                    results[index] = {"index": index, "user_id": user_id, "status": "rejected",
+                                      "error": str(e), "retry_after": e.retry_after, "action_type": "error"}
+                except Exception as e:
+                    results[index] = {"index": index, "user_id": user_id, "status": "error",
+                                      "error": str(e), "action_type": "error"}
+
+            try:
+                await append_messages(redis_client, user_id, new_messages)
+            except Exception as e:
+                # Answers were produced; report that the turns were not saved
+                for index in indexes:
+                    if results[index]["status"] == "ok":
+                        results[index]["history_error"] = str(e)
+
+    await asyncio.gather(*(run_session(user_id, indexes) for user_id, indexes in sessions.items()))
+
+    return {"results": results}
+
+
+class BulkBalanceRequest(BaseModel):
+    addresses: list[str]
+    tokens: list[str] | None = None
+    chain: str = "polygon"
+
+
+async def _spooled_lines(request: Request):
+    # The body is spooled (to disk past 1 MB) before rows stream out, so large uploads
+    # use flat memory and reading the body never races the response
+    spool = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode="w+b")
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+@router.post("/balances/bulk")
+async def bulk_balances(request: Request, chain: str = "polygon", tokens: str = ""):
+    """
+    Balances for many wallets x tokens on one chain, streamed as NDJSON.
+
+    Body: either JSON {"addresses": [...], "tokens": [...], "chain": "polygon"}, or plain
+    text with one address per line (chain and comma-separated tokens as query parameters),
+    which keeps memory flat for very large lists. tokens are TOKEN_MAP symbols, contract
+    addresses or "native"; omitted means native plus every TOKEN_MAP token.
+
+    Lines: one {"type": "header", "columns": [...]}, one {"type": "row", "address", "status",
+    "balances"} per address in input order, then {"type": "summary", "wallets", "errors", "requests"}.
+    """
+    import bulk_balances as bulk
+    spool = None
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = BulkBalanceRequest(**await request.json())
+        except Exception as e:
+            return JSONResponse(status_code=400, content={"error": f"Invalid request: {e}", "action_type": "error"})
+        chain, token_list, wallets = body.chain, body.tokens, body.addresses
+    else:
+        token_list = [token for token in tokens.split(",") if token.strip()]
+        spool = await _spooled_lines(request)
+        wallets = (line.decode("utf-8", errors="replace") for line in spool)
+
+    records = bulk.aiter_rows(chain, wallets, token_list)
+    try:
+        header = await records.__anext__()
+    except Exception as e:
+        if spool is not None:
+            spool.close()
+        if isinstance(e, bulk.BulkRequestError):
+            return JSONResponse(status_code=400, content={"error": str(e), "action_type": "error"})
+        # Token metadata is read before the header; the node answered with an error (502)
+        # or couldn't be reached (503)
+        from rpc import RPCError
+        return JSONResponse(status_code=502 if isinstance(e, RPCError) else 503,
+                            content={"error": f"RPC request failed: {e}", "action_type": "error"})
+
+    async def ndjson():
+        try:
+            yield json.dumps(header) + "\n"
+            async for record in records:
+                yield json.dumps(record) + "\n"
+        finally:
+            await records.aclose()
+            if spool is not None:
+                spool.close()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def pool_rejected_response(e: PoolRejected) -> JSONResponse:
+    # 429 when the queue is full, 503 when the queue deadline passed
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"error": str(e), "action_type": "error"},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+@router.get("/agent/pool")
+def agent_pool_stats():
+    """
+    Queue depth, running count and queue wait times of the agent pool, for sizing workers.
+    """
+    return agent_pool.stats()
+
+
+@router.get("/rpc/endpoints")
+def rpc_endpoints():
+    """
+    Per-chain RPC endpoint health (rolling latency, error rate, ejections) for this worker.
+    Chains appear once they've been used.
+    """
+    if "rpc_router" not in sys.modules:
+        return {}
+    return sys.modules["rpc_router"].router_stats()
+
+
+@router.get("/rpc/cache")
+def rpc_cache_stats():
+    """
+    Hit/miss counts, size and last seen chain heads of the chain read cache for this worker.
+    """
+    if "read_cache" not in sys.modules:
+        return {}
+    return sys.modules["read_cache"].stats()
+
+
+@router.get("/chain/heads")
+def chain_heads():
+    """
+    Latest block number, base fee and gas price per chain as seen by this worker's
+    chain-head tracker, with their age and the last tracking error.
+    """
+    if "chain_head" not in sys.modules:
+        return {}
+    return sys.modules["chain_head"].stats()
+
+
+@router.get("/chain/fees")
+def chain_fees():
+    """
+    Cached eth_feeHistory windows and the slow/normal/fast fees quoted from them, per chain.
+    """
+    if "fees" not in sys.modules:
+        return {}
+    return sys.modules["fees"].stats()
+
+
+@router.get("/tx/history")
+def tx_history_stats():
+    """
+    Wallets and transactions in the local transaction-history store, and refreshes in flight.
+    """
+    if "tx_history" not in sys.modules:
+        return {}
+    return sys.modules["tx_history"].stats()
+
+
+@router.get("/explorer")
+def explorer_stats():
+    """
+    Requests, rate-limit responses, retries and time spent queueing per explorer API key, for this worker.
+    """
+    if "explorer" not in sys.modules:
+        return {}
+    return sys.modules["explorer"].stats()
+
+
+def _sse(event: str, data: dict) -> str:
+    # One Server-Sent Event frame
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+@router.get("/tx/watch")
+def tx_watch_stats():
+    """
+    Watched transaction hashes, subscribers and receipt batches sent, per chain, for this worker.
+    """
+    if "tx_watcher" not in sys.modules:
+        return {}
+    return sys.modules["tx_watcher"].stats()
+
+
+@router.get("/tx/watch/stream")
+async def tx_watch_stream(chain: str = "polygon", tx_hash: list[str] = Query(default=[]),
+                          confirmations: int | None = None):
+    """
+    Status of transactions as Server-Sent Events until each is confirmed (or given up).
+
+    Query: chain, one or more tx_hash, optional confirmations (depth for "confirmed").
+
+    Events:
+    - status: {"chain", "tx_hash", "status", ...} whenever a transaction changes; status is
+      pending, mined (with block_number, confirmations, is_successful, gas_used),
+      confirmed, or timeout
+    - done: {"chain", "tx_hashes"} once every hash got its final status
+    """
+    import tx_watcher
+    try:
+        chain, tx_hash, confirmations = tx_watcher.validate(chain, tx_hash, confirmations)
+    except tx_watcher.WatchRequestError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "action_type": "error"})
+
+    async def event_stream():
+        # Subscribed once the stream runs: a client that leaves before the body starts
+        # never leaves a hash watched
+        subscription = tx_watcher.subscribe(chain, tx_hash, confirmations)
+        try:
+            async for event, data in tx_watcher.events(subscription):
+                yield _sse(event, data)
+        finally:
+            tx_watcher.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/tx/watch/ws")
+async def tx_watch_ws(websocket: WebSocket):
+    """
+    WebSocket variant of /tx/watch/stream. Send {"chain", "tx_hashes", "confirmations"}
+    messages to watch more hashes; receive {"event": "status" | "done" | "error", ...}.
+    """
+    import tx_watcher
+    await websocket.accept()
+    queue = asyncio.Queue()
+    subscriptions = []
+
+    async def send():
+        while True:
+            event, data = await queue.get()
+            await websocket.send_json({"event": event, **data})
+
+    sender = asyncio.create_task(send())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                subscriptions.append(tx_watcher.subscribe(message.get("chain", "polygon"), message.get("tx_hashes"),
+                                                          message.get("confirmations"), queue))
+            except (ValueError, AttributeError) as e:
+                # WatchRequestError, bad JSON or a message that isn't an object
+                queue.put_nowait(("error", {"error": str(e)}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        for subscription in subscriptions:
+            tx_watcher.unsubscribe(subscription)
+
+
+def _chunk_text(chunk) -> str:
+    # Gemini may stream content as a list of parts instead of a plain string
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+def _tool_result(output) -> dict:
+    # Tools return JSON strings such as balance_query or transaction payloads
+    output = getattr(output, "content", output)
+    try:
+        parsed = json.loads(output)
+    except (json.JSONDecodeError, TypeError):
+        return {"output": output}
+    if isinstance(parsed, dict):
+        return {"action_type": parsed.get("action_type"), "result": parsed}
+    return {"output": parsed}
+
+
+@router.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Streaming variant of /query using Server-Sent Events.
+
+    Events:
+    - tool_start: {"tool", "input"} when the agent calls a tool
+    - tool_end: {"tool", "action_type", "result"} with the tool's JSON result
+    - token: {"token"} for each LLM token
+    - final: {"output", "action_type"} with the normalized response, same shape as /query
+    - error: {"error", "action_type": "error"}
+    """
+    # Shed before the response starts so a full queue still returns 429. The slot itself is
+    # taken inside the stream: a client that leaves before the body starts holds nothing
+    try:
+        agent_pool.check_admission()
+    except PoolRejected as e:
+        return pool_rejected_response(e)
+
+    async def event_stream():
+        try:
+            # Streams cannot be shared, but they still take the session lock (before the
+            # pool slot, like /query) so history appends from both don't interleave
+            async with session_lock(request.user_id):
+                history = await load_history(redis_client, request.user_id)
+                agent_input = {"input": request.input, "chat_history": history}
+
+                try:
+                    await agent_pool.acquire()
+                except PoolRejected as e:
+                    yield _sse("error", {"error": str(e), "retry_after": e.retry_after, "action_type": "error"})
+                    return
+                start = time.monotonic()
+                output = ""
+                root_run_id = None
+                try:
+                    executor = await ensure_agent_executor()
+                    config = {"callbacks": [MetricsCallbackHandler()]}
+                    async for event in executor.astream_events(agent_input, config, version="v2"):
+                        kind = event["event"]
+                        if root_run_id is None:
+                            root_run_id = event["run_id"]
+                        if kind == "on_tool_start":
+                            yield _sse("tool_start", {"tool": event["name"], "input": event["data"].get("input")})
+                        elif kind == "on_tool_end":
+                            yield _sse("tool_end", {"tool": event["name"], **_tool_result(event["data"].get("output"))})
+                        elif kind == "on_chat_model_stream":
+                            token = _chunk_text(event["data"].get("chunk"))
+                            if token:
+                                yield _sse("token", {"token": token})
+                        elif kind == "on_chain_end" and event["run_id"] == root_run_id:
+                            output = (event["data"].get("output") or {}).get("output", "")
+                finally:
+                    agent_pool.release(time.monotonic() - start)
+
+                output, action_type = normalize_output(output)
+                await append_turn(redis_client, request.user_id, request.input, output)
+                yield _sse("final", {"output": output, "action_type": action_type})
+        except Exception as e:
+            yield _sse("error", {"error": str(e), "action_type": "error"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/")
 def root():
     return {"message": "Server is running. 💀💀GREEN FLAG💀💀 Watchya back"}
 
+
+@router.get("/warmup")
+async def warmup():
+    """
+    Builds the agent executor, imports heavy tool dependencies and checks Redis,
+    so the first real request on a fresh pod doesn't pay for them. Returns timings.
+    """
+    timings = {}
+    start = time.perf_counter()
+    await ensure_agent_executor()
+    timings["agent_executor_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    from lang import warm_tool_dependencies
+    await run_in_threadpool(warm_tool_dependencies)
+    timings["tool_imports_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    try:
+        await redis_client.ping()
+        redis_status = "ok"
+    except Exception as e:
+        redis_status = f"error: {e}"
+    timings["redis_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return {"status": "ok", "redis": redis_status, "timings_ms": timings}
+
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8080))
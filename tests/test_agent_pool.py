@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from agent_pool import AgentPool, PoolSaturated, PoolTimeout
+
+
+def test_full_queue_is_rejected_with_429_and_retry_after():
+    async def run():
+        pool = AgentPool(max_concurrency=1, max_queue=1, queue_timeout=5)
+        finish = asyncio.Event()
+        running = asyncio.create_task(pool.arun(finish.wait))
+        queued = asyncio.create_task(pool.arun(finish.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PoolSaturated) as rejected:
+            await pool.arun(finish.wait)
+        finish.set()
+        await asyncio.gather(running, queued)
+        return rejected.value, pool.stats()
+
+    error, stats = asyncio.run(run())
+    response = server.pool_rejected_response(error)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert stats["rejected"] == 1 and stats["running"] == 0 and stats["queue_depth"] == 0
+
+
+def test_queue_wait_past_timeout_is_rejected_with_503():
+    async def run():
+        pool = AgentPool(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        finish = asyncio.Event()
+        running = asyncio.create_task(pool.arun(finish.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(PoolTimeout) as rejected:
+            await pool.arun(finish.wait)
+        finish.set()
+        await running
+        return rejected.value, pool.stats()
+
+    error, stats = asyncio.run(run())
+    response = server.pool_rejected_response(error)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert stats["timed_out"] == 1 and stats["running"] == 0 and stats["queue_depth"] == 0
+
+
+def test_slots_are_released_after_success_and_failure():
+    def blocking(fail):
+        time.sleep(0.01)
+        if fail:
+            raise RuntimeError("tool failed")
+        return "ok"
+
+    async def failing():
+        raise RuntimeError("tool failed")
+
+    async def run():
+        pool = AgentPool(max_concurrency=2, max_queue=4, queue_timeout=5)
+        results = await asyncio.gather(pool.run(blocking, False), pool.run(blocking, True), pool.arun(failing),
+                                       pool.arun(asyncio.sleep, 0.01, "ok"), return_exceptions=True)
+        # Blocking runs free their slot from the thread's done callback
+        await asyncio.sleep(0.01)
+        pool.shutdown()
+        return results, pool.stats()
+
+    results, stats = asyncio.run(run())
+    assert results[0] == "ok" and results[3] == "ok"
+    assert isinstance(results[1], RuntimeError) and isinstance(results[2], RuntimeError)
+    assert stats["admitted"] == 4
+    assert stats["running"] == 0 and stats["queue_depth"] == 0
@@ -0,0 +1,110 @@
+import threading
+
+import fakeredis
+import pytest
+
+import explorer
+import redis_store
+
+URL = "https://explorer.test/api"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, data=None):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+@pytest.fixture
+def bucket_redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_store, "_sync_client", client)
+    monkeypatch.setattr(redis_store, "_unavailable_until", 0.0)
+    monkeypatch.setattr(explorer, "_script", None)
+    monkeypatch.setattr(explorer, "EXPLORER_REDIS", True)
+    return client
+
+
+@pytest.fixture
+def local_buckets(monkeypatch):
+    monkeypatch.setattr(explorer, "EXPLORER_REDIS", False)
+
+
+def _waits(client, count: int, longest: float = 10) -> list:
+    return [client.reserve(longest) for _ in range(count)]
+
+
+@pytest.mark.parametrize("buckets", ["bucket_redis", "local_buckets"])
+def test_bucket_queues_requests_past_the_burst(buckets, request):
+    request.getfixturevalue(buckets)
+    client = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=5)
+    assert client.burst == 5
+    waits = _waits(client, 7)
+    assert waits[:5] == [0, 0, 0, 0, 0]
+    assert waits[5] == pytest.approx(0.2, abs=0.05) and waits[6] == pytest.approx(0.4, abs=0.05)
+    # A request that can't be served in time reserves nothing
+    assert client.reserve(0.1) is None
+    assert client.reserve(10) == pytest.approx(0.6, abs=0.05)
+
+
+def test_redis_bucket_is_shared_by_clients_of_one_key(bucket_redis):
+    first = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=5)
+    second = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=5)
+    _waits(first, 5)
+    assert second.reserve(10) == pytest.approx(0.2, abs=0.05)
+    assert bucket_redis.exists(first.bucket)
+
+
+def test_rate_limit_answers_are_retried_with_backoff(local_buckets, monkeypatch):
+    monkeypatch.setattr(explorer, "EXPLORER_BACKOFF", 0.001)
+    client = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=100)
+    answers = iter([
+        FakeResponse(200, {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}),
+        FakeResponse(429),
+        FakeResponse(200, {"status": "1", "message": "OK", "result": []}),
+    ])
+    monkeypatch.setattr(client.session, "get", lambda url, params, timeout: next(answers))
+    assert client.get("polygon", URL, {}, deadline=explorer.time.monotonic() + 5)["status"] == "1"
+    stats = client.stats()
+    assert (stats["requests"], stats["rate_limited"], stats["retries"]) == (3, 2, 2)
+
+
+def test_persistent_rate_limit_gives_up_after_the_retries(local_buckets, monkeypatch):
+    monkeypatch.setattr(explorer, "EXPLORER_BACKOFF", 0.001)
+    monkeypatch.setattr(explorer, "EXPLORER_RETRIES", 2)
+    client = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=100)
+    monkeypatch.setattr(client.session, "get", lambda url, params, timeout: FakeResponse(429))
+    with pytest.raises(explorer.ExplorerError, match="rate limit"):
+        client.get("polygon", URL, {}, deadline=explorer.time.monotonic() + 5)
+    assert client.stats()["requests"] == 3
+
+
+def test_request_past_its_deadline_fails_without_being_sent(local_buckets, monkeypatch):
+    client = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=1)
+    monkeypatch.setattr(client.session, "get", lambda *args, **kwargs: pytest.fail("request was sent"))
+    client.reserve(10)
+    with pytest.raises(explorer.ExplorerError, match="deadline"):
+        client.get("polygon", URL, {}, deadline=explorer.time.monotonic() + 0.1)
+    assert client.stats()["deadline_exceeded"] == 1
+
+
+def test_counters_add_up_across_threads(local_buckets):
+    client = explorer._ExplorerClient("EXPLORER_TEST_KEY", rate=5)
+
+    def count():
+        for _ in range(10_000):
+            client._count("requests")
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert client.stats()["requests"] == 80_000
@@ -0,0 +1,13 @@
+import pytest
+
+import fees
+
+
+def test_percentiles_setting_is_parsed():
+    assert fees._percentiles("10, 50,90") == [10.0, 50.0, 90.0]
+
+
+@pytest.mark.parametrize("setting", ["10,50", "10,50,90,99", "90,50,10", "10,fast,90", "10,50,101", "nan,50,90"])
+def test_unusable_percentiles_setting_fails_at_load(setting):
+    with pytest.raises(ValueError, match="FEE_PERCENTILES"):
+        fees._percentiles(setting)
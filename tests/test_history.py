@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+import history
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def _messages(count: int) -> list:
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"} for i in range(count)]
+
+
+def test_large_overflow_is_archived_in_chunks(redis_client, monkeypatch):
+    async def run():
+        await redis_client.rpush(history.turns_key("u"), *[json.dumps(m) for m in _messages(20000)])
+        # The live cap was lowered well below the stored list
+        monkeypatch.setattr(history, "HISTORY_MAX_STORED_TURNS", 10)
+        length = await history.append_messages(redis_client, "u", _messages(2))
+        archived = await redis_client.llen(history.archive_key("u"))
+        return length, archived
+
+    length, archived = asyncio.run(run())
+    assert length == 20
+    assert archived == 20002 - 20
+
+
+def test_concurrent_legacy_migrations_append_once(redis_client, monkeypatch):
+    from redis.asyncio.client import Pipeline, Redis
+
+    def round_trip(send):
+        # fakeredis answers without yielding; let other migrations run between commands
+        async def wrapper(self, *args, **kwargs):
+            await asyncio.sleep(0.001)
+            return await send(self, *args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(Redis, "execute_command", round_trip(Redis.execute_command))
+    monkeypatch.setattr(Pipeline, "immediate_execute_command", round_trip(Pipeline.immediate_execute_command))
+
+    async def run():
+        await redis_client.set(history.legacy_key("u"), json.dumps(_messages(6)))
+        await asyncio.gather(*(history._migrate_legacy(redis_client, "u") for _ in range(5)))
+        return (await redis_client.lrange(history.turns_key("u"), 0, -1),
+                await redis_client.exists(history.legacy_key("u")))
+
+    live, legacy_left = asyncio.run(run())
+    assert [json.loads(m)["content"] for m in live] == [f"m{i}" for i in range(6)]
+    assert not legacy_left
+
+
+def test_load_history_migrates_legacy_blob(redis_client):
+    async def run():
+        await redis_client.set(history.legacy_key("u"), json.dumps(_messages(4)))
+        return await history.load_history(redis_client, "u")
+
+    assert [m["content"] for m in asyncio.run(run())] == ["m0", "m1", "m2", "m3"]
+
+
+def test_empty_history_is_read_in_one_round_trip(redis_client, monkeypatch):
+    from redis.asyncio.client import Pipeline, Redis
+
+    round_trips = []
+
+    def counted(send):
+        async def wrapper(self, *args, **kwargs):
+            round_trips.append(args[0] if args else "pipeline")
+            return await send(self, *args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(Redis, "execute_command", counted(Redis.execute_command))
+    monkeypatch.setattr(Pipeline, "execute", counted(Pipeline.execute))
+
+    assert asyncio.run(history.load_history(redis_client, "new-user")) == []
+    assert round_trips == ["pipeline"]
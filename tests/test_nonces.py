@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+
+import nonces
+import redis_store
+
+SENDER = "0x" + "11" * 20
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_store, "_sync_client", fakeredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(redis_store, "_unavailable_until", 0.0)
+    monkeypatch.setattr(nonces, "_local", {})
+    monkeypatch.setattr(nonces, "_script", None)
+    return server
+
+
+def _allocate_concurrently(count: int) -> list:
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return list(pool.map(lambda _: nonces.allocate("polygon", SENDER), range(count)))
+
+
+def test_concurrent_callers_get_consecutive_nonces(redis_server):
+    assert nonces.allocate("polygon", SENDER) is None
+    nonces.record_pending("polygon", SENDER, 5)
+    allocated = _allocate_concurrently(200)
+    assert sorted(allocated) == list(range(5, 205))
+    assert not nonces._local
+
+
+def test_counter_follows_the_chain_when_it_is_ahead(redis_server, monkeypatch):
+    assert nonces.needs_sync("polygon", SENDER)
+    assert nonces.allocate("polygon", SENDER, pending=5) == 5
+    assert nonces.allocate("polygon", SENDER) == 6
+    assert not nonces.needs_sync("polygon", SENDER)
+
+    # A receipt means the next preparation re-reads the pending count
+    nonces.note_receipt("polygon", SENDER)
+    assert nonces.needs_sync("polygon", SENDER)
+    assert nonces.allocate("polygon", SENDER, pending=10) == 10
+    # A lower count doesn't take back nonces handed out within the reservation ttl
+    assert nonces.allocate("polygon", SENDER, pending=3) == 11
+    monkeypatch.setattr(nonces, "NONCE_RESERVATION_TTL", -1)
+    assert nonces.allocate("polygon", SENDER, pending=3) == 3
+
+
+def test_local_counters_when_redis_is_down(redis_server):
+    redis_server.connected = False
+    assert nonces.needs_sync("polygon", SENDER)
+    # Redis is skipped for REDIS_RETRY_INTERVAL after the failure
+    assert redis_store.get_sync_redis() is None
+    nonces.record_pending("polygon", SENDER, 7)
+    assert sorted(_allocate_concurrently(50)) == list(range(7, 57))
+    assert not nonces.needs_sync("polygon", SENDER)
+
+
+def test_redis_failure_mid_session_asks_for_a_local_sync(redis_server):
+    nonces.record_pending("polygon", SENDER, 5)
+    assert nonces.allocate("polygon", SENDER) == 5
+    redis_server.connected = False
+    # The in-process counter was never synced, so the caller sends sync_call along
+    assert nonces.allocate("polygon", SENDER) is None
+    assert redis_store.get_sync_redis() is None
+    assert nonces.allocate("polygon", SENDER, pending=6) == 6
@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+import lang
+import rpc
+
+
+def test_replaced_async_client_closes_its_session(monkeypatch):
+    monkeypatch.setattr(rpc, "_async_clients", {})
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        # Built on a loop that keeps running in another thread, then replaced from this one
+        old = asyncio.run_coroutine_threadsafe(rpc._get_async_client("polygon"), other_loop).result(5)
+
+        async def replace():
+            new = await rpc._get_async_client("polygon")
+            # Endpoints edited at runtime make the client on this loop stale as well
+            monkeypatch.setitem(lang.EVM_CHAINS["polygon"], "rpcs", ["https://example.invalid"])
+            newer = await rpc._get_async_client("polygon")
+            await asyncio.sleep(0.05)
+            closed = new.session.closed
+            await newer.session.close()
+            return closed
+
+        assert asyncio.run(replace())
+        assert old.session.closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(5)
+        other_loop.close()
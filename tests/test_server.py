@@ -0,0 +1,126 @@
+import asyncio
+import json
+import threading
+import time
+
+import fakeredis
+import httpx
+import pytest
+
+import server
+from agent_pool import AgentPool
+
+
+class CountingExecutor:
+    """Stands in for the agent executor; records each input it runs."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def invoke(self, agent_input, config=None):
+        with self._lock:
+            self.calls.append(agent_input["input"])
+        time.sleep(self.delay)
+        return {"output": f"echo {agent_input['input']}"}
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = CountingExecutor()
+    monkeypatch.setattr(server, "agent_executor", executor)
+    monkeypatch.setattr(server, "redis_client", fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(server, "AGENT_ASYNC", False)
+    monkeypatch.setattr(server, "agent_pool", AgentPool(max_concurrency=4, max_queue=8, queue_timeout=5))
+    return executor
+
+
+def test_identical_concurrent_queries_run_the_agent_once(executor):
+    async def run():
+        transport = httpx.ASGITransport(app=server.create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/query", json={"input": "hi", "user_id": "u"})
+                                          for _ in range(5)))
+
+    responses = asyncio.run(run())
+    outputs = {response.json()["output"] for response in responses}
+    assert len(outputs) == 1 and "echo hi" in outputs.pop()
+    assert executor.calls == ["hi"]
+    assert not server._inflight and not server._session_locks
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_run():
+    runs = []
+
+    async def run():
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def work():
+            runs.append("q")
+            started.set()
+            await finish.wait()
+            return "done"
+
+        first = asyncio.create_task(server.single_flight("u", "q", work))
+        await started.wait()
+        second = asyncio.create_task(server.single_flight("u", "q", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        finish.set()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+    assert runs == ["q"]
+
+
+def test_inputs_of_one_session_run_one_at_a_time():
+    active = {"u": 0, "other": 0}
+    peak = {"u": 0, "other": 0}
+
+    async def work(user_id, user_input):
+        active[user_id] += 1
+        peak[user_id] = max(peak[user_id], active[user_id])
+        await asyncio.sleep(0.01)
+        active[user_id] -= 1
+        return user_input
+
+    async def run():
+        calls = [("u", "q1"), ("u", "q2"), ("u", "q3"), ("other", "q1")]
+        return await asyncio.gather(*(server.single_flight(user_id, user_input,
+                                                           lambda u=user_id, i=user_input: work(u, i))
+                                      for user_id, user_input in calls))
+
+    assert asyncio.run(run()) == ["q1", "q2", "q3", "q1"]
+    assert peak == {"u": 1, "other": 1}
+    assert not server._session_locks
+
+
+def test_batch_locks_each_session_only_for_its_own_items(executor):
+
+    def invoke(agent_input, config=None):
+        time.sleep(0.3 if agent_input["input"] == "slow" else 0.01)
+        return {"output": f"echo {agent_input['input']}"}
+
+    executor.invoke = invoke
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.create_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            batch = asyncio.create_task(client.post("/query/batch", json={"items": [
+                {"input": "slow", "user_id": "a"}, {"input": "first", "user_id": "b"}]}))
+            await asyncio.sleep(0.1)
+            # Session b's part of the batch is done; its next query doesn't wait for session a
+            single = await client.post("/query", json={"input": "second", "user_id": "b"})
+            batch_done = batch.done()
+            results = (await batch).json()["results"]
+        turns = await server.redis_client.lrange("chat_turns:b", 0, -1)
+        return single.json(), batch_done, results, turns
+
+    single, batch_done, results, turns = asyncio.run(run())
+    assert "echo second" in single["output"] and not batch_done
+    assert [result["status"] for result in results] == ["ok", "ok"]
+    assert [json.loads(turn)["content"] for turn in turns[::2]] == ["first", "second"]
+    assert not server._session_locks
@@ -0,0 +1,117 @@
+import pytest
+
+import token_meta
+import tokens
+from rpc import RPCError
+from tokens import TokenReadError
+
+WALLET = "0x" + "11" * 20
+TOKEN_A = "0x" + "aa" * 20
+TOKEN_B = "0x" + "bb" * 20
+TOKEN_C = "0x" + "cc" * 20
+
+
+def _uint(value: int) -> str:
+    return "0x" + format(value, "064x")
+
+
+def _string(value: str) -> str:
+    raw = value.encode()
+    return "0x" + format(32, "064x") + format(len(raw), "064x") + raw.hex().ljust(64, "0")
+
+
+@pytest.fixture
+def no_multicall(monkeypatch):
+    monkeypatch.setattr(tokens, "multicall_address", lambda chain: None)
+    monkeypatch.setattr(token_meta, "store_metadata", lambda *args: None)
+
+
+def test_failed_known_token_does_not_shift_later_tokens(no_multicall):
+    known = {TOKEN_A: (18, "AAA"), TOKEN_B: None, TOKEN_C: (6, "CCC")}
+    rpc_calls, decode = tokens._plan_balances("polygon", WALLET, [TOKEN_A, TOKEN_B, TOKEN_C], False, known)
+    assert len(rpc_calls) == 5
+    responses = [
+        RPCError(3, "execution reverted"),              # A balanceOf
+        _uint(5 * 10 ** 18), _uint(18), _string("BBB"),  # B balanceOf, decimals, symbol
+        _uint(7 * 10 ** 6),                              # C balanceOf
+    ]
+    balances = decode(responses)["tokens"]
+    assert isinstance(balances[TOKEN_A], TokenReadError)
+    assert balances[TOKEN_B] == (5.0, 18, "BBB")
+    assert balances[TOKEN_C] == (7.0, 6, "CCC")
+
+
+def test_failed_unknown_token_does_not_shift_later_tokens(no_multicall):
+    known = {TOKEN_A: None, TOKEN_C: (6, "CCC")}
+    _, decode = tokens._plan_balances("polygon", WALLET, [TOKEN_A, TOKEN_C], False, known)
+    balances = decode([RPCError(3, "reverted"), _uint(6), _string("AAA"), _uint(7 * 10 ** 6)])["tokens"]
+    assert isinstance(balances[TOKEN_A], TokenReadError)
+    assert balances[TOKEN_C] == (7.0, 6, "CCC")
+
+
+def _aggregate3_reply(entries: list) -> str:
+    from eth_abi import encode
+    return "0x" + encode(["(bool,bytes)[]"], [entries]).hex()
+
+
+@pytest.mark.parametrize("entries", [
+    [],
+    [(True, b"")],
+    [(True, bytes.fromhex(_uint(7)[2:])), (False, b""), (True, b"\x01\x02\x03")],
+    [(True, bytes(range(200))), (True, b"x" * 33)],
+])
+def test_decode_aggregate3_matches_eth_abi(entries):
+    from eth_abi import decode
+    reply = _aggregate3_reply(entries)
+    expected = decode(["(bool,bytes)[]"], bytes.fromhex(reply[2:]))[0]
+    decoded = tokens._decode_aggregate3(reply, len(entries))
+    assert len(decoded) == len(expected)
+    for (success, data), result in zip(expected, decoded):
+        if success:
+            assert result == "0x" + data.hex()
+        else:
+            assert isinstance(result, TokenReadError)
+
+
+def test_decode_aggregate3_rejects_truncated_reply():
+    from eth_abi import decode
+    from eth_abi.exceptions import InsufficientDataBytes
+    reply = _aggregate3_reply([(True, b"\x01" * 40), (True, b"\x02" * 40)])
+    truncated = reply[:-64 * 2]
+    with pytest.raises(InsufficientDataBytes):
+        decode(["(bool,bytes)[]"], bytes.fromhex(truncated[2:]))
+    with pytest.raises(TokenReadError):
+        tokens._decode_aggregate3(truncated, 2)
+
+
+def test_decode_aggregate3_rejects_wrong_count():
+    reply = _aggregate3_reply([(True, b"\x01")])
+    with pytest.raises(TokenReadError):
+        tokens._decode_aggregate3(reply, 2)
+
+
+def test_decode_aggregate3_rejects_huge_length_without_looping():
+    # A contract other than Multicall3 answering with an offset and an enormous length word
+    reply = "0x" + format(32, "064x") + format(2 ** 40, "064x")
+    with pytest.raises(TokenReadError):
+        tokens._decode_aggregate3(reply, 1)
+
+
+@pytest.mark.parametrize("reply", [
+    "0x" + format(2 ** 200, "064x"),                                            # offset past the end
+    "0x" + format(32, "064x") + format(1, "064x") + format(2 ** 100, "064x"),   # entry offset past the end
+    "0x" + format(32, "064x") + format(1, "064x") + format(32, "064x")
+    + format(1, "064x") + format(64, "064x") + format(10 ** 6, "064x"),          # data size past the end
+])
+def test_decode_aggregate3_rejects_out_of_bounds_offsets(reply):
+    with pytest.raises(TokenReadError):
+        tokens._decode_aggregate3(reply, 1)
+
+
+def test_malformed_multicall_reply_fails_its_chunk_only(monkeypatch):
+    monkeypatch.setattr(tokens, "multicall_address", lambda chain: "0x" + "ca" * 20)
+    monkeypatch.setattr(tokens, "MULTICALL_MAX_CALLS", 1)
+    _, decode = tokens.plan_calls("polygon", [(TOKEN_A, tokens.SEL_DECIMALS), (TOKEN_B, tokens.SEL_DECIMALS)])
+    results = decode(["0x" + format(32, "064x"), _aggregate3_reply([(True, bytes.fromhex(_uint(6)[2:]))])])
+    assert isinstance(results[0], TokenReadError)
+    assert results[1] == _uint(6)
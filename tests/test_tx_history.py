@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+import tx_history
+
+WALLET = "0x" + "aa" * 20
+OTHER = "0x" + "bb" * 20
+
+
+class FakeExplorer:
+    """txlist over an in-memory chain with Etherscan's startblock/endblock/sort/offset rules."""
+
+    def __init__(self, blocks):
+        self.txs = []
+        self.requests = []
+        for block in blocks:
+            self.add(block)
+
+    def add(self, block: int) -> None:
+        self.txs.append({"hash": f"0x{len(self.txs):064x}", "blockNumber": str(block), "from": OTHER,
+                         "to": WALLET, "value": "1000000000000000000", "timeStamp": str(1_700_000_000 + block)})
+
+    def get(self, chain, params, deadline=None):
+        self.requests.append(params)
+        start, end = int(params.get("startblock", 0)), int(params.get("endblock", 10 ** 9))
+        txs = sorted((tx for tx in self.txs if start <= int(tx["blockNumber"]) <= end),
+                     key=lambda tx: int(tx["blockNumber"]), reverse=params.get("sort") == "desc")
+        txs = txs[:int(params["offset"])]
+        if not txs:
+            return {"status": "0", "message": "No transactions found", "result": []}
+        return {"status": "1", "message": "OK", "result": txs}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(tx_history, "TX_HISTORY_DB", str(tmp_path / "tx_history.sqlite3"))
+    monkeypatch.setattr(tx_history, "TX_HISTORY_PAGE", 5)
+    monkeypatch.setattr(tx_history, "TX_HISTORY_MAX_AGE", 3600)
+    monkeypatch.setattr(tx_history, "_local", threading.local())
+    monkeypatch.setattr(tx_history, "_schema_ready", False)
+
+
+@pytest.fixture
+def explorer(store, monkeypatch):
+    fake = FakeExplorer(range(100, 112))
+    monkeypatch.setattr(tx_history.explorer, "get", fake.get)
+    return fake
+
+
+def _blocks(txs: list) -> list:
+    return [tx["block_number"] for tx in txs]
+
+
+def test_pages_are_read_from_the_store_and_older_pages_on_demand(explorer):
+    txs, has_more = tx_history.transactions("polygon", WALLET, limit=4)
+    assert _blocks(txs) == [111, 110, 109, 108] and has_more
+    # First sync reads the newest explorer page only
+    assert len(explorer.requests) == 1 and explorer.requests[0]["sort"] == "desc"
+
+    txs, has_more = tx_history.transactions("polygon", WALLET, limit=4, page=3)
+    assert _blocks(txs) == [103, 102, 101, 100] and not has_more
+    assert all(request.get("endblock") is not None for request in explorer.requests[1:])
+
+    # Everything is stored now; no more explorer requests
+    sent = len(explorer.requests)
+    assert tx_history.transactions("polygon", WALLET, limit=4, page=4) == ([], False)
+    assert tx_history.transactions("polygon", WALLET, limit=4, page=2)[0][0]["block_number"] == 107
+    assert len(explorer.requests) == sent
+
+
+def test_has_more_at_exact_page_boundaries(explorer):
+    txs, has_more = tx_history.transactions("polygon", WALLET, limit=12)
+    assert len(txs) == 12 and not has_more
+    txs, has_more = tx_history.transactions("polygon", WALLET, limit=6, page=2)
+    assert _blocks(txs) == [105, 104, 103, 102, 101, 100] and not has_more
+    txs, has_more = tx_history.transactions("polygon", WALLET, limit=11)
+    assert len(txs) == 11 and has_more
+
+
+def test_sync_newer_reads_blocks_after_the_last_sync(explorer):
+    tx_history.transactions("polygon", WALLET, limit=3)
+    for block in range(112, 120):
+        explorer.add(block)
+    explorer.requests.clear()
+
+    tx_history._sync_newer("polygon", WALLET)
+    # Pages of 5 from block 111 on, each starting again at the last block read
+    assert [request["startblock"] for request in explorer.requests] == [111, 115, 119]
+    txs, has_more = tx_history.transactions("polygon", WALLET, limit=9)
+    assert _blocks(txs) == list(range(119, 110, -1)) and has_more
+    assert tx_history._wallet("polygon", WALLET)[0] == 119
+    assert tx_history._count("polygon", WALLET) == 13
+
+
+def test_sync_older_marks_the_history_complete(explorer):
+    tx_history.transactions("polygon", WALLET, limit=1)
+    tx_history._sync_older("polygon", WALLET, wanted=100)
+    newest, oldest, complete, _ = tx_history._wallet("polygon", WALLET)
+    assert (newest, oldest, complete) == (111, 100, 1)
+    assert tx_history._count("polygon", WALLET) == 12
+    sent = len(explorer.requests)
+    tx_history._sync_older("polygon", WALLET, wanted=100)
+    assert len(explorer.requests) == sent
+
+
+def test_wallet_without_transactions(store, monkeypatch):
+    fake = FakeExplorer([])
+    monkeypatch.setattr(tx_history.explorer, "get", fake.get)
+    assert tx_history.transactions("polygon", WALLET, limit=10) == ([], False)
+    assert tx_history._wallet("polygon", WALLET)[2] == 1
@@ -0,0 +1,42 @@
+import pytest
+
+import fees
+import tx_prep
+from rpc import RPCError
+
+SENDER = "0x" + "11" * 20
+TX = {"from": SENDER, "to": "0x" + "22" * 20, "value": 1}
+FEE_HISTORY = {
+    "oldestBlock": hex(100),
+    "baseFeePerGas": [hex(30 * 10 ** 9), hex(31 * 10 ** 9)],
+    "gasUsedRatio": [0.5],
+    "reward": [[hex(10 ** 9), hex(2 * 10 ** 9), hex(3 * 10 ** 9)]],
+}
+
+
+@pytest.fixture
+def eip1559(monkeypatch):
+    monkeypatch.setattr(fees, "uses_eip1559", lambda chain: True)
+    monkeypatch.setattr(fees, "_windows", {})
+    monkeypatch.setattr(fees, "_refreshing", set())
+
+
+def test_reverted_estimate_still_stores_fee_history(eip1559, monkeypatch):
+    monkeypatch.setattr(tx_prep, "batch_request",
+                        lambda chain, calls: [RPCError(3, "execution reverted"), FEE_HISTORY])
+    with pytest.raises(RPCError):
+        tx_prep.gas_fees("polygon", TX)
+    assert "polygon" not in fees._refreshing
+    assert fees.cached_quote("polygon")["base_fee"] == 31 * 10 ** 9
+
+
+def test_failed_batch_releases_fee_history_refresh(eip1559, monkeypatch):
+    def fail(chain, calls):
+        raise ConnectionError("node down")
+
+    monkeypatch.setattr(tx_prep, "batch_request", fail)
+    with pytest.raises(ConnectionError):
+        tx_prep.gas_fees("polygon", TX)
+    assert "polygon" not in fees._refreshing
+    # The next caller plans the refresh again instead of skipping it
+    assert fees.refresh_calls("polygon")
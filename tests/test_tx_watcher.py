@@ -0,0 +1,30 @@
+import asyncio
+
+import chain_head
+import tx_watcher
+
+TX_HASH = "0x" + "ab" * 32
+
+
+def test_unchanged_head_sends_no_receipt_batch(monkeypatch):
+    batches = []
+
+    async def abatch_request(chain, calls, cache=True):
+        batches.append([method for method, _ in calls])
+        return [hex(100) if method == "eth_blockNumber" else None for method, _ in calls]
+
+    monkeypatch.setattr(tx_watcher, "abatch_request", abatch_request)
+    monkeypatch.setattr(chain_head, "snapshot", lambda chain: None)
+    monkeypatch.setattr(tx_watcher, "_watches", {})
+    monkeypatch.setattr(tx_watcher, "_force_check", set())
+
+    async def run():
+        subscription = tx_watcher.Subscription("polygon", [TX_HASH], 3, asyncio.Queue())
+        tx_watcher._watches["polygon"] = {TX_HASH: {"state": None, "since": 0, "subscribers": {subscription}}}
+        head = await tx_watcher._check("polygon", None)
+        return head, await tx_watcher._check("polygon", head)
+
+    assert asyncio.run(run()) == (100, 100)
+    receipt_batches = [batch for batch in batches if "eth_getTransactionReceipt" in batch]
+    assert receipt_batches == [["eth_getTransactionReceipt"]]
+    assert batches.count(["eth_blockNumber"]) == 2
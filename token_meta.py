@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from redis_store import get_sync_redis, mark_unavailable
+from rpc import chain_config
+from tokens import (DEFAULT_SYMBOL, SEL_DECIMALS, SEL_SYMBOL, TokenReadError, acall_many, call_many, decode_string,
+                    decode_uint, plan_calls)
+
+# ERC-20 decimals/symbol never change for a deployed contract, so they are cached
+# per (chain_id, token_address) instead of being read on every tool call.
+# Lookups go in-process LRU -> Redis -> RPC; the LRU is pre-seeded from TOKEN_MAP.
+# TOKEN_META_CACHE_SIZE  entries kept in the in-process LRU
+# TOKEN_META_REDIS       set to "false" to keep the cache in-process only
+TOKEN_META_CACHE_SIZE = int(os.environ.get("TOKEN_META_CACHE_SIZE", 4096))
+TOKEN_META_REDIS = os.environ.get("TOKEN_META_REDIS", "true").lower() == "true"
+
+REDIS_KEY_PREFIX = "token_meta"
+
+_cache: "OrderedDict[tuple, tuple[int, str]]" = OrderedDict()
+_lock = threading.Lock()
+_pending: set = set()
+_seeded = False
+# Background fills and Redis writes stay off the request path
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="token-meta")
+
+
+def _key(chain: str, token_address: str) -> tuple:
+    return chain_config(chain).get("chain_id", 0), token_address.lower()
+
+
+def _redis_key(key: tuple) -> str:
+    return f"{REDIS_KEY_PREFIX}:{key[0]}:{key[1]}"
+
+
+def _remember(key: tuple, metadata: tuple) -> None:
+    with _lock:
+        _cache[key] = metadata
+        _cache.move_to_end(key)
+        while len(_cache) > TOKEN_META_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _seed() -> None:
+    """Loads the tokens from TOKEN_MAP whose decimals are listed in TOKEN_DECIMALS."""
+    global _seeded
+    from lang import EVM_CHAINS, TOKEN_DECIMALS, TOKEN_MAP
+    for chain, symbols in TOKEN_MAP.items():
+        chain_id = EVM_CHAINS.get(chain, {}).get("chain_id", 0)
+        for symbol, address in symbols.items():
+            decimals = TOKEN_DECIMALS.get(chain, {}).get(symbol)
+            if decimals is not None:
+                _remember((chain_id, address.lower()), (decimals, symbol))
+    _seeded = True
+
+
+def _redis_get(key: tuple):
+    client = get_sync_redis() if TOKEN_META_REDIS else None
+    if client is None:
+        return None
+    try:
+        raw = client.get(_redis_key(key))
+    except Exception as e:
+        mark_unavailable(e)
+        return None
+    if not raw:
+        return None
+    value = json.loads(raw)
+    return int(value["decimals"]), value["symbol"]
+
+
+def _redis_set(key: tuple, metadata: tuple) -> None:
+    client = get_sync_redis() if TOKEN_META_REDIS else None
+    if client is None:
+        return
+    try:
+        client.set(_redis_key(key), json.dumps({"decimals": metadata[0], "symbol": metadata[1]}))
+    except Exception as e:
+        mark_unavailable(e)
+
+
+def _lru_get(key: tuple):
+    if not _seeded:
+        _seed()
+    with _lock:
+        metadata = _cache.get(key)
+        if metadata is not None:
+            _cache.move_to_end(key)
+        return metadata
+
+
+def cached_metadata(chain: str, token_address: str):
+    """(decimals, symbol) from the LRU or Redis tier, or None without touching the chain."""
+    key = _key(chain, token_address)
+    metadata = _lru_get(key)
+    if metadata is not None:
+        return metadata
+    metadata = _redis_get(key)
+    if metadata is not None:
+        _remember(key, metadata)
+    return metadata
+
+
+async def acached_metadata(chain: str, token_address: str):
+    """cached_metadata for the event loop; the blocking Redis lookup runs in a thread."""
+    key = _key(chain, token_address)
+    metadata = _lru_get(key)
+    if metadata is not None:
+        return metadata
+    metadata = await asyncio.to_thread(_redis_get, key)
+    if metadata is not None:
+        _remember(key, metadata)
+    return metadata
+
+
+def store_metadata(chain: str, token_address: str, decimals: int, symbol: str) -> None:
+    """Caches metadata read elsewhere (e.g. alongside a balance read in tokens.read_balances)."""
+    key = _key(chain, token_address)
+    metadata = (int(decimals), symbol)
+    _remember(key, metadata)
+    if TOKEN_META_REDIS:
+        _background.submit(_redis_set, key, metadata)
+
+
+def get_token_metadata(chain: str, token_address: str) -> tuple[int, str]:
+    """
+    (decimals, symbol) for an ERC-20 token, reading both in one request on a cache miss.
+    Raises TokenReadError if decimals can't be read; a missing symbol falls back to "TOKEN"
+    and is not cached so a later call can retry it.
+    """
+    metadata = cached_metadata(chain, token_address)
+    if metadata is not None:
+        return metadata
+    return _metadata_from_results(chain, token_address, call_many(chain, _metadata_calls(token_address)))
+
+
+async def aget_token_metadata(chain: str, token_address: str) -> tuple[int, str]:
+    """Async get_token_metadata."""
+    metadata = await acached_metadata(chain, token_address)
+    if metadata is not None:
+        return metadata
+    return _metadata_from_results(chain, token_address, await acall_many(chain, _metadata_calls(token_address)))
+
+
+def plan_metadata(chain: str, token_address: str) -> tuple:
+    """(JSON-RPC calls, decode(responses) -> (decimals, symbol)) so the read can share a caller's batch."""
+    rpc_calls, decode_calls = plan_calls(chain, _metadata_calls(token_address))
+    return rpc_calls, lambda responses: _metadata_from_results(chain, token_address, decode_calls(responses))
+
+
+def _metadata_calls(token_address: str) -> list:
+    return [(token_address, SEL_DECIMALS), (token_address, SEL_SYMBOL)]
+
+
+def _metadata_from_results(chain: str, token_address: str, results: list) -> tuple[int, str]:
+    decimals = decode_uint(results[0])
+    try:
+        symbol = decode_string(results[1])
+    except TokenReadError:
+        return decimals, DEFAULT_SYMBOL
+    store_metadata(chain, token_address, decimals, symbol)
+    return decimals, symbol
+
+
+def _fill(chain: str, token_address: str) -> None:
+    try:
+        get_token_metadata(chain, token_address)
+    except Exception as e:
+        print(f"[TokenMeta] Background fill failed for {token_address} on {chain}: {e}")
+    finally:
+        with _lock:
+            _pending.discard((chain, token_address.lower()))
+
+
+def prefetch(chain: str, token_addresses: list) -> None:
+    """Fills metadata for unknown tokens in the background; cached or in-flight tokens are skipped."""
+    for token_address in token_addresses:
+        if cached_metadata(chain, token_address) is not None:
+            continue
+        pending_key = (chain, token_address.lower())
+        with _lock:
+            if pending_key in _pending:
+                continue
+            _pending.add(pending_key)
+        _background.submit(_fill, chain, token_address)
+
+
+def clear() -> None:
+    """Empties the in-process tier (Redis entries are left alone) and re-seeds on next use."""
+    global _seeded
+    with _lock:
+        _cache.clear()
+    _seeded = False
@@ -0,0 +1,298 @@
+import os
+
+from eth_abi import decode
+from web3 import Web3
+
+from rpc import RPCError, abatch_request, batch_request, chain_config
+
+# ERC-20 reads encoded by hand so many of them can share one request.
+# On chains with a "multicall" address in EVM_CHAINS they are packed into Multicall3
+# aggregate3 calls; elsewhere they go out as a JSON-RPC batch of eth_calls.
+# Each read is planned as a list of JSON-RPC calls plus a function that decodes their
+# results, so the blocking (batch_request) and async (abatch_request) paths share it.
+# Imported lazily by the tools in lang.py and async_tools.py.
+
+# Calls packed into one aggregate3; larger reads are split across several eth_calls in one batch
+MULTICALL_MAX_CALLS = int(os.environ.get("MULTICALL_MAX_CALLS", 300))
+
+SEL_BALANCE_OF = "0x70a08231"
+SEL_DECIMALS = "0x313ce567"
+SEL_SYMBOL = "0x95d89b41"
+SEL_AGGREGATE3 = "0x82ad56cb"  # aggregate3((address target, bool allowFailure, bytes callData)[])
+SEL_GET_ETH_BALANCE = "0x4d2301cc"  # Multicall3.getEthBalance(address)
+
+DEFAULT_DECIMALS = 18
+DEFAULT_SYMBOL = "TOKEN"
+
+
+class TokenReadError(Exception):
+    """A single ERC-20 read failed (reverted, returned nothing, or could not be decoded)."""
+
+
+def _address_word(address: str) -> str:
+    # Callers pass validated addresses; checksumming here would hash every address again
+    digits = address[2:] if address[:2] in ("0x", "0X") else address
+    if len(digits) != 40:
+        raise ValueError(f"Invalid address: {address}")
+    return digits.lower().rjust(64, "0")
+
+
+def balance_of_data(wallet: str) -> str:
+    return SEL_BALANCE_OF + _address_word(wallet)
+
+
+def eth_balance_data(wallet: str) -> str:
+    return SEL_GET_ETH_BALANCE + _address_word(wallet)
+
+
+def eth_call(target: str, data: str, block: str = "latest") -> tuple:
+    return ("eth_call", [{"to": Web3.to_checksum_address(target), "data": data}, block])
+
+
+def _raw(result) -> bytes:
+    if isinstance(result, Exception):
+        raise TokenReadError(str(result))
+    raw = bytes.fromhex(result[2:] if isinstance(result, str) and result.startswith("0x") else (result or ""))
+    if not raw:
+        # Calling a non-contract address returns empty data
+        raise TokenReadError("Empty return data")
+    return raw
+
+
+def decode_uint(result) -> int:
+    return int.from_bytes(_raw(result)[:32], "big")
+
+
+def decode_string(result) -> str:
+    raw = _raw(result)
+    try:
+        return decode(["string"], raw)[0]
+    except Exception:
+        # Some older tokens (e.g. MKR) return bytes32 instead of string
+        return raw[:32].rstrip(b"\x00").decode("utf-8", errors="ignore")
+
+
+def token_read_calls(token_address: str, wallet: str) -> list:
+    """balanceOf, decimals and symbol calls for one token, as (target, data) pairs."""
+    return [
+        (token_address, balance_of_data(wallet)),
+        (token_address, SEL_DECIMALS),
+        (token_address, SEL_SYMBOL),
+    ]
+
+
+def multicall_address(chain: str):
+    return chain_config(chain).get("multicall")
+
+
+def _word(value: int) -> str:
+    return format(value, "064x")
+
+
+def _encode_aggregate3(calls: list) -> str:
+    # ABI-encodes aggregate3((address,bool,bytes)[]) directly as hex; eth_abi's generic
+    # encoder costs ~100us per call, which adds up for thousands of calls per request
+    heads, tails, offset = [], [], 32 * len(calls)
+    for target, data, allow_failure in calls:
+        data = data[2:] if data.startswith("0x") else data
+        padded = data + "0" * (-len(data) % 64)
+        heads.append(_word(offset))
+        tails.append(_address_word(target) + _word(int(allow_failure))
+                     + _word(96) + _word(len(data) // 2) + padded)
+        offset += 128 + len(padded) // 2
+    return SEL_AGGREGATE3 + _word(32) + _word(len(calls)) + "".join(heads) + "".join(tails)
+
+
+def _decode_aggregate3(result, count: int) -> list:
+    if isinstance(result, Exception):
+        # The whole aggregate reverted (a call with allowFailure=False failed)
+        return [TokenReadError(str(result))] * count
+    raw = _raw(result)
+    # (bool success, bytes returnData)[] read by offset, without eth_abi's generic decoder.
+    # Every offset and length is checked against the data, so a truncated reply or one from
+    # a contract other than Multicall3 fails instead of being read as zeros.
+
+    def word(at: int) -> int:
+        if at < 0 or at + 32 > len(raw):
+            raise TokenReadError("Malformed aggregate3 return data")
+        return int.from_bytes(raw[at:at + 32], "big")
+
+    start = word(0) + 32
+    length = word(start - 32)
+    if length != count:
+        raise TokenReadError(f"aggregate3 returned {length} results for {count} calls")
+    results = []
+    for i in range(length):
+        entry = start + word(start + 32 * i)
+        success = word(entry)
+        data_at = entry + word(entry + 32)
+        size = word(data_at)
+        if data_at + 32 + size > len(raw):
+            raise TokenReadError("Malformed aggregate3 return data")
+        data = raw[data_at + 32:data_at + 32 + size]
+        results.append(("0x" + data.hex()) if success else TokenReadError("Call reverted"))
+    return results
+
+
+def _normalize_calls(calls: list) -> list:
+    # (target, data) defaults to allowFailure=True
+    return [(c[0], c[1], c[2] if len(c) > 2 else True) for c in calls]
+
+
+def plan_calls(chain: str, calls: list, block: str = "latest") -> tuple:
+    """(JSON-RPC calls, decode(responses) -> per-call results) for call_many or a caller's own batch."""
+    calls = _normalize_calls(calls)
+    multicall = multicall_address(chain)
+    if not multicall:
+        def decode_plain(responses):
+            results = [TokenReadError(str(r)) if isinstance(r, Exception) else r for r in responses]
+            for i in range(0, len(calls), MULTICALL_MAX_CALLS):
+                chunk = range(i, min(i + MULTICALL_MAX_CALLS, len(calls)))
+                if any(not calls[j][2] and isinstance(results[j], Exception) for j in chunk):
+                    for j in chunk:
+                        results[j] = TokenReadError("A required call in the same request failed")
+            return results
+
+        return [eth_call(target, data, block) for target, data, _ in calls], decode_plain
+
+    chunks = [calls[i:i + MULTICALL_MAX_CALLS] for i in range(0, len(calls), MULTICALL_MAX_CALLS)]
+
+    def decode_multicall(responses):
+        results = []
+        for chunk, response in zip(chunks, responses):
+            try:
+                results.extend(_decode_aggregate3(response, len(chunk)))
+            except TokenReadError as e:
+                # A reply that can't be decoded fails every call of its chunk
+                results.extend([e] * len(chunk))
+        return results
+
+    return [eth_call(multicall, _encode_aggregate3(chunk), block) for chunk in chunks], decode_multicall
+
+
+def call_many(chain: str, calls: list, block: str = "latest") -> list:
+    """
+    Executes read-only calls given as (target, data) or (target, data, allow_failure).
+
+    Uses Multicall3 aggregate3 (MULTICALL_MAX_CALLS per eth_call, all chunks in one batch)
+    when the chain has a multicall address, otherwise one JSON-RPC batch of eth_calls.
+    Returns hex return data per call, or a TokenReadError for calls that failed.
+    A failed call with allow_failure=False fails every call in its chunk, like aggregate3 does.
+    """
+    rpc_calls, decode_results = plan_calls(chain, calls, block)
+    return decode_results(batch_request(chain, rpc_calls))
+
+
+async def acall_many(chain: str, calls: list, block: str = "latest") -> list:
+    """Async call_many."""
+    rpc_calls, decode_results = plan_calls(chain, calls, block)
+    return decode_results(await abatch_request(chain, rpc_calls))
+
+
+def token_balance_from_results(results: list) -> tuple[float, int, str]:
+    """
+    Turns balanceOf/decimals/symbol results into (human balance, decimals, symbol).
+    Raises TokenReadError if balanceOf failed; decimals and symbol fall back to defaults.
+    """
+    raw = decode_uint(results[0])
+    try:
+        decimals = decode_uint(results[1])
+    except TokenReadError:
+        # Default to 18 decimals if the call fails
+        decimals = DEFAULT_DECIMALS
+    try:
+        symbol = decode_string(results[2])
+    except TokenReadError:
+        # Default to "TOKEN" if the call fails
+        symbol = DEFAULT_SYMBOL
+    # Convert raw balance to human-readable format
+    return raw / (10 ** decimals), decimals, symbol
+
+
+def _plan_balances(chain: str, wallet: str, token_addresses: list, include_native: bool, known: dict) -> tuple:
+    """(JSON-RPC calls, decode(responses) -> balances dict) for read_balances."""
+    # token_meta imports this module, so import it at call time
+    from token_meta import store_metadata
+
+    token_calls = []
+    for token_address in token_addresses:
+        if known[token_address] is not None:
+            token_calls.append((token_address, balance_of_data(wallet)))
+        else:
+            token_calls.extend(token_read_calls(token_address, wallet))
+    multicall = multicall_address(chain)
+
+    if multicall:
+        calls = ([(multicall, eth_balance_data(wallet))] if include_native else []) + token_calls
+        rpc_calls, decode_calls = plan_calls(chain, calls)
+    else:
+        rpc_calls = [eth_call(target, data) for target, data in token_calls]
+        if include_native:
+            rpc_calls.insert(0, ("eth_getBalance", [Web3.to_checksum_address(wallet), "latest"]))
+
+    def decode_balances(responses):
+        native = None
+        if multicall:
+            results = decode_calls(responses)
+            if include_native:
+                native = results.pop(0)
+                native = native if isinstance(native, Exception) else decode_uint(native)
+        else:
+            results = list(responses)
+            if include_native:
+                native = results.pop(0)
+                native = native if isinstance(native, RPCError) else int(native, 16)
+            results = [TokenReadError(str(r)) if isinstance(r, Exception) else r for r in results]
+
+        balances = {"native": native, "tokens": {}}
+        offset = 0
+        for token_address in token_addresses:
+            # Advance past this token's results before decoding, so a failed one can't shift the rest
+            if known[token_address] is not None:
+                token_results = results[offset:offset + 1]
+                offset += 1
+            else:
+                token_results = results[offset:offset + 3]
+                offset += 3
+            try:
+                if known[token_address] is not None:
+                    decimals, symbol = known[token_address]
+                    raw = decode_uint(token_results[0])
+                    balances["tokens"][token_address] = (raw / (10 ** decimals), decimals, symbol)
+                    continue
+                balances["tokens"][token_address] = token_balance_from_results(token_results)
+                if not any(isinstance(r, Exception) for r in token_results[1:]):
+                    store_metadata(chain, token_address, *balances["tokens"][token_address][1:])
+            except TokenReadError as e:
+                balances["tokens"][token_address] = e
+        return balances
+
+    return rpc_calls, decode_balances
+
+
+def read_balances(chain: str, wallet: str, token_addresses: list, include_native: bool = True) -> dict:
+    """
+    Native and ERC-20 balances for one wallet in a single request.
+
+    With Multicall3 everything (including the native balance via getEthBalance) is one
+    aggregate3 eth_call; otherwise eth_getBalance and the eth_calls share one JSON-RPC batch.
+    Tokens with cached metadata (token_meta.py) only need balanceOf; the others also read
+    decimals and symbol, which are cached for next time.
+
+    Returns {"native": wei or exception, "tokens": {token_address: (balance, decimals, symbol) or exception}}.
+    Each entry fails independently; transport errors raise.
+    """
+    from token_meta import cached_metadata
+
+    known = {token_address: cached_metadata(chain, token_address) for token_address in token_addresses}
+    rpc_calls, decode_balances = _plan_balances(chain, wallet, token_addresses, include_native, known)
+    return decode_balances(batch_request(chain, rpc_calls))
+
+
+async def aread_balances(chain: str, wallet: str, token_addresses: list, include_native: bool = True) -> dict:
+    """Async read_balances."""
+    from token_meta import acached_metadata
+
+    known = {token_address: await acached_metadata(chain, token_address) for token_address in token_addresses}
+    rpc_calls, decode_balances = _plan_balances(chain, wallet, token_addresses, include_native, known)
+    return decode_balances(await abatch_request(chain, rpc_calls))
@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import explorer
+from explorer import ExplorerError
+
+# Local store of wallet transactions for get_wallet_transactions, in SQLite, indexed by
+# (chain, address, block_number). The explorer's txlist is only asked for what the
+# store doesn't have: new blocks since the last sync (startblock) and, when a caller
+# pages past the stored history, the next older page (endblock). Pages are answered
+# from the index, so repeat queries for busy wallets don't download their history again.
+# A wallet synced within TX_HISTORY_MAX_AGE is served as is; an older one is served
+# from the store and refreshed in the background. Only the first query for a wallet
+# waits for the explorer.
+# Explorer requests go through explorer.py's rate-limited client.
+# The database file is shared by the workers of one host (WAL mode).
+# TX_HISTORY_DB        path of the SQLite database
+# TX_HISTORY_MAX_AGE   seconds a wallet's sync is served without a refresh
+# TX_HISTORY_PAGE      transactions per explorer request
+TX_HISTORY_DB = os.environ.get("TX_HISTORY_DB", os.path.join(tempfile.gettempdir(), "tx_history.sqlite3"))
+TX_HISTORY_MAX_AGE = float(os.environ.get("TX_HISTORY_MAX_AGE", 15))
+TX_HISTORY_PAGE = int(os.environ.get("TX_HISTORY_PAGE", 1000))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS txs (
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    from_address TEXT,
+    to_address TEXT,
+    value TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (chain, address, hash)
+);
+CREATE INDEX IF NOT EXISTS txs_by_block ON txs (chain, address, block_number DESC);
+CREATE TABLE IF NOT EXISTS wallets (
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    newest_block INTEGER NOT NULL,
+    oldest_block INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (chain, address)
+);
+"""
+
+
+_local = threading.local()
+_schema_ready = False
+_schema_lock = threading.Lock()
+# Background refreshes stay off the request path; one per wallet at a time
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tx-history")
+_pending: set = set()
+_pending_lock = threading.Lock()
+
+
+def _db() -> sqlite3.Connection:
+    """This thread's connection (sqlite3 connections can't be shared across threads)."""
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(TX_HISTORY_DB, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(_SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+def _fetch(chain: str, address: str, **params) -> list:
+    """One txlist page from the chain's explorer; [] when it has none."""
+    data = explorer.get(chain, {"module": "account", "action": "txlist", "address": address, "page": 1,
+                                "offset": TX_HISTORY_PAGE, **params})
+    if data.get("status") == "1":
+        return data["result"]
+    if isinstance(data.get("result"), list) and not data["result"]:
+        return []
+    raise ExplorerError(data.get("message") or str(data.get("result")))
+
+
+def _store(chain: str, address: str, txs: list) -> None:
+    _db().executemany(
+        "INSERT OR IGNORE INTO txs (chain, address, hash, block_number, from_address, to_address, value, timestamp)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(chain, address, tx["hash"], int(tx["blockNumber"]), (tx.get("from") or "").lower(),
+          (tx.get("to") or "").lower(), str(tx["value"]), int(tx["timeStamp"])) for tx in txs]
+    )
+
+
+def _wallet(chain: str, address: str):
+    return _db().execute(
+        "SELECT newest_block, oldest_block, complete, synced_at FROM wallets WHERE chain = ? AND address = ?",
+        (chain, address)
+    ).fetchone()
+
+
+def _add_wallet(chain: str, address: str, newest: int, oldest: int, complete: bool) -> None:
+    _db().execute(
+        "INSERT OR REPLACE INTO wallets (chain, address, newest_block, oldest_block, complete, synced_at)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (chain, address, newest, oldest, int(complete), time.time())
+    )
+
+
+def _first_sync(chain: str, address: str) -> None:
+    # The newest page only; older pages are read when someone pages that far
+    txs = _fetch(chain, address, sort="desc")
+    _store(chain, address, txs)
+    blocks = [int(tx["blockNumber"]) for tx in txs]
+    _add_wallet(chain, address, max(blocks, default=0), min(blocks, default=0), len(txs) < TX_HISTORY_PAGE)
+
+
+def _sync_newer(chain: str, address: str) -> None:
+    """Reads blocks after the last sync; the last synced block is read again in case it was partial."""
+    newest = _wallet(chain, address)[0]
+    while True:
+        txs = _fetch(chain, address, startblock=newest, sort="asc")
+        _store(chain, address, txs)
+        top = max((int(tx["blockNumber"]) for tx in txs), default=newest)
+        if len(txs) < TX_HISTORY_PAGE or top == newest:
+            break
+        newest = top
+    # Only the newer end and sync time; a concurrent _sync_older owns the older end
+    _db().execute("UPDATE wallets SET newest_block = ?, synced_at = ? WHERE chain = ? AND address = ?",
+                  (top, time.time(), chain, address))
+
+
+def _sync_older(chain: str, address: str, wanted: int) -> None:
+    """Reads older pages until the store holds wanted rows or the whole history."""
+    _, oldest, complete, _ = _wallet(chain, address)
+    while not complete and _count(chain, address) < wanted:
+        txs = _fetch(chain, address, endblock=oldest, sort="desc")
+        _store(chain, address, txs)
+        bottom = min((int(tx["blockNumber"]) for tx in txs), default=oldest)
+        complete = len(txs) < TX_HISTORY_PAGE
+        # A single block with a full page of transactions would otherwise be read forever
+        oldest = bottom if bottom < oldest else oldest - 1
+        if oldest < 0:
+            complete = True
+    _db().execute("UPDATE wallets SET oldest_block = ?, complete = ? WHERE chain = ? AND address = ?",
+                  (max(oldest, 0), int(complete), chain, address))
+
+
+def _count(chain: str, address: str) -> int:
+    return _db().execute("SELECT COUNT(*) FROM txs WHERE chain = ? AND address = ?", (chain, address)).fetchone()[0]
+
+
+def _refresh(chain: str, address: str) -> None:
+    try:
+        _sync_newer(chain, address)
+    except Exception as e:
+        print(f"[TxHistory] Background refresh of {address} on {chain} failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard((chain, address))
+
+
+def _refresh_in_background(chain: str, address: str) -> None:
+    with _pending_lock:
+        if (chain, address) in _pending:
+            return
+        _pending.add((chain, address))
+    _background.submit(_refresh, chain, address)
+
+
+def transactions(chain: str, address: str, limit: int, page: int = 1) -> tuple[list, bool]:
+    """
+    (transactions newest first, has_more) for one page of a wallet's history, as stored
+    rows {"hash", "block_number", "from", "to", "value", "timestamp"}. Raises
+    ExplorerError or a requests error if the explorer fails and the store can't answer.
+    """
+    chain, address = chain.lower(), address.lower()
+    offset = (page - 1) * limit
+    wallet = _wallet(chain, address)
+    if wallet is None:
+        _first_sync(chain, address)
+    elif time.time() - wallet[3] > TX_HISTORY_MAX_AGE:
+        _refresh_in_background(chain, address)
+    # One extra row tells whether another page exists
+    _sync_older(chain, address, offset + limit + 1)
+    rows = _db().execute(
+        "SELECT hash, block_number, from_address, to_address, value, timestamp FROM txs"
+        " WHERE chain = ? AND address = ? ORDER BY block_number DESC, hash LIMIT ? OFFSET ?",
+        (chain, address, limit + 1, offset)
+    ).fetchall()
+    txs = [{"hash": row[0], "block_number": row[1], "from": row[2], "to": row[3], "value": row[4],
+            "timestamp": row[5]} for row in rows[:limit]]
+    return txs, len(rows) > limit
+
+
+def stats() -> dict:
+    db = _db()
+    return {
+        "db": TX_HISTORY_DB,
+        "wallets": db.execute("SELECT COUNT(*) FROM wallets").fetchone()[0],
+        "transactions": db.execute("SELECT COUNT(*) FROM txs").fetchone()[0],
+        "refreshing": len(_pending),
+    }
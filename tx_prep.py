@@ -0,0 +1,189 @@
+from eth_abi import encode
+from web3 import Web3
+
+import fees
+import nonces
+from rpc import abatch_request, batch_request
+from token_meta import acached_metadata, cached_metadata, plan_metadata
+
+# Shared transaction preparation for the prepare_* tools in lang.py and async_tools.py.
+# Gas estimate, nonce and fees don't depend on each other, so they go to the node as
+# one JSON-RPC batch. Nonces come from the per-sender counter in nonces.py, which only
+# needs the node's pending count now and then, and the fee reads planned by fees.py are
+# often not needed at all.
+# When a token's decimals aren't cached yet, the metadata reads share a batch with the
+# nonce and fee reads. The estimate needs the decimals, so it follows in a second
+# batch where the other two are cached. A token call therefore costs two round trips
+# the first time a token is seen and one after that.
+# Imported lazily by the tools, like tokens.py.
+
+SEL_TRANSFER = "0xa9059cbb"  # transfer(address,uint256)
+SEL_APPROVE = "0x095ea7b3"  # approve(address,uint256)
+TOKEN_FUNCTIONS = {"transfer": SEL_TRANSFER, "approve": SEL_APPROVE}
+
+
+def token_call_data(fn_name: str, target: str, amount_wei: int) -> str:
+    """Calldata for an ERC-20 transfer/approve, encoded without building a contract object."""
+    return TOKEN_FUNCTIONS[fn_name] + encode(["address", "uint256"], [Web3.to_checksum_address(target), amount_wei]).hex()
+
+
+def _rpc_tx(tx: dict) -> dict:
+    return {key: hex(value) if isinstance(value, int) else value for key, value in tx.items()}
+
+
+def _raise_failed(responses: list) -> None:
+    for response in responses:
+        if isinstance(response, Exception):
+            # e.g. the estimate reverted; surfaces as the tool's error message
+            raise response
+
+
+def _plan_prepare(chain: str, tx: dict, sync_nonce: bool) -> tuple[list, object]:
+    """(JSON-RPC calls, decode(responses) -> (gas estimate, pending count or None, fee quote or None)) for tx."""
+    fee_calls, decode_quote = fees.plan_quote(chain)
+    rpc_calls = [("eth_estimateGas", [_rpc_tx(tx)])]
+    if sync_nonce:
+        rpc_calls.append(nonces.sync_call(tx["from"]))
+
+    def decode(responses):
+        # Fees first: a planned eth_feeHistory refresh is stored (or released) by fees.py
+        # even when the estimate reverted
+        try:
+            quote, quote_error = decode_quote(responses[len(rpc_calls):]), None
+        except Exception as e:
+            quote, quote_error = None, e
+        _raise_failed(responses[:len(rpc_calls)])
+        if quote_error is not None:
+            raise quote_error
+        estimated_gas, *pending = (int(response, 16) for response in responses[:len(rpc_calls)])
+        return estimated_gas, pending[0] if pending else None, quote
+
+    return rpc_calls + fee_calls, decode
+
+
+def _pending_count(responses: list) -> int:
+    _raise_failed(responses)
+    return int(responses[0], 16)
+
+
+def _failed(error: Exception, rpc_calls: list) -> list:
+    # A batch that failed as a whole, as per-call failures, so decoders still see their calls
+    # (fees.py releases a planned eth_feeHistory refresh) before the error is raised
+    return [error] * len(rpc_calls)
+
+
+def _prepare(chain: str, tx: dict, nonce: bool) -> tuple:
+    rpc_calls, decode = _plan_prepare(chain, tx, nonce and nonces.needs_sync(chain, tx["from"]))
+    try:
+        responses = batch_request(chain, rpc_calls)
+    except Exception as e:
+        responses = _failed(e, rpc_calls)
+    estimated_gas, pending, quote = decode(responses)
+    if quote is None:
+        # Rare: eth_feeHistory failed for a type-2 chain; price this one as legacy
+        quote = fees.legacy_quote(batch_request(chain, fees.LEGACY_CALLS))
+    # Handed out only once the estimate succeeded, so failed preparations don't use one up
+    tx_nonce = nonces.allocate(chain, tx["from"], pending) if nonce else None
+    if nonce and tx_nonce is None:
+        # The shared counter expired between the check and the allocation
+        pending = _pending_count(batch_request(chain, [nonces.sync_call(tx["from"])]))
+        tx_nonce = nonces.allocate(chain, tx["from"], pending)
+    return estimated_gas, tx_nonce, quote
+
+
+async def _aprepare(chain: str, tx: dict, nonce: bool) -> tuple:
+    rpc_calls, decode = _plan_prepare(chain, tx, nonce and await nonces.aneeds_sync(chain, tx["from"]))
+    try:
+        responses = await abatch_request(chain, rpc_calls)
+    except Exception as e:
+        responses = _failed(e, rpc_calls)
+    estimated_gas, pending, quote = decode(responses)
+    if quote is None:
+        quote = fees.legacy_quote(await abatch_request(chain, fees.LEGACY_CALLS))
+    tx_nonce = await nonces.aallocate(chain, tx["from"], pending) if nonce else None
+    if nonce and tx_nonce is None:
+        pending = _pending_count(await abatch_request(chain, [nonces.sync_call(tx["from"])]))
+        tx_nonce = await nonces.aallocate(chain, tx["from"], pending)
+    return estimated_gas, tx_nonce, quote
+
+
+def gas_nonce_fees(chain: str, tx: dict) -> tuple[int, int, dict]:
+    """
+    (gas estimate, nonce, fee quote) for tx ({"from", "to", "value"/"data"}) in one batch.
+    The quote is turned into transaction fields with fees.tx_fields.
+    Raises the node's RPCError if any of them failed.
+    """
+    return _prepare(chain, tx, nonce=True)
+
+
+async def agas_nonce_fees(chain: str, tx: dict) -> tuple[int, int, dict]:
+    """Async gas_nonce_fees."""
+    return await _aprepare(chain, tx, nonce=True)
+
+
+def gas_fees(chain: str, tx: dict) -> tuple[int, dict]:
+    """(gas estimate, fee quote) for tx in one batch, for estimate_gas."""
+    estimated_gas, _, quote = _prepare(chain, tx, nonce=False)
+    return estimated_gas, quote
+
+
+async def agas_fees(chain: str, tx: dict) -> tuple[int, dict]:
+    """Async gas_fees."""
+    estimated_gas, _, quote = await _aprepare(chain, tx, nonce=False)
+    return estimated_gas, quote
+
+
+def _plan_account(chain: str, sender: str, sync_nonce: bool) -> tuple[list, object]:
+    # Nonce and fee reads sent along with token metadata so the next batch can skip them
+    fee_calls, decode_quote = fees.plan_quote(chain)
+    nonce_calls = [nonces.sync_call(sender)] if sync_nonce else []
+
+    def decode(responses):
+        try:
+            decode_quote(responses[len(nonce_calls):])
+        except Exception:
+            # Reported by gas_nonce_fees if it fails again there
+            pass
+        pending = responses[0] if nonce_calls else None
+        return int(pending, 16) if isinstance(pending, str) else None
+
+    return nonce_calls + fee_calls, decode
+
+
+def token_metadata(chain: str, token_address: str, sender: str) -> tuple[int, str]:
+    """
+    (decimals, symbol) for a token about to be prepared. On a cache miss the reads share
+    a batch with sender's nonce and the fee reads so gas_nonce_fees finds them cached.
+    """
+    metadata = cached_metadata(chain, token_address)
+    if metadata is not None:
+        return metadata
+    rpc_calls, decode_metadata = plan_metadata(chain, token_address)
+    account_calls, decode_account = _plan_account(chain, sender, nonces.needs_sync(chain, sender))
+    try:
+        responses = batch_request(chain, rpc_calls + account_calls)
+    except Exception as e:
+        decode_account(_failed(e, account_calls))
+        raise
+    pending = decode_account(responses[len(rpc_calls):])
+    if pending is not None:
+        nonces.record_pending(chain, sender, pending)
+    return decode_metadata(responses[:len(rpc_calls)])
+
+
+async def atoken_metadata(chain: str, token_address: str, sender: str) -> tuple[int, str]:
+    """Async token_metadata."""
+    metadata = await acached_metadata(chain, token_address)
+    if metadata is not None:
+        return metadata
+    rpc_calls, decode_metadata = plan_metadata(chain, token_address)
+    account_calls, decode_account = _plan_account(chain, sender, await nonces.aneeds_sync(chain, sender))
+    try:
+        responses = await abatch_request(chain, rpc_calls + account_calls)
+    except Exception as e:
+        decode_account(_failed(e, account_calls))
+        raise
+    pending = decode_account(responses[len(rpc_calls):])
+    if pending is not None:
+        await nonces.arecord_pending(chain, sender, pending)
+    return decode_metadata(responses[:len(rpc_calls)])
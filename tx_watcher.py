@@ -0,0 +1,231 @@
+import asyncio
+import os
+import time
+
+import chain_head
+from rpc import abatch_request, chain_config
+
+# Transaction status watcher behind /tx/watch/stream (SSE) and /tx/watch/ws (WebSocket).
+# Clients subscribe to tx hashes on a chain and get a status event whenever one changes
+# (pending -> mined -> each new confirmation -> confirmed), instead of asking the agent
+# over and over. Each chain with watched hashes has one task that sends a single
+# JSON-RPC batch of eth_getTransactionReceipt for all of them when a new block arrives,
+# so the RPC load grows with blocks, not with clients or how often they ask.
+# New blocks are taken from chain_head.py's snapshot; without a fresh one eth_blockNumber
+# is read on its own every TX_WATCH_INTERVAL seconds.
+# A hash stops being watched once every subscriber got its final event: confirmed at
+# the requested depth, or timeout if it isn't mined within TX_WATCH_TIMEOUT.
+# State is per worker; each worker watches the hashes of its own clients.
+# TX_WATCH_INTERVAL           seconds between head checks per chain
+# TX_WATCH_CONFIRMATIONS      default confirmation depth ("confirmations" per chain in EVM_CHAINS)
+# TX_WATCH_MAX_CONFIRMATIONS  largest depth a client may ask for
+# TX_WATCH_TIMEOUT            seconds a hash may stay unmined before it is given up
+# TX_WATCH_MAX_HASHES         hashes accepted per subscription
+TX_WATCH_INTERVAL = float(os.environ.get("TX_WATCH_INTERVAL", 1))
+TX_WATCH_CONFIRMATIONS = int(os.environ.get("TX_WATCH_CONFIRMATIONS", 3))
+TX_WATCH_MAX_CONFIRMATIONS = int(os.environ.get("TX_WATCH_MAX_CONFIRMATIONS", 64))
+TX_WATCH_TIMEOUT = float(os.environ.get("TX_WATCH_TIMEOUT", 1800))
+TX_WATCH_MAX_HASHES = int(os.environ.get("TX_WATCH_MAX_HASHES", 100))
+
+
+class WatchRequestError(ValueError):
+    """The chain, hashes or depth of a subscription can't be used."""
+
+
+class Subscription:
+    """One client's hashes on a chain; events are (event, data) tuples put on queue."""
+
+    def __init__(self, chain: str, tx_hashes: list, confirmations: int, queue: asyncio.Queue):
+        self.chain = chain
+        self.tx_hashes = tx_hashes
+        self.confirmations = confirmations
+        self.queue = queue
+        self.remaining = set(tx_hashes)
+
+
+# chain -> tx hash -> {"state": {...}, "since": monotonic, "subscribers": set[Subscription]}
+_watches: dict[str, dict[str, dict]] = {}
+_tasks: dict[str, asyncio.Task] = {}
+_force_check: set[str] = set()
+_errors: dict[str, str] = {}
+_checks = 0
+
+
+def validate(chain: str, tx_hashes, confirmations) -> tuple[str, list, int]:
+    """(chain, tx_hashes, confirmations) normalized for subscribe; raises WatchRequestError."""
+    from lang import is_tx_hash
+    chain = chain.lower()
+    try:
+        config = chain_config(chain)
+    except ValueError as e:
+        raise WatchRequestError(str(e))
+    tx_hashes = list(dict.fromkeys(str(tx_hash).strip().lower() for tx_hash in tx_hashes or []))
+    if not tx_hashes:
+        raise WatchRequestError("No transaction hashes given.")
+    if len(tx_hashes) > TX_WATCH_MAX_HASHES:
+        raise WatchRequestError(f"Too many transaction hashes: {len(tx_hashes)} (max {TX_WATCH_MAX_HASHES}).")
+    invalid = [tx_hash for tx_hash in tx_hashes if not is_tx_hash(tx_hash)]
+    if invalid:
+        raise WatchRequestError(f"Invalid transaction hash: {invalid[0]}")
+    if confirmations is None:
+        confirmations = int(config.get("confirmations", TX_WATCH_CONFIRMATIONS))
+    if not 1 <= int(confirmations) <= TX_WATCH_MAX_CONFIRMATIONS:
+        raise WatchRequestError(f"confirmations must be between 1 and {TX_WATCH_MAX_CONFIRMATIONS}.")
+    return chain, tx_hashes, int(confirmations)
+
+
+def _event(chain: str, tx_hash: str, state: dict, subscription: Subscription) -> dict:
+    status = state["status"]
+    if status == "mined" and state["confirmations"] >= subscription.confirmations:
+        status = "confirmed"
+    return {"chain": chain, "tx_hash": tx_hash, **state, "status": status,
+            "required_confirmations": subscription.confirmations}
+
+
+def _deliver(chain: str, tx_hash: str, watch: dict, subscription: Subscription) -> None:
+    event = _event(chain, tx_hash, watch["state"], subscription)
+    subscription.queue.put_nowait(("status", event))
+    if event["status"] in ("confirmed", "timeout"):
+        watch["subscribers"].discard(subscription)
+        subscription.remaining.discard(tx_hash)
+        if not subscription.remaining:
+            subscription.queue.put_nowait(("done", {"chain": chain, "tx_hashes": subscription.tx_hashes}))
+
+
+def _drop_unwatched(chain: str, tx_hashes) -> None:
+    watches = _watches.get(chain, {})
+    for tx_hash in tx_hashes:
+        if tx_hash in watches and not watches[tx_hash]["subscribers"]:
+            del watches[tx_hash]
+
+
+def subscribe(chain: str, tx_hashes, confirmations=None, queue: asyncio.Queue | None = None) -> Subscription:
+    """
+    Starts watching tx_hashes on chain for a client (call on the event loop). Hashes
+    already known are reported right away. Several subscriptions may share one queue
+    (e.g. one WebSocket). Raises WatchRequestError for bad input.
+    """
+    chain, tx_hashes, confirmations = validate(chain, tx_hashes, confirmations)
+    subscription = Subscription(chain, tx_hashes, confirmations, queue or asyncio.Queue())
+    watches = _watches.setdefault(chain, {})
+    now = time.monotonic()
+    for tx_hash in tx_hashes:
+        watch = watches.setdefault(tx_hash, {"state": None, "since": now, "subscribers": set()})
+        watch["subscribers"].add(subscription)
+        if watch["state"] is not None:
+            _deliver(chain, tx_hash, watch, subscription)
+        else:
+            _force_check.add(chain)
+    _drop_unwatched(chain, tx_hashes)
+    if chain not in _tasks:
+        _tasks[chain] = asyncio.create_task(_watch_chain(chain), name=f"tx-watch-{chain}")
+    return subscription
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    """Stops watching for a client that went away; hashes nobody else watches are dropped."""
+    watches = _watches.get(subscription.chain, {})
+    for tx_hash in subscription.tx_hashes:
+        if tx_hash in watches:
+            watches[tx_hash]["subscribers"].discard(subscription)
+    _drop_unwatched(subscription.chain, subscription.tx_hashes)
+
+
+async def events(subscription: Subscription):
+    """Yields (event, data) for a subscription with its own queue, ending after "done"."""
+    while True:
+        event, data = await subscription.queue.get()
+        yield event, data
+        if event == "done":
+            return
+
+
+def _state(receipt, head: int, watch: dict, now: float) -> dict:
+    if receipt is None:
+        # Not mined yet (or reorged out again)
+        if now - watch["since"] > TX_WATCH_TIMEOUT:
+            return {"status": "timeout"}
+        return {"status": "pending"}
+    block_number = int(receipt["blockNumber"], 16)
+    return {
+        "status": "mined",
+        "block_number": block_number,
+        "confirmations": max(0, head - block_number + 1),
+        "is_successful": int(receipt.get("status") or "0x1", 16) == 1,
+        "gas_used": int(receipt["gasUsed"], 16)
+    }
+
+
+async def _check(chain: str, last_head):
+    """One receipt batch for every watched hash if a new block arrived; returns the head."""
+    global _checks
+    tx_hashes = list(_watches.get(chain, {}))
+    calls = [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes]
+    current = chain_head.snapshot(chain)
+    if current is not None:
+        head = current["block_number"]
+    else:
+        # The head alone is cheap; receipts are only read again once it moves
+        responses = await abatch_request(chain, [("eth_blockNumber", [])], cache=False)
+        if isinstance(responses[0], Exception):
+            raise responses[0]
+        head = int(responses[0], 16)
+    if head == last_head and chain not in _force_check:
+        return last_head
+    _force_check.discard(chain)
+    receipts = await abatch_request(chain, calls, cache=False)
+    _checks += 1
+    now = time.monotonic()
+    watches = _watches.get(chain, {})
+    for tx_hash, receipt in zip(tx_hashes, receipts):
+        watch = watches.get(tx_hash)
+        if watch is None or isinstance(receipt, Exception):
+            # Unsubscribed meanwhile, or the node failed this one; retried next block
+            continue
+        state = _state(receipt, head, watch, now)
+        if state != watch["state"]:
+            watch["state"] = state
+            for subscription in list(watch["subscribers"]):
+                _deliver(chain, tx_hash, watch, subscription)
+    _drop_unwatched(chain, tx_hashes)
+    return head
+
+
+async def _watch_chain(chain: str) -> None:
+    last_head = None
+    try:
+        while _watches.get(chain):
+            try:
+                last_head = await _check(chain, last_head)
+                _errors.pop(chain, None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if _errors.get(chain) != str(e):
+                    print(f"[TxWatch] {chain}: receipt check failed: {e}")
+                _errors[chain] = str(e)
+            await asyncio.sleep(TX_WATCH_INTERVAL)
+    finally:
+        _tasks.pop(chain, None)
+
+
+async def stop() -> None:
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def stats() -> dict:
+    return {
+        "receipt_batches": _checks,
+        "chains": {
+            chain: {
+                "watched": len(watches),
+                "subscribers": len({s for watch in watches.values() for s in watch["subscribers"]}),
+                "pending": sum(1 for watch in watches.values() if (watch["state"] or {}).get("status") != "mined"),
+                **({"error": _errors[chain]} if chain in _errors else {})
+            }
+            for chain, watches in _watches.items() if watches
+        }
+    }